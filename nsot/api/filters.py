@@ -1,11 +1,15 @@
 from __future__ import unicode_literals
 from __future__ import absolute_import
+import collections
 import logging
 
 from django.db.models import Q
 import django_filters
 
 from .. import models
+from ..models.attribute_index import (
+    attribute_index, bitmap_to_ids, filter_ids
+)
 from ..util import qpbool
 
 
@@ -38,6 +42,11 @@ class ResourceFilter(django_filters.rest_framework.FilterSet):
         # and naively do an intersection query.
         log.debug('GOT ATTRIBUTES: %r', attributes)
 
+        if attributes and attribute_index.enabled:
+            return self._filter_attributes_index(
+                queryset, resource_name, attributes
+            )
+
         for attribute in attributes:
             name, _, value = attribute.partition('=')
             # Retrieve next set of objects using the same arguments as the
@@ -51,6 +60,27 @@ class ResourceFilter(django_filters.rest_framework.FilterSet):
 
         return queryset
 
+    def _filter_attributes_index(self, queryset, resource_name, attributes):
+        """Intersect ``attributes`` using the attribute index."""
+        pairs = [attribute.partition('=')[::2] for attribute in attributes]
+
+        # Values are looked up in every Site that has a matching Attribute.
+        site_ids = collections.defaultdict(list)
+        attrs = models.Attribute.objects.filter(
+            resource_name=resource_name, name__in={n for n, _ in pairs}
+        ).values_list('name', 'site_id')
+        for attr_name, site_id in attrs:
+            site_ids[attr_name].append(site_id)
+
+        result = None
+        for name, value in pairs:
+            matched = attribute_index.lookup(
+                site_ids[name], resource_name, name, value
+            )
+            result = matched if result is None else result & matched
+
+        return filter_ids(queryset, bitmap_to_ids(result))
+
 
 class DeviceFilter(ResourceFilter):
     """Filter for Device objects."""
@@ -209,7 +239,7 @@ class ProtocolFilter(ResourceFilter):
         if value.isdigit():
             return queryset.filter(device=value)
         else:
-            return queryset.filter(device__hostname=value)
+            return queryset.filter(device_hostname=value)
 
     def filter_type(self, queryset, name, value):
         """Overload to use natural key."""
@@ -219,7 +249,7 @@ class ProtocolFilter(ResourceFilter):
         if value.isdigit():
             return queryset.filter(type=value)
         else:
-            return queryset.filter(type__name=value)
+            return queryset.filter(type_name=value)
 
     def filter_interface(self, queryset, name, value):
         """Overload to use natural key."""
@@ -229,7 +259,7 @@ class ProtocolFilter(ResourceFilter):
         if value.isdigit():
             return queryset.filter(interface=value)
         else:
-            return queryset.filter(interface__name_slug=value)
+            return queryset.filter(interface_name_slug=value)
 
     def filter_circuit(self, queryset, name, value):
         """Overload to use natural key."""
@@ -239,4 +269,4 @@ class ProtocolFilter(ResourceFilter):
         if value.isdigit():
             return queryset.filter(circuit=value)
         else:
-            return queryset.filter(circuit__name_slug=value)
+            return queryset.filter(circuit_name_slug=value)
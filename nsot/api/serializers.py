@@ -11,7 +11,7 @@ from rest_framework_bulk import BulkSerializerMixin, BulkListSerializer
 
 from . import auth
 from .. import exc, models, validators
-from ..util import get_field_attr
+from ..util import get_field_attr, instrumentation
 
 
 log = logging.getLogger(__name__)
@@ -168,7 +168,8 @@ class NsotSerializer(serializers.ModelSerializer):
         if isinstance(obj, OrderedDict):
             return obj
 
-        return obj.to_dict()
+        with instrumentation.timer('serializer'):
+            return obj.to_dict()
 
 
 ######
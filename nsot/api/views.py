@@ -1,13 +1,19 @@
 from __future__ import unicode_literals
 from __future__ import absolute_import
+import calendar
 from collections import namedtuple, OrderedDict
+import hashlib
+import json
 import logging
 import six
 import warnings
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
 from rest_framework import (
     mixins, status as status_codes, permissions, viewsets
 )
@@ -15,11 +21,15 @@ from rest_framework.views import APIView
 from rest_framework.decorators import detail_route, list_route
 from rest_framework.response import Response
 from rest_framework_bulk import mixins as bulk_mixins
-from rest_framework_extensions.cache.decorators import cache_response
 
 from . import auth, filters, serializers
 from .. import exc, models
-from ..util import cache, qpbool, cidr_to_dict
+from ..models import bulk
+from ..models.attribute_index import filter_ids
+from ..util import (
+    cache, db, instrumentation, metrics, profiling, qpbool, cidr_to_dict
+)
+from ..util.cache import cache_response
 
 
 log = logging.getLogger(__name__)
@@ -36,6 +46,17 @@ class BaseNsotViewSet(viewsets.ReadOnlyModelViewSet):
     #: Natural key for the resource. If not defined, defaults to pk-only.
     natural_key = None
 
+    #: Whether safe requests may be served from a read replica.
+    use_replicas = True
+
+    #: Actions that always read from the primary database.
+    primary_actions = ()
+
+    #: Fields holding the times that objects (and the related objects in their
+    #: representation) last changed. If set, ``list`` and ``retrieve`` answer
+    #: conditional requests.
+    version_fields = ()
+
     @property
     def model_name(self):
         return self.queryset.model.__name__
@@ -53,6 +74,159 @@ class BaseNsotViewSet(viewsets.ReadOnlyModelViewSet):
         """
         return {self.natural_key: filter_value}
 
+    def perform_authentication(self, request):
+        """Overload default to record the time spent authenticating."""
+        with instrumentation.timer('auth'):
+            super(BaseNsotViewSet, self).perform_authentication(request)
+
+    def initial(self, request, *args, **kwargs):
+        """
+        Overload default to read from a replica for safe requests, and to
+        decide whether to profile the request now that the user is known.
+        """
+        super(BaseNsotViewSet, self).initial(request, *args, **kwargs)
+        profiling.start_profile(request._request, request.user)
+
+        if (
+            self.use_replicas and
+            request.method in permissions.SAFE_METHODS and
+            self.action not in self.primary_actions and
+            db.get_replicas() and
+            not db.is_sticky(request)
+        ):
+            try:
+                db.use_replica()
+            except db.PoolTimeout as err:
+                log.warning('%s %s: %s', request.method, request.path, err)
+                raise exc.ServiceUnavailable(str(err))
+
+        self.check_not_modified(request)
+
+    def get_version_queryset(self):
+        """
+        Return the queryset of the objects in the response to this request,
+        or None if it doesn't support conditional requests.
+        """
+        if not self.version_fields:
+            return None
+        if self.request.method not in ('GET', 'HEAD'):
+            return None
+
+        if self.action == 'list':
+            queryset = self.filter_queryset(self.get_queryset())
+            site_pk = self.kwargs.get('site_pk')
+            if site_pk is not None:
+                queryset = queryset.filter(site=site_pk)
+            return queryset
+
+        if self.action == 'retrieve':
+            return self.queryset.filter(pk=self.get_object().pk)
+
+        return None
+
+    def get_version_headers(self, request):
+        """
+        Return a dict of the ``ETag`` (and for single objects,
+        ``Last-Modified``) headers for the response to this request.
+
+        The version of a response is derived from the number of objects in it
+        and the latest time any of them changed, with one query.
+        """
+        queryset = self.get_version_queryset()
+        if queryset is None:
+            return {}
+
+        aggregates = dict(
+            ('version%d' % i, Max(field))
+            for i, field in enumerate(self.version_fields)
+        )
+        version = queryset.aggregate(count=Count('pk'), **aggregates)
+        timestamps = [
+            version['version%d' % i] for i in range(len(self.version_fields))
+        ]
+
+        parts = [
+            self.model_name, request.get_full_path(), request.version,
+            request.accepted_media_type, version['count'],
+        ]
+        parts.extend(ts and ts.isoformat() for ts in timestamps)
+        digest = hashlib.sha1(
+            '|'.join(six.text_type(part) for part in parts).encode('utf-8')
+        )
+        headers = {'ETag': '"%s"' % digest.hexdigest()}
+
+        # Objects removed from a list don't change the latest time, so only
+        # single objects are versioned by time.
+        timestamps = [ts for ts in timestamps if ts is not None]
+        if self.action == 'retrieve' and timestamps:
+            headers['Last-Modified'] = http_date(
+                calendar.timegm(max(timestamps).utctimetuple())
+            )
+
+        return headers
+
+    def check_not_modified(self, request):
+        """
+        Raise ``NotModified`` if the client already has the current version
+        of the response to this request.
+        """
+        self.version_headers = headers = self.get_version_headers(request)
+        if not headers:
+            return
+
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = [
+                etag[2:] if etag.startswith('W/') else etag
+                for etag in parse_etags(if_none_match)
+            ]
+            if '*' in etags or headers['ETag'] in etags:
+                raise exc.NotModified()
+            return
+
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE') or ''
+        )
+        last_modified = headers.get('Last-Modified')
+        if (
+            if_modified_since is not None and last_modified is not None and
+            parse_http_date_safe(last_modified) <= if_modified_since
+        ):
+            raise exc.NotModified()
+
+    def handle_exception(self, err):
+        """Overload default to answer conditional requests."""
+        if isinstance(err, exc.NotModified):
+            return Response(
+                status=status_codes.HTTP_304_NOT_MODIFIED,
+                headers=self.version_headers,
+            )
+        return super(BaseNsotViewSet, self).handle_exception(err)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        Overload default to include the version of the response, and to have
+        the client read from the primary for a while after a write. The user
+        is the one authenticated by DRF, e.g. with an auth token.
+        """
+        response = super(BaseNsotViewSet, self).finalize_response(
+            request, response, *args, **kwargs
+        )
+        if response.status_code == status_codes.HTTP_200_OK:
+            for name, value in six.iteritems(
+                getattr(self, 'version_headers', None) or {}
+            ):
+                response[name] = value
+
+        if (
+            request.method not in permissions.SAFE_METHODS and
+            response.status_code < 400 and
+            db.get_replicas()
+        ):
+            db.mark_written(request, response)
+
+        return response
+
     def not_found(self, pk=None, site_pk=None, msg=None):
         """Standard formatting for 404 errors."""
         if msg is None:
@@ -199,6 +373,9 @@ class ChangeViewSet(BaseNsotViewSet):
     serializer_class = serializers.ChangeSerializer
     filter_fields = ('event', 'resource_name', 'resource_id')
 
+    # Consumers of the change feed must never miss a change.
+    use_replicas = False
+
     @detail_route(methods=['get'])
     def diff(self, request, *args, **kwargs):
         return self.success(self.get_object().diff)
@@ -305,6 +482,84 @@ class SiteViewSet(NsotViewSet):
     serializer_class = serializers.SiteSerializer
     filter_fields = ('name',)
 
+    def get_topology_device(self, site, value):
+        """Return the ID of a Device in ``site`` by ID or hostname."""
+        devices = models.Device.objects.filter(site=site)
+        lookup = {'pk': value} if value.isdigit() else {'hostname': value}
+        ids = devices.filter(**lookup).values_list('id', flat=True)
+        if not ids:
+            raise exc.NotFound(
+                'Device %r not found in Site %s.' % (value, site.id)
+            )
+        return ids[0]
+
+    def get_topology_devices(self, site, ids):
+        """Return dicts of the ID and hostname of Devices, in order."""
+        devices = models.Device.objects.filter(site=site).order_by()
+        hostnames = dict(
+            filter_ids(devices, sorted(set(ids))).values_list('id', 'hostname')
+        )
+        return [{'id': pk, 'hostname': hostnames.get(pk)} for pk in ids]
+
+    @detail_route(methods=['get'])
+    def topology(self, request, pk=None, *args, **kwargs):
+        """
+        Query the graph of Devices in this Site connected by Circuits.
+
+        With ``neighbors``, return the neighbors of a Device. With ``source``
+        and ``target``, return a shortest path between two Devices. With
+        ``component``, return the Devices connected to a Device. Otherwise,
+        return counts of the Devices, Circuits and connected components.
+        Devices are given by ID or hostname.
+        """
+        site = self.get_object()
+        topology = models.topology
+        params = request.query_params
+
+        if 'neighbors' in params:
+            device_id = self.get_topology_device(site, params['neighbors'])
+            neighbors = topology.neighbors(site.id, device_id)
+            devices = self.get_topology_devices(
+                site, [neighbor_id for neighbor_id, _ in neighbors]
+            )
+            return self.success([
+                {'device': device, 'circuits': circuit_ids}
+                for device, (_, circuit_ids) in zip(devices, neighbors)
+            ])
+
+        if 'source' in params or 'target' in params:
+            if not ('source' in params and 'target' in params):
+                raise exc.BadRequest(
+                    'Both source and target must be specified.'
+                )
+            source = self.get_topology_device(site, params['source'])
+            target = self.get_topology_device(site, params['target'])
+            path = topology.shortest_path(site.id, source, target)
+            if path is None:
+                raise exc.NotFound(
+                    'No path from %r to %r.' % (
+                        params['source'], params['target']
+                    )
+                )
+            device_ids, circuit_ids = path
+            return self.success({
+                'devices': self.get_topology_devices(site, device_ids),
+                'circuits': circuit_ids,
+            })
+
+        if 'component' in params:
+            device_id = self.get_topology_device(site, params['component'])
+            device_ids = topology.component(site.id, device_id)
+            return self.success(self.get_topology_devices(site, device_ids))
+
+        # Devices without Circuits are components of their own.
+        summary = topology.summary(site.id)
+        summary['devices'] = site.devices.count()
+        summary['components'] += (
+            summary['devices'] - summary['connected_devices']
+        )
+        return self.success(summary)
+
 
 class ValueViewSet(NsotViewSet):
     """
@@ -324,18 +579,259 @@ class NsotBulkUpdateModelMixin(bulk_mixins.BulkUpdateModelMixin):
     """
     The default mixin isn't using super() so multiple-inheritance breaks. This
     fixes it for our use-case.
+
+    Bulk updates of Resources fetch every object with one query, validate and
+    update them in memory, and then write them with a few queries per batch
+    of objects (see ``nsot.models.bulk``), rather than saving each object.
     """
+
+    #: Related objects fetched along with the objects to update.
+    bulk_select_related = ()
+
+    #: Fields that are set by ``perform_bulk_related()`` for each object.
+    bulk_related_fields = ()
+
     def perform_update(self, serializer):
         super(bulk_mixins.BulkUpdateModelMixin, self).perform_update(
             serializer
         )
 
+    def perform_bulk_related(self, obj, values, partial=False):
+        """
+        Set the ``bulk_related_fields`` of a saved object being updated.
+
+        :param obj:
+            Object being updated
+
+        :param values:
+            Dict of the validated values of ``bulk_related_fields``
+
+        :param partial:
+            Whether this is a partial update
+        """
+
+    def post_bulk_update(self, objects, changed):
+        """
+        Called after objects have been written by a bulk update.
+
+        :param objects:
+            List of updated objects
+
+        :param changed:
+            Dict of the names of the fields that changed, keyed by object id
+        """
+
+    def get_bulk_queryset(self):
+        """Return the queryset of the objects that may be bulk updated."""
+        queryset = self.filter_queryset(self.get_queryset())
+        site_pk = self.kwargs.get('site_pk')
+        if site_pk is not None:
+            queryset = queryset.filter(site=site_pk)
+        if self.bulk_select_related:
+            queryset = queryset.select_related(*self.bulk_select_related)
+        return queryset
+
+    def get_bulk_objects(self, data):
+        """
+        Return a list of the objects to update for each item of ``data``,
+        fetched with one query.
+
+        :param data:
+            List of dicts, each with the ``id`` of an object
+        """
+        if not isinstance(data, list):
+            raise exc.ValidationError(
+                'Expected a list of items but received {}'.format(type(data))
+            )
+
+        try:
+            ids = [int(item['id']) for item in data]
+        except (TypeError, KeyError, ValueError):
+            raise exc.ValidationError(
+                'Each item to update must include its integer id.'
+            )
+
+        found = self.get_bulk_queryset().in_bulk(ids)
+
+        if len(found) != len(set(ids)):
+            raise exc.ValidationError('Could not find all objects to update.')
+
+        return [found[pk] for pk in ids]
+
+    def bulk_update(self, request, *args, **kwargs):
+        """Update many objects at once."""
+        if not issubclass(self.queryset.model, models.Resource):
+            return super(NsotBulkUpdateModelMixin, self).bulk_update(
+                request, *args, **kwargs
+            )
+
+        partial = kwargs.pop('partial', False)
+        objects = self.get_bulk_objects(request.data)
+
+        # Validate every item before changing anything.
+        validated_data = []
+        validation_errors = []
+        for obj, item in zip(objects, request.data):
+            serializer = self.get_serializer(obj, data=item, partial=partial)
+            if serializer.is_valid():
+                validated_data.append(serializer.validated_data)
+            else:
+                validation_errors.append(serializer.errors)
+
+        if validation_errors:
+            raise exc.ValidationError(validation_errors)
+
+        try:
+            with transaction.atomic():
+                self.perform_bulk_update_objects(
+                    objects, validated_data, partial
+                )
+        except exc.DjangoValidationError as err:
+            raise exc.ValidationError(err.message_dict)
+        except exc.IntegrityError as err:
+            raise exc.Conflict(err.args[0])
+
+        # Respond with the objects as they were written, rather than as they
+        # were assigned (e.g. a MAC address is only formatted once it's read
+        # back from the database).
+        queryset = self.get_queryset()
+        if self.bulk_select_related:
+            queryset = queryset.select_related(*self.bulk_select_related)
+        found = queryset.in_bulk([obj.pk for obj in objects])
+
+        serializer = self.get_serializer(
+            [found[obj.pk] for obj in objects], many=True
+        )
+        return self.success(serializer.data)
+
+    def perform_bulk_update_objects(self, objects, validated_data, partial):
+        """
+        Apply ``validated_data`` to ``objects``, write them and record the
+        Changes.
+
+        :param objects:
+            List of objects to update
+
+        :param validated_data:
+            List of validated data for each of ``objects``
+
+        :param partial:
+            Whether this is a partial update
+        """
+        model = self.queryset.model
+        fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+        before = [
+            dict((f.attname, getattr(obj, f.attname)) for f in fields)
+            for obj in objects
+        ]
+
+        attributes = []
+        related = []
+        for obj, data in zip(objects, validated_data):
+            data = dict(data)
+            data.pop('id', None)
+            attributes.append(data.pop('attributes', None))
+            related.append(dict(
+                (name, data.pop(name)) for name in self.bulk_related_fields
+                if name in data
+            ))
+            for name, value in six.iteritems(data):
+                setattr(obj, name, value)
+
+        model.bulk_clean(objects)
+
+        for obj, values in zip(objects, related):
+            self.perform_bulk_related(obj, values, partial=partial)
+
+        bulk.bulk_set_attributes(objects, attributes, partial=partial)
+
+        # Only write the fields that changed, and only for the objects they
+        # changed on.
+        changed = {}
+        for obj, values in zip(objects, before):
+            names = [
+                f.name for f in fields
+                if getattr(obj, f.attname) != values[f.attname]
+            ]
+            if names:
+                changed[obj.pk] = names
+
+        names = set()
+        for obj_names in six.itervalues(changed):
+            names.update(obj_names)
+        bulk.bulk_update(
+            [obj for obj in objects if obj.pk in changed],
+            sorted(names)
+        )
+
+        self.post_bulk_update(objects, changed)
+
+        log.debug(
+            'NsotBulkUpdateModelMixin.bulk_update() changed = %r', changed
+        )
+        bulk.record_changes(objects, self.request.user, 'Update')
+
+
+class NsotBulkDestroyModelMixin(bulk_mixins.BulkDestroyModelMixin):
+    """
+    Delete many objects at once, given either a list of objects (each with an
+    ``id``) in the request body, or filters on the list endpoint. Subclasses
+    implement ``perform_bulk_destroy()`` to delete the objects with a few
+    queries per batch (see ``nsot.models.bulk``).
+    """
+
+    #: Query parameters allowed besides filters, which don't select the
+    #: objects to delete.
+    bulk_destroy_params = ('limit', 'offset')
+
+    def allow_bulk_destroy(self, qs, filtered):
+        """
+        Only delete objects selected by the filters of ``filter_class``, so
+        that no filters, or filters that would be ignored (e.g. a misspelled
+        name, or an empty value), never select every object.
+        """
+        params = self.request.query_params
+        filter_names = set(self.filter_class.base_filters)
+
+        unknown = set(params) - filter_names - set(self.bulk_destroy_params)
+        if unknown:
+            raise exc.BadRequest(
+                'Unknown filters: %s' % ', '.join(sorted(unknown))
+            )
+
+        return any(
+            value for name in filter_names for value in params.getlist(name)
+        )
+
+    def bulk_destroy(self, request, *args, **kwargs):
+        if request.data:
+            objects = self.get_bulk_objects(request.data)
+        else:
+            queryset = self.get_bulk_queryset()
+            if not self.allow_bulk_destroy(self.get_queryset(), queryset):
+                raise exc.BadRequest(
+                    'Provide the objects to delete, or filters to select '
+                    'them.'
+                )
+            objects = list(queryset)
+
+        with transaction.atomic():
+            self.perform_bulk_destroy(objects)
+
+        return Response(status=status_codes.HTTP_204_NO_CONTENT)
+
+    def perform_destroy(self, instance):
+        super(bulk_mixins.BulkDestroyModelMixin, self).perform_destroy(
+            instance
+        )
+
 
 class ResourceViewSet(NsotBulkUpdateModelMixin, NsotViewSet,
                       bulk_mixins.BulkCreateModelMixin):
     """
     Resource views that include set query list endpoints.
     """
+    version_fields = ('updated_at',)
 
     @list_route(methods=['get'])
     def query(self, request, site_pk=None, *args, **kwargs):
@@ -364,6 +860,15 @@ class ResourceViewSet(NsotBulkUpdateModelMixin, NsotViewSet,
 
         return obj
 
+    def filter_related(self, queryset, filter_class):
+        """
+        Filter a ``queryset`` of objects related to a resource object by the
+        query params, using the ``filter_class`` of their own model.
+        """
+        return filter_class(
+            self.request.query_params, queryset=queryset, request=self.request
+        ).qs
+
 
 class AttributeViewSet(ResourceViewSet):
     """
@@ -372,6 +877,7 @@ class AttributeViewSet(ResourceViewSet):
     queryset = models.Attribute.objects.all()
     serializer_class = serializers.AttributeSerializer
     filter_class = filters.AttributeFilter
+    version_fields = ()
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -381,7 +887,7 @@ class AttributeViewSet(ResourceViewSet):
         return self.serializer_class
 
 
-class DeviceViewSet(ResourceViewSet):
+class DeviceViewSet(NsotBulkDestroyModelMixin, ResourceViewSet):
     """
     API endpoint that allows Devices to be viewed or edited.
     """
@@ -390,6 +896,19 @@ class DeviceViewSet(ResourceViewSet):
     filter_class = filters.DeviceFilter
     natural_key = 'hostname'
 
+    def post_bulk_update(self, objects, changed):
+        """
+        Update the Interfaces and Protocols of Devices whose hostname changed.
+        """
+        renamed = [
+            obj for obj in objects if 'hostname' in changed.get(obj.pk, ())
+        ]
+        if renamed:
+            bulk.update_device_interfaces(renamed)
+
+    def perform_bulk_destroy(self, objects):
+        bulk.delete_devices(objects, self.request.user)
+
     def get_serializer_class(self):
         if self.request.method == 'POST':
             return serializers.DeviceCreateSerializer
@@ -404,7 +923,9 @@ class DeviceViewSet(ResourceViewSet):
     def interfaces(self, request, pk=None, site_pk=None, *args, **kwargs):
         """Return all interfaces for this Device."""
         device = self.get_resource_object(pk, site_pk)
-        interfaces = device.interfaces.all()
+        interfaces = self.filter_related(
+            device.interfaces.all(), filters.InterfaceFilter
+        )
 
         return self.list(request, queryset=interfaces, *args, **kwargs)
 
@@ -412,12 +933,12 @@ class DeviceViewSet(ResourceViewSet):
     def circuits(self, request, pk=None, site_pk=None, *args, **kwargs):
         """Return a list of Circuits for this Device"""
         device = self.get_resource_object(pk, site_pk)
-        circuits = device.circuits
+        circuits = self.filter_related(device.circuits, filters.CircuitFilter)
 
         return self.list(request, queryset=circuits, *args, **kwargs)
 
 
-class NetworkViewSet(ResourceViewSet):
+class NetworkViewSet(NsotBulkDestroyModelMixin, ResourceViewSet):
     """
     API endpoint that allows Networks to be viewed or edited.
     """
@@ -427,6 +948,14 @@ class NetworkViewSet(ResourceViewSet):
     lookup_value_regex = '[a-fA-F0-9:./]+'
     natural_key = 'cidr'
 
+    bulk_select_related = ('parent',)
+    bulk_destroy_params = (
+        'limit', 'offset', 'force_delete', 'include_descendants'
+    )
+
+    # Free space must be found from the latest allocations.
+    primary_actions = ('next_network', 'next_address')
+
     def allocate_networks(self, networks, site_pk, state='allocated'):
         site = models.Site.objects.get(pk=site_pk)
         for n in networks:
@@ -478,6 +1007,41 @@ class NetworkViewSet(ResourceViewSet):
 
         return self.retrieve(request, pk, site_pk, *args, **kwargs)
 
+    # Lookups don't change anything, so a POST only needs to be authenticated.
+    @list_route(
+        methods=['get', 'post'],
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def closest_parents(self, request, site_pk=None, *args, **kwargs):
+        """
+        Return the closest existing parent Network of each of many addresses
+        or CIDRs, given as ``cidrs`` in the query string or as a list in the
+        body of a POST.
+        """
+        if request.method == 'POST':
+            data = request.data
+            cidrs = data.get('cidrs', [])
+            prefix_length = data.get('prefix_length', 0)
+        else:
+            params = request.query_params
+            cidrs = params.getlist('cidrs')
+            prefix_length = params.get('prefix_length', 0)
+
+        if isinstance(cidrs, six.string_types) or not isinstance(
+            cidrs, (list, tuple)
+        ):
+            raise exc.ValidationError({
+                'cidrs': 'Expected a list of addresses or CIDRs.'
+            })
+
+        parents = models.Network.objects.get_closest_parents(
+            cidrs, prefix_length=prefix_length, site=site_pk
+        )
+        return self.success([
+            {'cidr': cidr, 'parent': parent and parent.to_dict()}
+            for cidr, parent in zip(cidrs, parents)
+        ])
+
     @detail_route(methods=['get'])
     def subnets(self, request, pk=None, site_pk=None, *args, **kwargs):
         """Return subnets of this Network."""
@@ -515,15 +1079,16 @@ class NetworkViewSet(ResourceViewSet):
         prefix_length = params.get('prefix_length')
         num = params.get('num')
         strict = qpbool(params.get('strict_allocation', False))
-        networks = network.get_next_network(
-            prefix_length, num, strict, as_objects=False
-        )
-        if request.method == 'POST':
-            if qpbool(params.get('reserve', False)):
-                state = models.Network.RESERVED
-            else:
-                state = models.Network.ALLOCATED
-            self.allocate_networks(networks, site_pk, state)
+        with metrics.time_next_network(request.method):
+            networks = network.get_next_network(
+                prefix_length, num, strict, as_objects=False
+            )
+            if request.method == 'POST':
+                if qpbool(params.get('reserve', False)):
+                    state = models.Network.RESERVED
+                else:
+                    state = models.Network.ALLOCATED
+                self.allocate_networks(networks, site_pk, state)
         return self.success(networks)
 
     @detail_route(methods=['get', 'post'])
@@ -567,6 +1132,49 @@ class NetworkViewSet(ResourceViewSet):
 
         return self.list(request, queryset=descendants, *args, **kwargs)
 
+    def iter_tree_json(self, tree):
+        """
+        Yield the JSON of Networks nested as ``children`` of each other.
+
+        :param tree:
+            Iterable of (network, level) from ``Network.iter_tree()``
+        """
+        previous = None
+        for network, level in tree:
+            if previous is not None:
+                if level <= previous:
+                    # Close the previous Network and the ones it's nested in
+                    # that aren't also containing this one.
+                    yield ']}' * (previous - level + 1) + ','
+            # Leave the object open for its children.
+            yield json.dumps(network.to_dict())[:-1] + ', "children": ['
+            previous = level
+
+        yield ']}' * (previous + 1)
+
+    @detail_route(methods=['get'])
+    def tree(self, request, pk=None, site_pk=None, *args, **kwargs):
+        """
+        Return this Network with its descendants nested under it as
+        ``children``, fetched with one query and streamed as they're read.
+        """
+        network = self.get_resource_object(pk, site_pk)
+        params = request.query_params
+
+        depth = params.get('depth')
+        if depth is not None:
+            if not depth.isdigit():
+                raise exc.ValidationError({
+                    'depth': 'Invalid depth: %r' % depth
+                })
+            depth = int(depth)
+        include_ips = qpbool(params.get('include_ips', True))
+
+        tree = network.iter_tree(depth=depth, include_ips=include_ips)
+        return StreamingHttpResponse(
+            self.iter_tree_json(tree), content_type='application/json'
+        )
+
     # TODO(jathan): Remove this no earlier than v1.3 release.
     @detail_route(methods=['get'])
     def descendents(self, request, pk=None, site_pk=None, *args, **kwargs):
@@ -668,8 +1276,20 @@ class NetworkViewSet(ResourceViewSet):
             change.delete()
             raise exc.Conflict(err.args[0])
 
+    def perform_bulk_destroy(self, objects):
+        """
+        Delete Networks, and their descendants if ``include_descendants`` is
+        set.
+        """
+        params = self.request.query_params
+        bulk.delete_networks(
+            objects, self.request.user,
+            force_delete=qpbool(params.get('force_delete', False)),
+            descendants=qpbool(params.get('include_descendants', False)),
+        )
+
 
-class InterfaceViewSet(ResourceViewSet):
+class InterfaceViewSet(NsotBulkDestroyModelMixin, ResourceViewSet):
     """
     API endpoint that allows Interfaces to be viewed or edited.
     """
@@ -680,6 +1300,29 @@ class InterfaceViewSet(ResourceViewSet):
     # Being pretty vague here, so as to be minimally prescriptive
     lookup_value_regex = '[a-zA-Z0-9:./-]*[0-9]'
     natural_key = 'name_slug'
+    bulk_select_related = ('device', 'parent')
+    bulk_related_fields = ('addresses',)
+    version_fields = ('updated_at', 'parent__updated_at')
+
+    def perform_bulk_related(self, obj, values, partial=False):
+        """Assign addresses, unless they are the ones already assigned."""
+        addresses = values.get('addresses')
+        if (
+            isinstance(addresses, list) and
+            sorted(addresses) == sorted(obj.get_addresses())
+        ):
+            return
+        obj.set_addresses(addresses, overwrite=True, partial=partial)
+
+    def post_bulk_update(self, objects, changed):
+        renamed = [
+            obj for obj in objects if 'name_slug' in changed.get(obj.pk, ())
+        ]
+        bulk.update_protocols(renamed)
+        models.interface.change_api_updated_at()
+
+    def perform_bulk_destroy(self, objects):
+        bulk.delete_interfaces(objects, self.request.user)
 
     @cache_response(cache_errors=False, key_func=cache.list_key_func)
     def list(self, *args, **kwargs):
@@ -788,56 +1431,24 @@ class CircuitViewSet(ResourceViewSet):
     serializer_class = serializers.CircuitSerializer
     filter_class = filters.CircuitFilter
     natural_key = 'name_slug'
-
-    # TODO(jathan): Revisit this if and when we upgrade or replace
-    # django-rest-framework-bulk==0.2.1
-    def bulk_update(self, request, *args, **kwargs):
-        """
-        Workaround for bulk update of objects with unique constraint.
-
-        At this time this is only required by the Circuit object, which is why
-        it is only defined here.
-
-        Credit: https://github.com/miki725/django-rest-framework-bulk/issues/30
-        Source: http://bit.ly/2HcyNnG
-        """
-        partial = kwargs.pop('partial', False)
-
-        # restrict the update to the filtered queryset
-        serializer = self.get_serializer(
-            self.filter_queryset(self.get_queryset()),
-            data=request.data,
-            many=True,
-            partial=partial,
+    bulk_select_related = ('endpoint_a', 'endpoint_z')
+    version_fields = (
+        'updated_at', 'endpoint_a__updated_at', 'endpoint_z__updated_at'
+    )
+
+    def post_bulk_update(self, objects, changed):
+        renamed = [
+            obj for obj in objects if 'name_slug' in changed.get(obj.pk, ())
+        ]
+        bulk.update_protocols(renamed)
+
+        endpoints = set(['endpoint_a', 'endpoint_z'])
+        site_ids = set(
+            obj.site_id for obj in objects
+            if endpoints.intersection(changed.get(obj.pk, ()))
         )
-
-        validated_data = []
-        validation_errors = []
-
-        for item in request.data:
-            item_serializer = self.get_serializer(
-                get_object_or_404(
-                    self.filter_queryset(self.get_queryset()), pk=item['id']
-                ),
-                data=item,
-                partial=partial,
-            )
-            if not item_serializer.is_valid():
-                validation_errors.append(item_serializer.errors)
-
-            obj_data = item_serializer.validated_data
-            # By default validated_data does not have `id`, so adding it in
-            # validated_data of each item
-            obj_data['id'] = item['id']
-            validated_data.append(obj_data)
-
-        if validation_errors:
-            raise exc.ValidationError(validation_errors)
-
-        serializer._validated_data = validated_data
-        self.perform_bulk_update(serializer)
-
-        return self.success(serializer.data)
+        for site_id in site_ids:
+            models.topology.invalidate(site_id)
 
     @cache_response(cache_errors=False, key_func=cache.list_key_func)
     def list(self, *args, **kwargs):
@@ -863,7 +1474,9 @@ class CircuitViewSet(ResourceViewSet):
     def addresses(self, request, pk=None, site_pk=None, *args, **kwargs):
         """Return a list of addresses for the interfaces on this Circuit."""
         circuit = self.get_resource_object(pk, site_pk)
-        addresses = circuit.addresses
+        addresses = self.filter_related(
+            circuit.addresses, filters.NetworkFilter
+        )
 
         return self.list(request, queryset=addresses, *args, **kwargs)
 
@@ -871,7 +1484,7 @@ class CircuitViewSet(ResourceViewSet):
     def devices(self, request, pk=None, site_pk=None, *args, **kwargs):
         """Return a list of devices for this Circuit."""
         circuit = self.get_resource_object(pk, site_pk)
-        devices = circuit.devices
+        devices = self.filter_related(circuit.devices, filters.DeviceFilter)
 
         return self.list(request, queryset=devices, *args, **kwargs)
 
@@ -879,7 +1492,9 @@ class CircuitViewSet(ResourceViewSet):
     def interfaces(self, request, pk=None, site_pk=None, *args, **kwargs):
         """Return a list of interfaces for this Circuit."""
         circuit = self.get_resource_object(pk, site_pk)
-        interfaces = circuit.interfaces
+        interfaces = self.filter_related(
+            circuit.interfaces, filters.InterfaceFilter
+        )
 
         return self.list(request, queryset=interfaces, *args, **kwargs)
 
@@ -901,6 +1516,7 @@ class ProtocolViewSet(ResourceViewSet):
     queryset = models.Protocol.objects.all()
     serializer_class = serializers.ProtocolSerializer
     filter_class = filters.ProtocolFilter
+    bulk_select_related = ('site', 'type', 'device', 'interface', 'circuit')
 
     def get_serializer_class(self):
         if self.request.method == 'POST':
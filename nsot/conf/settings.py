@@ -5,8 +5,6 @@ Django settings for nsot project using Django 1.8.
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 from __future__ import absolute_import
-import macaddress
-from netaddr import eui
 import os
 import re
 import sys
@@ -60,7 +58,9 @@ AUTHENTICATION_BACKENDS = (
 # A tuple of middleware classes to use.
 # https://docs.djangoproject.com/en/1.8/topics/http/middleware/
 MIDDLEWARE_CLASSES = (
+    'nsot.middleware.db.ConnectionMiddleware',
     'nsot.middleware.request_logging.LoggingMiddleware',
+    'nsot.middleware.metrics.MetricsMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -70,6 +70,7 @@ MIDDLEWARE_CLASSES = (
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'nsot.middleware.profiling.ProfilingMiddleware',
 )
 
 # A string representing the full Python import path to your root URLconf.
@@ -185,6 +186,22 @@ DATABASES = {
     }
 }
 
+# Sends read-only API requests to NSOT_READ_REPLICAS.
+DATABASE_ROUTERS = ['nsot.util.db.ReplicaRouter']
+
+# Aliases in DATABASES of read replicas of 'default'. Safe (GET, HEAD,
+# OPTIONS) API requests are served from a randomly chosen replica, except for
+# the Change log and network allocation endpoints, which always read from the
+# primary.
+# Default: []
+NSOT_READ_REPLICAS = []
+
+# Seconds after a user makes a change during which their requests are served
+# from the primary, so that they always see their own changes despite
+# replication lag.
+# Default: 10
+NSOT_READ_REPLICA_STICKY_SECONDS = 10
+
 #########
 # Cache #
 #########
@@ -208,16 +225,50 @@ CACHES = {
 # Back-end
 #
 
-# The type of workers to use.
+# The type of workers to use. One of 'sync' (one request at a time per
+# worker), 'gthread' (NSOT_WORKER_THREADS threads per worker) or 'gevent'
+# (NSOT_WORKER_CONNECTIONS greenlets per worker).
 # http://docs.gunicorn.org/en/latest/settings.html#worker-class
 # Default: 'gevent'
 NSOT_WORKER_CLASS = 'gevent'
 
+# The number of threads per worker when using the 'gthread' worker class.
+# http://docs.gunicorn.org/en/latest/settings.html#threads
+# Default: 4
+NSOT_WORKER_THREADS = 4
+
+# The maximum number of simultaneous requests per worker when using the
+# 'gevent' worker class.
+# http://docs.gunicorn.org/en/latest/settings.html#worker-connections
+# Default: 1000
+NSOT_WORKER_CONNECTIONS = 1000
+
+# The maximum number of database connections each worker process will use at
+# once. Each request borrows a connection for as long as it runs, and waits
+# for one to become free if they are all in use. Set to 0 to give every thread
+# (or greenlet) its own connection instead. Sync workers don't use a pool.
+# Whether connections are kept open between requests is controlled by
+# CONN_MAX_AGE in DATABASES.
+# Default: 10
+NSOT_DB_POOL_SIZE = 10
+
+# Seconds a request will wait for a free database connection before failing
+# with a 503 error.
+# Default: 30
+NSOT_DB_POOL_TIMEOUT = 30
+
 # Load application code before the worker processes are forked.
 # http://docs.gunicorn.org/en/latest/settings.html#preload-app
 # Default: False
 NSOT_PRELOAD = False
 
+# Start the server quickly: preload the application (as NSOT_PRELOAD), only
+# run the database upgrade if there are unapplied migrations, and report the
+# time taken to import each module. May also be enabled with the --fast-start
+# option of "nsot-server start".
+# Default: False
+NSOT_FAST_START = False
+
 # The maximum number of requests a worker will process before restarting.
 # http://docs.gunicorn.org/en/latest/settings.html#max-requests
 # Default: 0
@@ -384,6 +435,54 @@ LOGGING = {
     }
 }
 
+###################
+# Instrumentation #
+###################
+
+# Whether to record per-request query counts and the time spent in SQL,
+# serializers, signal handlers and authentication. These are added as fields
+# to the request log.
+# Default: True
+NSOT_INSTRUMENTATION = True
+
+# Whether to report per-request timings in a ``Server-Timing`` response header
+# when instrumentation is enabled.
+# Default: True
+NSOT_SERVER_TIMING = True
+
+# Fraction of requests (0.0 to 1.0) for which every SQL query is recorded. The
+# queries of a sampled request are logged if it takes at least
+# NSOT_SQL_TRACE_THRESHOLD_MS milliseconds.
+# Default: 0.0
+NSOT_SQL_TRACE_SAMPLE_RATE = 0.0
+
+# Duration in milliseconds above which a sampled request's SQL trace is logged.
+# Default: 1000
+NSOT_SQL_TRACE_THRESHOLD_MS = 1000
+
+# Whether to record Prometheus metrics and expose them at /metrics. The
+# endpoint doesn't require authentication, so only turn this on if it can't be
+# reached by untrusted clients.
+# Default: False
+NSOT_METRICS = False
+
+# Directory where gunicorn workers store their metrics so that they can be
+# aggregated. If unset, a temporary directory is created on startup and
+# removed on exit. Any metrics already in the directory are removed on startup.
+# Default: None
+NSOT_METRICS_DIR = None
+
+# Directory where request profiles are saved. Profiling is disabled unless
+# this is set. Superusers may then profile a request by setting the
+# ``X-NSoT-Profile`` header or the ``profile`` query parameter.
+# Default: None
+NSOT_PROFILE_DIR = None
+
+# Fraction of requests (0.0 to 1.0) that are profiled at random if
+# NSOT_PROFILE_DIR is set.
+# Default: 0.0
+NSOT_PROFILE_SAMPLE_RATE = 0.0
+
 ##############
 # Attributes #
 ##############
@@ -391,6 +490,14 @@ LOGGING = {
 # Acceptable regex pattern for naming Attribute objects.
 ATTRIBUTE_NAME = re.compile(r"^[a-z][a-z0-9_]*$")
 
+# Whether to keep an in-memory inverted index of attribute values in each
+# server process, used to evaluate set queries and attribute filters without
+# subqueries. Only used if a cache backend that retains values is configured
+# in CACHES, since it relies on the cache to notice changes made by other
+# processes.
+# Default: False
+NSOT_ATTRIBUTE_INDEX = False
+
 ###########
 # Devices #
 ###########
@@ -410,10 +517,9 @@ MACADDRESS_DEFAULT_DIALECT = 'macaddress.mac_linux'
 # specified.
 INTERFACE_DEFAULT_SPEED = 1000  # In Mbps (e.g. 1Gbps)
 
-# Default MAC address ('00:00:00:00:00:00')
-INTERFACE_DEFAULT_MAC = eui.EUI(
-    0, dialect=macaddress.default_dialect(), version=48
-)
+# Default MAC address. This may be any value accepted by netaddr.EUI.
+# Default: '00:00:00:00:00:00'
+INTERFACE_DEFAULT_MAC = '00:00:00:00:00:00'
 
 # These are mappings to the formal integer types from SNMP IF-MIB::ifType. The
 # types listed here are the most commonly found in the wild.
@@ -456,3 +562,18 @@ IP_VERSIONS = ('4', '6')
 # - Compressed: 2620:100:6000::/40
 # Default: True
 NSOT_COMPRESS_IPV6 = True
+
+# Whether to keep a compact in-memory snapshot of the Networks in each Site in
+# each server process, used to find supernets, subnets, utilization, closest
+# parents and free networks without range queries. Only used if a cache
+# backend that retains values is configured in CACHES, since it relies on the
+# cache to notice changes made by other processes.
+# Default: False
+NSOT_IPAM_SNAPSHOT = False
+
+# Directory in which to share IPAM snapshots between the server processes on a
+# host, which map them read-only rather than each keeping their own copy. It
+# must be writable by the server, and CACHES must be shared by all processes.
+# Only used if NSOT_IPAM_SNAPSHOT is enabled.
+# Default: None
+NSOT_IPAM_SNAPSHOT_DIR = None
@@ -4,10 +4,10 @@ from django.conf import settings
 from django.conf.urls import include, url
 from django.contrib import admin
 from django.views.generic import RedirectView
-from rest_framework_swagger.views import get_swagger_view
 
 from ..api.views import NotFoundViewSet
 from ..ui.views import FeView
+from ..util.metrics import metrics_view
 
 
 # Custom error-handling views.
@@ -16,8 +16,19 @@ handler403 = 'nsot.ui.views.handle403'
 handler404 = 'nsot.ui.views.handle404'
 handler500 = 'nsot.ui.views.handle500'
 
-# This is the basic API explorer for Swagger/OpenAPI 2.0
-schema_view = get_swagger_view(title='NSoT API')
+_schema_view = None
+
+
+def schema_view(request, *args, **kwargs):
+    """
+    This is the basic API explorer for Swagger/OpenAPI 2.0. Swagger is only
+    loaded when the explorer is first used.
+    """
+    global _schema_view
+    if _schema_view is None:
+        from rest_framework_swagger.views import get_swagger_view
+        _schema_view = get_swagger_view(title='NSoT API')
+    return _schema_view(request, *args, **kwargs)
 
 
 urlpatterns = [
@@ -33,6 +44,9 @@ urlpatterns = [
     # Admin
     url(r'^admin/', include(admin.site.urls)),
 
+    # Prometheus metrics
+    url(r'^metrics/?$', metrics_view, name='metrics'),
+
     # Favicon redirect for when people insist on fetching it from /favicon.ico
     url(
         r'^favicon\.ico$',
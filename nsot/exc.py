@@ -5,7 +5,7 @@ import logging
 
 from django.core.exceptions import (
     ValidationError as DjangoValidationError, ObjectDoesNotExist,
-    MultipleObjectsReturned
+    MultipleObjectsReturned, NON_FIELD_ERRORS
 )
 from django.db import IntegrityError
 from django.db.models import ProtectedError
@@ -21,7 +21,8 @@ __all__ = (
     'Error', 'ModelError', 'BaseHttpError', 'BadRequest', 'Unauthorized',
     'Forbidden', 'NotFound', 'Conflict', 'DjangoValidationError',
     'ObjectDoesNotExist', 'ProtectedError', 'ValidationError',
-    'MultipleObjectsReturned'
+    'MultipleObjectsReturned', 'NON_FIELD_ERRORS', 'NotModified',
+    'ServiceUnavailable'
 )
 
 
@@ -83,6 +84,11 @@ class BaseHttpError(Error):
     pass
 
 
+class NotModified(BaseHttpError):
+    """HTTP 304 response to a conditional request."""
+    status_code = 304
+
+
 class BadRequest(BaseHttpError):
     """HTTP 400 error."""
     status_code = 400
@@ -107,3 +113,8 @@ class NotFound(BaseHttpError):
 class Conflict(BaseHttpError, IntegrityError):
     """HTTP 409 error."""
     status_code = 409
+
+
+class ServiceUnavailable(BaseHttpError):
+    """HTTP 503 error."""
+    status_code = 503
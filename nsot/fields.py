@@ -2,8 +2,10 @@
 from __future__ import unicode_literals
 
 from __future__ import absolute_import
+import binascii
+import functools
+
 from django.conf import settings
-from django.db.backends.sqlite3.base import DatabaseWrapper
 from django.db import models
 from django.utils.datastructures import DictWrapper
 from django_extensions.db.fields.json import JSONField
@@ -16,19 +18,30 @@ from . import exc
 
 
 __all__ = (
-    'BinaryIPAddressField', 'JSONField', 'MACAddressField'
+    'IPAddress', 'BinaryIPAddressField', 'JSONField', 'MACAddressField'
 )
 
 
 log = logging.getLogger(__name__)
 
 
-if not hasattr(DatabaseWrapper, 'get_new_connection_is_patched'):
+def patch_sqlite():
     """
     Monkey-patch SQLite3 driver to handle text as bytes.
 
+    This is only done if SQLite is used, so that other backends don't import
+    the driver.
+
     Credit: http://stackoverflow.com/a/28794677/194311
     """
+    engines = [db.get('ENGINE', '') for db in settings.DATABASES.values()]
+    if not any(engine.endswith('sqlite3') for engine in engines):
+        return
+
+    from django.db.backends.sqlite3.base import DatabaseWrapper
+    if hasattr(DatabaseWrapper, 'get_new_connection_is_patched'):
+        return
+
     _get_new_connection = DatabaseWrapper.get_new_connection
 
     def _get_new_connection_tolerant(self, conn_params):
@@ -40,6 +53,183 @@ if not hasattr(DatabaseWrapper, 'get_new_connection_is_patched'):
     DatabaseWrapper.get_new_connection_is_patched = True
 
 
+patch_sqlite()
+
+
+def _format_ipv6(number, compress):
+    """Format the IPv6 address ``number`` the same way as ``ipaddress``."""
+    shifts = range(112, -16, -16)
+    if not compress:
+        return ':'.join('%04x' % ((number >> i) & 0xffff) for i in shifts)
+
+    hextets = ['%x' % ((number >> i) & 0xffff) for i in shifts]
+
+    # Replace the longest run of two or more zeroes with '::'.
+    best_start, best_len, start, length = -1, 0, -1, 0
+    for i, hextet in enumerate(hextets):
+        if hextet == '0':
+            length += 1
+            if start == -1:
+                start = i
+            if length > best_len:
+                best_start, best_len = start, length
+        else:
+            start, length = -1, 0
+
+    if best_len > 1:
+        end = best_start + best_len
+        if end == len(hextets):
+            hextets.append('')
+        hextets[best_start:end] = ['']
+        if best_start == 0:
+            hextets.insert(0, '')
+
+    return ':'.join(hextets)
+
+
+@functools.total_ordering
+@six.python_2_unicode_compatible
+class IPAddress(object):
+    """
+    Compact IP address read from the database.
+
+    Addresses are kept as an integer and IP version. They are only formatted
+    as a string (which is then cached) or parsed into an ``ipaddress`` object
+    when needed. Addresses read from Postgres arrive as strings, and are only
+    parsed into an integer when needed.
+
+    An ``IPAddress`` is equal to any string spelling the same address, so it
+    may be compared wherever the address used to be a string. Comparisons use
+    the IP version and integer, so ``2001:db8::`` and ``2001:0db8:0000:...``
+    are the same address. It hashes like its canonical spelling, as formatted
+    from the integer, so it may be looked up in a dict or set by that string,
+    but not by any other spelling.
+    """
+    __slots__ = ('_int', 'version', '_text')
+
+    def __init__(self, number=None, version=4, text=None):
+        self._int = number
+        self.version = version
+        self._text = text
+
+    @classmethod
+    def from_packed(cls, packed):
+        """Return an address from its 4 or 16 byte packed representation."""
+        packed = bytes(packed)
+        if len(packed) == 4:
+            version = 4
+        elif len(packed) == 16:
+            version = 6
+        else:
+            raise ValueError('Invalid packed IP address: %r' % packed)
+
+        if hasattr(int, 'from_bytes'):
+            number = int.from_bytes(packed, 'big')
+        else:
+            number = int(binascii.hexlify(packed), 16)
+        return cls(number, version)
+
+    @classmethod
+    def from_text(cls, text):
+        """Return an address from a string that is known to be valid."""
+        text = six.text_type(text)
+        return cls(version=6 if ':' in text else 4, text=text)
+
+    @classmethod
+    def from_ip_address(cls, address):
+        """Return an address from an ``ipaddress`` address object."""
+        return cls(int(address), address.version)
+
+    def __int__(self):
+        if self._int is None:
+            self._int = int(ipaddress.ip_address(self._text))
+        return self._int
+
+    __index__ = __int__
+
+    def _format(self):
+        """Return the canonical spelling of the address."""
+        number = int(self)
+        if self.version == 4:
+            return '%d.%d.%d.%d' % (
+                number >> 24, (number >> 16) & 0xff,
+                (number >> 8) & 0xff, number & 0xff,
+            )
+        return _format_ipv6(number, settings.NSOT_COMPRESS_IPV6)
+
+    def __str__(self):
+        text = self._text
+        if text is None:
+            text = self._text = self._format()
+        return text
+
+    def __repr__(self):
+        return 'IPAddress(%r)' % six.text_type(self)
+
+    def __reduce__(self):
+        return (self.__class__, (int(self), self.version))
+
+    def __hash__(self):
+        # IPv4 addresses have only one spelling, but IPv6 text read from the
+        # database or parsed from input may not be the canonical one.
+        if self._text is not None and self.version == 4:
+            return hash(self._text)
+        return hash(self._format())
+
+    def _coerce(self, other):
+        if isinstance(other, IPAddress):
+            return other
+        if isinstance(other, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+            return IPAddress.from_ip_address(other)
+        if isinstance(other, six.string_types):
+            try:
+                address = ipaddress.ip_address(six.text_type(other))
+            except ValueError:
+                return None
+            return IPAddress.from_ip_address(address)
+        return None
+
+    def __eq__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return (self.version, int(self)) == (other.version, int(other))
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        if result is NotImplemented:
+            return result
+        return not result
+
+    def __lt__(self, other):
+        other = self._coerce(other)
+        if other is None:
+            return NotImplemented
+        return (self.version, int(self)) < (other.version, int(other))
+
+    @property
+    def packed(self):
+        """The address as packed big-endian bytes."""
+        length = 4 if self.version == 4 else 16
+        data = '%0*x' % (length * 2, int(self))
+        return binascii.unhexlify(data.encode('ascii'))
+
+    @property
+    def ip_address(self):
+        """The address as an ``ipaddress`` object."""
+        if self.version == 4:
+            return ipaddress.IPv4Address(int(self))
+        return ipaddress.IPv6Address(int(self))
+
+    @property
+    def exploded(self):
+        return self.ip_address.exploded
+
+    @property
+    def compressed(self):
+        return self.ip_address.compressed
+
+
 class BinaryIPAddressField(models.Field):
     """IP Address field that stores values as varbinary."""
     def __init__(self, *args, **kwargs):
@@ -74,11 +264,19 @@ class BinaryIPAddressField(models.Field):
         if value is None:
             return value
 
-        return self._parse_ip_address(value)
+        # Postgres returns 'inet' values as strings, with IPv6 addresses
+        # always compressed.
+        if connection.vendor == 'postgresql':
+            if ':' in value and not settings.NSOT_COMPRESS_IPV6:
+                value = self._parse_ip_address(value)
+            return IPAddress.from_text(value)
+
+        return IPAddress.from_packed(value)
 
     def to_python(self, value):
         """Object -> Python."""
-        if isinstance(value, (ipaddress.IPv4Address, ipaddress.IPv6Address)):
+        if isinstance(value, (ipaddress.IPv4Address, ipaddress.IPv6Address,
+                              IPAddress)):
             return value
 
         if value is None:
@@ -94,11 +292,15 @@ class BinaryIPAddressField(models.Field):
 
         engine = connection.settings_dict['ENGINE']
 
-        # Send the value as-is to Postgres.
+        # Send the value as a string to Postgres.
         if 'postgres' in engine:
+            if isinstance(value, IPAddress):
+                return six.text_type(value)
             return value
 
         # Or packed binary for everyone else.
+        if isinstance(value, IPAddress):
+            return value.packed
         return ipaddress.ip_address(value).packed
 
 
@@ -0,0 +1,53 @@
+from __future__ import absolute_import, print_function
+
+"""
+Command to export the contents of the database as NDJSON.
+"""
+
+import io
+
+from nsot.util import transfer
+from nsot.util.commands import NsotCommand
+
+
+class Command(NsotCommand):
+    help = (
+        'Export Sites and their Attributes, Devices, Networks, Interfaces, '
+        'Circuits, Protocols and Values as NDJSON.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-o', '--output',
+            default='-',
+            help='File to write the export to ("-" for stdout).',
+        )
+        parser.add_argument(
+            '-s', '--site',
+            action='append',
+            type=int,
+            dest='sites',
+            help='ID of a Site to export (may be repeated). Default: all.',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=transfer.CHUNK_SIZE,
+            help='Number of objects to fetch from the database at once.',
+        )
+
+    def handle(self, **options):
+        output = options['output']
+        kwargs = {
+            'site_ids': options.get('sites'),
+            'chunk_size': options['chunk_size'],
+        }
+
+        if output == '-':
+            counts = transfer.export(self.stdout, **kwargs)
+        else:
+            with io.open(output, 'w', encoding='utf-8') as fh:
+                counts = transfer.export(fh, **kwargs)
+
+        # Written to stderr, as the export itself may be going to stdout.
+        self.stderr.write('Exported %d objects.' % sum(counts.values()))
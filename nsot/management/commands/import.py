@@ -0,0 +1,87 @@
+from __future__ import absolute_import, print_function
+
+"""
+Command to import an export made by ``nsot-server export``.
+"""
+
+import io
+import multiprocessing
+import sys
+
+from nsot.util import transfer
+from nsot.util.commands import NsotCommand, CommandError
+
+
+class Command(NsotCommand):
+    help = (
+        'Import an export made with the "export" command. If an import is '
+        'interrupted, run it again to resume from where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'input',
+            help='File to read the export from ("-" for stdin).',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=transfer.CHUNK_SIZE,
+            help='Number of objects to insert in each transaction.',
+        )
+        parser.add_argument(
+            '-w', '--workers',
+            type=int,
+            default=1,
+            help=(
+                'Number of processes validating objects in parallel (0 for '
+                'one per CPU).'
+            ),
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help=(
+                'File recording the progress of the import. Default: the '
+                'input file name with ".checkpoint" appended.'
+            ),
+        )
+        parser.add_argument(
+            '--no-resume',
+            action='store_false',
+            dest='resume',
+            default=True,
+            help='Start from the beginning, ignoring any checkpoint.',
+        )
+
+    def handle(self, **options):
+        path = options['input']
+        checkpoint = options.get('checkpoint')
+        if checkpoint is None and path != '-':
+            checkpoint = path + '.checkpoint'
+
+        workers = options['workers']
+        if workers < 1:
+            workers = multiprocessing.cpu_count()
+
+        importer = transfer.Importer(
+            chunk_size=options['chunk_size'],
+            checkpoint=checkpoint,
+            resume=options['resume'],
+            workers=workers,
+        )
+
+        try:
+            if path == '-':
+                counts = importer.run(sys.stdin)
+            else:
+                with io.open(path, encoding='utf-8') as fh:
+                    counts = importer.run(fh)
+        except (IOError, transfer.TransferError) as err:
+            raise CommandError(str(err))
+
+        for name, _ in transfer.MODELS:
+            self.stdout.write(
+                '%s: %d imported, %d already existed.' % (
+                    name, counts[name], importer.skipped[name]
+                )
+            )
@@ -0,0 +1,99 @@
+from __future__ import absolute_import, print_function
+
+"""
+Command for listing and summarizing captured request profiles.
+"""
+
+import os
+
+from django.conf import settings
+
+from nsot.util import profiling
+from nsot.util.commands import NsotCommand, CommandError
+
+
+class Command(NsotCommand):
+    help = (
+        'List captured request profiles, or summarize the hottest functions '
+        'of the named profiles.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names',
+            nargs='*',
+            help='Names of profiles to summarize together.',
+        )
+        parser.add_argument(
+            '-a', '--all',
+            action='store_true',
+            default=False,
+            help='Summarize all profiles.',
+        )
+        parser.add_argument(
+            '-p', '--path',
+            help='Only include profiles of requests whose path contains this.',
+        )
+        parser.add_argument(
+            '-s', '--sort',
+            default='tottime',
+            choices=('tottime', 'cumulative', 'ncalls'),
+            help='How to rank functions in the summary.',
+        )
+        parser.add_argument(
+            '-l', '--limit',
+            type=int,
+            default=20,
+            help='Number of functions to include in the summary.',
+        )
+        parser.add_argument(
+            '-d', '--directory',
+            default=settings.NSOT_PROFILE_DIR,
+            help='Directory where profiles are stored.',
+        )
+
+    def handle(self, **options):
+        directory = options.get('directory')
+        if not directory:
+            raise CommandError(
+                'No profile directory. Set NSOT_PROFILE_DIR or use '
+                '--directory.'
+            )
+
+        profiles = profiling.list_profiles(directory)
+        path = options.get('path')
+        if path:
+            slug = profiling.slugify_path(path)
+            profiles = [p for p in profiles if slug in p['path']]
+
+        names = options.get('names')
+        if names:
+            known = set(p['name'] for p in profiles)
+            missing = [n for n in names if n not in known]
+            if missing:
+                raise CommandError(
+                    'No such profiles: %s' % ', '.join(missing)
+                )
+        elif options.get('all'):
+            names = [p['name'] for p in profiles]
+        else:
+            self.list_profiles(profiles)
+            return
+
+        if not names:
+            raise CommandError('No profiles to summarize.')
+
+        paths = [os.path.join(directory, name) for name in names]
+        self.stdout.write(
+            profiling.summarize(
+                paths, sort=options['sort'], limit=options['limit']
+            )
+        )
+
+    def list_profiles(self, profiles):
+        for profile in profiles:
+            self.stdout.write(
+                '%(name)s\n    %(timestamp)s %(method)s %(path)s '
+                '%(duration)dms' % profile
+            )
+        self.stdout.write('%d profile(s)' % len(profiles))
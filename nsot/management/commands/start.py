@@ -9,6 +9,7 @@ from django.core.management import call_command
 import sys
 
 from nsot.services import http
+from nsot.util import startup
 from nsot.util.commands import NsotCommand, CommandError
 
 
@@ -28,6 +29,16 @@ class Command(NsotCommand):
             default=False,
             help='Toggle debug output.',
         )
+        parser.add_argument(
+            '--fast-start',
+            action='store_true',
+            default=settings.NSOT_FAST_START,
+            help=(
+                'Load the application once before forking workers, only '
+                'upgrade the database if there are unapplied migrations, and '
+                'report the time taken to import each module.'
+            ),
+        )
         parser.add_argument(
             '--max-requests',
             type=int,
@@ -83,9 +94,25 @@ class Command(NsotCommand):
         parser.add_argument(
             '-k', '--worker-class',
             type=str,
+            choices=http.WORKER_CLASSES,
             default=settings.NSOT_WORKER_CLASS,
             help='The type of gunicorn workers to use.',
         )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=settings.NSOT_WORKER_THREADS,
+            help='The number of threads per worker (gthread workers only).',
+        )
+        parser.add_argument(
+            '--worker-connections',
+            type=int,
+            default=settings.NSOT_WORKER_CONNECTIONS,
+            help=(
+                'The maximum number of simultaneous requests per worker '
+                '(gevent workers only).'
+            ),
+        )
         parser.add_argument(
             '-t', '--timeout',
             type=int,
@@ -121,6 +148,13 @@ class Command(NsotCommand):
         }
 
         # Ensure we perform an upgrade before starting any service.
+        fast_start = options.get('fast_start')
+        if options.get('upgrade') and fast_start:
+            pending = startup.get_pending_migrations()
+            if not pending:
+                print("Database schema is up to date, skipping upgrade.")
+                options['upgrade'] = False
+
         if options.get('upgrade'):
             print("Performing upgrade before service startup...")
             call_command(
@@ -145,10 +179,13 @@ class Command(NsotCommand):
             port=port,
             workers=options.get('workers'),
             worker_class=options.get('worker_class'),
+            threads=options.get('threads'),
+            worker_connections=options.get('worker_connections'),
             timeout=options.get('timeout'),
             max_requests=options.get('max_requests'),
             max_requests_jitter=options.get('max_requests_jitter'),
             preload=options.get('preload'),
+            fast_start=fast_start,
         )
 
         # Remove command line arguments to avoid optparse failures with service
@@ -0,0 +1,40 @@
+"""
+Middleware to manage the database connections used by requests.
+"""
+
+from __future__ import absolute_import
+import logging
+
+from django.http import JsonResponse
+
+from ..util import db
+
+
+log = logging.getLogger(__name__)
+
+
+class ConnectionMiddleware(object):
+    """
+    Installs a pooled database connection for the duration of each request,
+    and has it read from the primary until an API view picks a replica.
+
+    This must come first, so that every other middleware uses the pooled
+    connection. The connection is returned to the pool when the request
+    finishes (see ``nsot.util.db``).
+    """
+    def process_request(self, request):
+        db.use_primary()
+
+        pool = db.get_pool()
+        if pool is None:
+            return None
+
+        try:
+            pool.acquire()
+        except db.PoolTimeout as err:
+            log.warning('%s %s: %s', request.method, request.path, err)
+            return JsonResponse(
+                {'error': {'message': str(err), 'code': 503}}, status=503
+            )
+
+        return None
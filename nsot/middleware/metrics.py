@@ -0,0 +1,31 @@
+"""
+Middleware to record Prometheus metrics for HTTP requests.
+"""
+
+from __future__ import absolute_import
+from time import time
+
+from ..util import instrumentation, metrics
+
+
+class MetricsMiddleware(object):
+    """
+    Records request counts and latencies per view and action.
+
+    This must come after ``LoggingMiddleware`` so that the request's
+    instrumentation is still available when the response is processed.
+    """
+    def __init__(self):
+        metrics.install()
+
+    def process_request(self, request):
+        request.metrics_timer = time()
+        return None
+
+    def process_response(self, request, response):
+        if metrics.enabled() and hasattr(request, 'metrics_timer'):
+            metrics.observe_request(
+                request, response, time() - request.metrics_timer,
+                instrumentation.current()
+            )
+        return response
@@ -0,0 +1,48 @@
+"""
+Middleware to profile HTTP requests.
+"""
+
+from __future__ import absolute_import
+import logging
+from time import time
+
+from django.conf import settings
+
+from ..util import profiling
+
+
+log = logging.getLogger(__name__)
+
+
+class ProfilingMiddleware(object):
+    """
+    Finishes the profiles of requests and saves them to ``NSOT_PROFILE_DIR``.
+
+    Profiles are started by the API views once the request has been
+    authenticated (see ``nsot.util.profiling.start_profile()``). The name of
+    the saved profile is returned in the ``X-NSoT-Profile`` response header.
+
+    This must be the last middleware, so that its ``process_response()`` is
+    the first to be called, right after the response has been rendered.
+    """
+    def process_response(self, request, response):
+        profiler = getattr(request, 'profiler', None)
+        if profiler is None:
+            return response
+
+        profiler.disable()
+        request.profiler = None
+        duration = time() - request.profile_started
+
+        try:
+            name = profiling.save_profile(
+                profiler, settings.NSOT_PROFILE_DIR, request.method,
+                request.path, duration
+            )
+        except (IOError, OSError) as err:
+            log.error('Unable to save profile: %s', err)
+        else:
+            log.info('Saved profile: %s', name)
+            response['X-NSoT-Profile'] = name
+
+        return response
@@ -6,6 +6,10 @@ from __future__ import absolute_import
 import logging
 from time import time
 
+from django.conf import settings
+
+from ..util import instrumentation
+
 
 class LoggingMiddleware(object):
     def __init__(self):
@@ -13,9 +17,16 @@ class LoggingMiddleware(object):
 
     def process_request(self, request):
         request.timer = time()
+        request.metrics = instrumentation.start()
         return None
 
     def process_response(self, request, response):
+        # Always clear the thread's metrics, but only report them for requests
+        # they were started for. If an earlier middleware answered the
+        # request, process_request() wasn't called for it.
+        instrumentation.finish()
+        metrics = getattr(request, 'metrics', None)
+
         if 'HTTP_X_FORWARDED_FOR' in request.META:
             request_ip_path = '%s, %s' % (
                 request.META.get('REMOTE_ADDR'),
@@ -23,12 +34,63 @@ class LoggingMiddleware(object):
             )
         else:
             request_ip_path = request.META.get('REMOTE_ADDR')
+
+        duration = (time() - getattr(request, 'timer', time())) * 1000  # ms
+        if metrics is None:
+            self.logger.info(
+                '%s %s %s (%s) %.2fms',
+                response.status_code,
+                request.method,
+                request.get_full_path(),
+                request_ip_path,
+                duration
+            )
+            return response
+
+        data = metrics.to_dict()
+        extra = dict(
+            data,
+            status_code=response.status_code,
+            method=request.method,
+            path=request.get_full_path(),
+            remote_addr=request_ip_path,
+        )
         self.logger.info(
-            '%s %s %s (%s) %.2fms',
+            '%s %s %s (%s) %.2fms queries=%d sql=%.2fms cache=%d/%d '
+            'serializer=%.2fms signal=%.2fms auth=%.2fms',
             response.status_code,
             request.method,
-            request.get_full_path(),
+            extra['path'],
             request_ip_path,
-            (time() - request.timer) * 1000  # ms
+            duration,
+            data['sql_count'],
+            data['sql_ms'],
+            data['cache_hits'],
+            data['cache_misses'],
+            data['serializer_ms'],
+            data['signal_ms'],
+            data['auth_ms'],
+            extra=extra
         )
+
+        if getattr(settings, 'NSOT_SERVER_TIMING', True):
+            response['Server-Timing'] = metrics.server_timing(data)
+
+        threshold = getattr(settings, 'NSOT_SQL_TRACE_THRESHOLD_MS', 1000)
+        if metrics.trace is not None and data['duration_ms'] >= threshold:
+            self.log_trace(request, metrics, data)
+
         return response
+
+    def log_trace(self, request, metrics, data):
+        """Log every query made by a slow request."""
+        lines = [
+            '%8.2fms  %s' % (elapsed * 1000, sql)
+            for sql, elapsed in metrics.trace
+        ]
+        self.logger.warning(
+            'Slow request %s %s %.2fms, %d queries:\n%s',
+            request.method, request.get_full_path(), data['duration_ms'],
+            data['sql_count'], '\n'.join(lines),
+            extra={'sql_trace': metrics.trace}
+        )
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-19 12:00
+from __future__ import unicode_literals
+
+from __future__ import absolute_import
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nsot', '0038_make_interface_speed_nullable'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='circuit',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, help_text='When this object was last changed. (Internal use only)'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='device',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, help_text='When this object was last changed. (Internal use only)'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='interface',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, help_text='When this object was last changed. (Internal use only)'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='network',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, help_text='When this object was last changed. (Internal use only)'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='protocol',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, default=django.utils.timezone.now, help_text='When this object was last changed. (Internal use only)'),
+            preserve_default=False,
+        ),
+    ]
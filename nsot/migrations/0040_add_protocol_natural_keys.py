@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.16 on 2026-10-19 12:00
+from __future__ import unicode_literals
+
+from __future__ import absolute_import
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nsot', '0039_resource_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='protocol',
+            name='circuit_name_slug',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='The natural key of the Circuit. (Internal use only)', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='protocol',
+            name='device_hostname',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='The hostname of the Device. (Internal use only)', max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='protocol',
+            name='interface_name_slug',
+            field=models.CharField(blank=True, db_index=True, editable=False, help_text='The natural key of the Interface. (Internal use only)', max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='protocol',
+            name='type_name',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, help_text='The name of the ProtocolType. (Internal use only)', max_length=255),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,31 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from __future__ import absolute_import
+from django.db import migrations
+
+
+def add_natural_keys(apps, schema_editor):
+    """Cache the natural keys of the related objects on every Protocol."""
+    Protocol = apps.get_model('nsot', 'Protocol')
+    protocols = Protocol.objects.select_related(
+        'type', 'device', 'interface', 'circuit'
+    )
+    for p in protocols.iterator():
+        Protocol.objects.filter(pk=p.pk).update(
+            type_name=p.type.name,
+            device_hostname=p.device.hostname,
+            interface_name_slug=p.interface and p.interface.name_slug,
+            circuit_name_slug=p.circuit and p.circuit.name_slug,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nsot', '0040_add_protocol_natural_keys'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_natural_keys, migrations.RunPython.noop)
+    ]
@@ -2,8 +2,10 @@
 from __future__ import absolute_import
 from django.db import models as djmodels
 
+from ..util import instrumentation
 from .assignment import Assignment
 from .attribute import Attribute
+from .attribute_index import attribute_index
 from .change import Change
 from .circuit import Circuit
 from .device import Device
@@ -13,6 +15,7 @@ from .protocol import Protocol
 from .protocol_type import ProtocolType
 from .resource import Resource
 from .site import Site
+from .topology import topology  # noqa
 from .user import User
 from .value import Value
 
@@ -34,9 +37,13 @@ __all__ = [
 
 
 # Global signals
+@instrumentation.timed('signal')
 def delete_resource_values(sender, instance, **kwargs):
     """Delete values when a Resource object is deleted."""
     instance.attributes.delete()  # These are instances of Value
+    attribute_index.update_resource(
+        instance, instance._attributes_cache, {}
+    )
 
 
 resource_subclasses = Resource.__subclasses__()
@@ -1,16 +1,25 @@
 from __future__ import unicode_literals
 
 from __future__ import absolute_import
+import logging
 import re
 
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction, DEFAULT_DB_ALIAS
 import six
 
 from .. import exc, fields, validators
+from ..util import instrumentation, versions
 from . import constants
 
 
+log = logging.getLogger(__name__)
+
+
+#: Name of the version used to invalidate cached attribute schemas.
+SCHEMA_VERSION = 'attribute_schema'
+
+
 class Attribute(models.Model):
     """Represents a flexible attribute for Resource objects."""
     # This is purposely not unique as there is a compound index with site_id.
@@ -78,12 +87,9 @@ class Attribute(models.Model):
         if site is None:
             raise SyntaxError('You must provided a site.')
 
-        query = cls.objects.filter(resource_name=resource_name, site=site)
-
-        return {
-            attribute.name: attribute
-            for attribute in query.all()
-        }
+        # Return a copy so callers may safely add or remove keys.
+        site_id = getattr(site, 'pk', site)
+        return dict(schema_cache.get_attributes(resource_name, site_id))
 
     def clean_constraints(self, value):
         """Enforce formatting of constraints."""
@@ -144,40 +150,23 @@ class Attribute(models.Model):
         self.resource_name = self.clean_resource_name(self.resource_name)
         self.name = self.clean_name(self.name)
 
-    def _validate_single_value(self, value, constraints=None):
-        if not isinstance(value, six.string_types):
-            raise exc.ValidationError({
-                'value': 'Attribute values must be a string type'
-            })
-
-        if constraints is None:
-            constraints = self.constraints
-
-        allow_empty = constraints.get('allow_empty', False)
-        if not allow_empty and not value:
-            raise exc.ValidationError({
-                'constraints': "Attribute {} doesn't allow empty values"
-                .format(self.name)
-            })
+    def get_validator(self):
+        """
+        Return the ``AttributeValidator`` for this Attribute's constraints.
 
-        pattern = constraints.get('pattern')
-        if pattern and not re.match(pattern, value):
-            raise exc.ValidationError({
-                'pattern': "Attribute value {} for {} didn't match pattern: {}"
-                .format(value, self.name, pattern)
-            })
+        The validator is memoized on the instance for as long as the
+        constraints are unchanged, so Attributes held by the schema cache
+        resolve it only once.
+        """
+        constraints = self.constraints
+        memo = getattr(self, '_validator', None)
+        if memo is not None and memo[0] == constraints:
+            return memo[1]
 
-        valid_values = set(constraints.get('valid_values', []))
-        if valid_values and value not in valid_values:
-            raise exc.ValidationError(
-                'Attribute value {} for {} not a valid value: {}'
-                .format(value, self.name, ', '.join(valid_values))
-            )
+        validator = AttributeValidator.for_constraints(self.name, constraints)
+        self._validator = (dict(constraints), validator)
 
-        return {
-            'attribute_id': self.id,
-            'value': value,
-        }
+        return validator
 
     def validate_value(self, value):
         if self.multi:
@@ -188,13 +177,11 @@ class Attribute(models.Model):
         else:
             value = [value]
 
-        inserts = []
-        # This does a deserialization so save the result
-        constraints = self.constraints
-        for val in value:
-            inserts.append(self._validate_single_value(val, constraints))
+        self.get_validator().validate_values(value)
 
-        return inserts
+        return [
+            {'attribute_id': self.id, 'value': val} for val in value
+        ]
 
     def save(self, *args, **kwargs):
         """Always enforce constraints."""
@@ -213,3 +200,216 @@ class Attribute(models.Model):
             'multi': self.multi,
             'constraints': self.constraints,
         }
+
+
+class AttributeValidator(object):
+    """
+    Compiled form of an Attribute's constraints.
+
+    The ``pattern`` is compiled and ``valid_values`` is converted to a set
+    once, after which the validator may be reused for any number of values.
+    Validators are immutable and shared between all Attributes with the same
+    name and constraints, so use ``AttributeValidator.for_constraints()``
+    instead of instantiating them directly.
+    """
+    __slots__ = ('name', 'allow_empty', 'pattern', 'valid_values',
+                 '_valid_set')
+
+    #: Validators keyed by (name, allow_empty, pattern, valid_values)
+    _registry = {}
+
+    #: Upper bound on the size of the registry before it is reset.
+    MAX_REGISTRY_SIZE = 4096
+
+    def __init__(self, name, allow_empty=False, pattern='', valid_values=()):
+        self.name = name
+        self.allow_empty = allow_empty
+        self.pattern = re.compile(pattern) if pattern else None
+        self.valid_values = tuple(valid_values)
+        self._valid_set = frozenset(self.valid_values)
+
+    def __repr__(self):
+        return '<AttributeValidator: %s>' % self.name
+
+    @classmethod
+    def for_constraints(cls, name, constraints):
+        """
+        Return a (possibly shared) validator for ``constraints``.
+
+        :param name:
+            Attribute name, used in error messages
+
+        :param constraints:
+            Attribute constraints dict
+        """
+        key = (
+            name,
+            bool(constraints.get('allow_empty', False)),
+            constraints.get('pattern') or '',
+            tuple(constraints.get('valid_values', [])),
+        )
+
+        validator = cls._registry.get(key)
+        if validator is None:
+            if len(cls._registry) >= cls.MAX_REGISTRY_SIZE:
+                cls._registry.clear()
+            validator = cls(*key)
+            cls._registry[key] = validator
+
+        return validator
+
+    def validate_values(self, values):
+        """
+        Validate a list of values, raising a ``ValidationError`` for the first
+        value that fails each check.
+
+        Each check is applied to the whole list in one pass, which is cheaper
+        than fully validating one value at a time for multi-valued Attributes
+        and bulk operations.
+
+        :param values:
+            List of values
+        """
+        for value in values:
+            if not isinstance(value, six.string_types):
+                raise exc.ValidationError({
+                    'value': 'Attribute values must be a string type'
+                })
+
+        if not self.allow_empty and not all(values):
+            raise exc.ValidationError({
+                'constraints': "Attribute {} doesn't allow empty values"
+                .format(self.name)
+            })
+
+        if self.pattern is not None:
+            match = self.pattern.match
+            for value in values:
+                if match(value) is None:
+                    raise exc.ValidationError({
+                        'pattern': (
+                            "Attribute value {} for {} didn't match "
+                            "pattern: {}"
+                        ).format(value, self.name, self.pattern.pattern)
+                    })
+
+        if self._valid_set:
+            invalid = [v for v in values if v not in self._valid_set]
+            if invalid:
+                raise exc.ValidationError(
+                    'Attribute value {} for {} not a valid value: {}'
+                    .format(
+                        invalid[0], self.name, ', '.join(self.valid_values)
+                    )
+                )
+
+        return values
+
+
+class AttributeSchemaCache(object):
+    """
+    Process-local cache of Attribute schemas.
+
+    Attributes are cached by (site_id, resource_name) along with their
+    ``AttributeValidator`` objects, and the names of the Attributes required
+    by each ProtocolType are cached by ProtocolType id. Everything is
+    invalidated whenever ``SCHEMA_VERSION`` is bumped, which happens any time
+    an Attribute or ``ProtocolType.required_attributes`` changes. Schemas are
+    read from the primary database, so that a lagging read replica can't
+    cache an old schema under the new version.
+
+    Cached Attribute objects are shared, so callers must not modify them.
+    """
+    def __init__(self):
+        self._attributes = {}
+        self._required = {}
+
+    def get_attributes(self, resource_name, site_id):
+        """
+        Return a dict of Attribute objects for a resource, keyed by name.
+
+        :param resource_name:
+            Name of the Resource type (e.g. 'Device')
+
+        :param site_id:
+            ID of the Site
+        """
+        version = versions.get_version(SCHEMA_VERSION)
+        key = (site_id, resource_name)
+
+        cached = self._attributes.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        log.debug('AttributeSchemaCache miss: %r', key)
+        query = Attribute.objects.using(DEFAULT_DB_ALIAS).filter(
+            resource_name=resource_name, site=site_id
+        )
+        attributes = {}
+        for attribute in query.iterator():
+            attribute.get_validator()  # Resolve the validator just once
+            attributes[attribute.name] = attribute
+
+        self._attributes[key] = (version, attributes)
+        return attributes
+
+    def get_required_names(self, protocol_type_id):
+        """
+        Return a list of names of the Attributes required by a ProtocolType.
+
+        :param protocol_type_id:
+            ID of the ProtocolType
+        """
+        if protocol_type_id is None:
+            return []
+
+        version = versions.get_version(SCHEMA_VERSION)
+
+        cached = self._required.get(protocol_type_id)
+        if cached is not None and cached[0] == version:
+            return list(cached[1])
+
+        names = tuple(
+            Attribute.objects.using(DEFAULT_DB_ALIAS).filter(
+                protocol_types=protocol_type_id
+            ).values_list('name', flat=True)
+        )
+        self._required[protocol_type_id] = (version, names)
+        return list(names)
+
+    def clear(self):
+        """Drop everything from the local cache."""
+        self._attributes.clear()
+        self._required.clear()
+
+
+#: The shared schema cache used by ``Attribute.all_by_name()``.
+schema_cache = AttributeSchemaCache()
+
+
+# Signals
+@instrumentation.timed('signal')
+def invalidate_attribute_schema(sender=None, instance=None, **kwargs):
+    """
+    Anytime an Attribute is changed, invalidate cached schemas.
+
+    The local cache is dropped right away so the rest of the transaction sees
+    the change, but the version is only bumped once the transaction commits,
+    so other processes can't cache the old schema under the new version.
+    """
+    def apply_invalidate():
+        versions.bump_version(SCHEMA_VERSION)
+        schema_cache.clear()
+
+    schema_cache.clear()
+    transaction.on_commit(apply_invalidate)
+
+
+models.signals.post_save.connect(
+    invalidate_attribute_schema, sender=Attribute,
+    dispatch_uid='invalidate_attribute_schema_post_save_attribute'
+)
+models.signals.post_delete.connect(
+    invalidate_attribute_schema, sender=Attribute,
+    dispatch_uid='invalidate_attribute_schema_post_delete_attribute'
+)
@@ -0,0 +1,591 @@
+"""
+In-memory indexes of attribute values.
+
+The index maps each (name, value) pair of an attribute to a bitmap of the IDs
+of the resources that have it. It is partitioned by (site_id, resource_name)
+and each partition is built lazily with a single query the first time it is
+needed. Set queries may then be evaluated with bitwise AND/OR/ANDNOT on the
+bitmaps, leaving only the final lookup of matching objects to the database.
+
+Bitmaps are Python integers where bit ``n`` represents the resource with ID
+``base + n``. Sparse bitmaps are kept zlib-compressed and are only inflated
+while they are being used.
+
+Partitions are kept in sync with writes made by this process and are
+versioned with ``nsot.util.versions``, so that writes made by other processes
+cause them to be rebuilt. Partitions are always built from the primary
+database, since a read replica may lag behind the version they're stored
+under, and are neither built nor used inside a transaction, where lookups go
+to the database instead. The index is enabled
+with the ``NSOT_ATTRIBUTE_INDEX`` setting and is only used if a cache backend
+that retains values is configured.
+
+Regex set queries are resolved with ``ValueDictionary``, which matches the
+pattern against the distinct values of an attribute in Python, so that the
+database (or the index) only has to look up exact values.
+"""
+
+from __future__ import absolute_import
+from array import array
+import binascii
+import collections
+import logging
+import re
+import threading
+import zlib
+
+from django.conf import settings
+from django.db import connection, connections, transaction, DEFAULT_DB_ALIAS
+import six
+
+from .. import exc
+from ..util import versions
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = (
+    'AttributeIndex', 'attribute_index', 'ValueDictionary',
+    'value_dictionary', 'filter_ids'
+)
+
+
+def _int_from_bytes(data):
+    """Convert little-endian ``data`` to an integer."""
+    if not data:
+        return 0
+    if hasattr(int, 'from_bytes'):
+        return int.from_bytes(bytes(data), 'little')
+    return int(binascii.hexlify(bytes(data[::-1])), 16)
+
+
+def _int_to_bytes(number):
+    """Convert ``number`` to little-endian bytes."""
+    length = (number.bit_length() + 7) // 8
+    if hasattr(number, 'to_bytes'):
+        return number.to_bytes(length, 'little')
+    hexed = '%x' % number
+    if len(hexed) % 2:
+        hexed = '0' + hexed
+    return binascii.unhexlify(hexed)[::-1]
+
+
+def ids_to_bitmap(ids, base=0):
+    """
+    Return a bitmap of ``ids``, where bit ``n`` represents ``base + n``.
+
+    :param ids:
+        Iterable of integer IDs, none of which are less than ``base``
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+
+    buf = bytearray((max(ids) - base) // 8 + 1)
+    for obj_id in ids:
+        offset = obj_id - base
+        buf[offset >> 3] |= 1 << (offset & 7)
+
+    return _int_from_bytes(buf)
+
+
+def bitmap_to_ids(bitmap, base=0):
+    """
+    Return a sorted list of the IDs represented by ``bitmap``.
+
+    :param bitmap:
+        Bitmap integer, where bit ``n`` represents ``base + n``
+    """
+    if bitmap <= 0:
+        return []
+
+    # Skip the run of zeroes at the bottom before rendering the bits.
+    low = (bitmap & -bitmap).bit_length() - 1
+    bits = bin(bitmap >> low)[:1:-1]
+    base += low
+
+    ids = []
+    find = bits.find
+    pos = find('1')
+    while pos != -1:
+        ids.append(base + pos)
+        pos = find('1', pos + 1)
+
+    return ids
+
+
+def _pack(bitmap):
+    """Compress ``bitmap`` if that saves a meaningful amount of memory."""
+    compressed = zlib.compress(_int_to_bytes(bitmap))
+    if len(compressed) * 4 < bitmap.bit_length() // 8:
+        return compressed
+    return bitmap
+
+
+def _unpack(stored):
+    """Inverse of ``_pack()``."""
+    if isinstance(stored, six.binary_type):
+        return _int_from_bytes(zlib.decompress(stored))
+    return stored
+
+
+def filter_ids(queryset, ids, exclude=False):
+    """
+    Filter ``queryset`` to (or, if ``exclude`` is set, exclude) objects with
+    primary keys in ``ids``.
+
+    IDs are rendered into the query as literal integer ranges rather than as
+    query parameters, so that very large sets don't exceed the parameter
+    limits of backends such as SQLite.
+
+    :param queryset:
+        QuerySet to filter
+
+    :param ids:
+        Sorted list of integer primary keys
+    """
+    if not ids:
+        return queryset if exclude else queryset.none()
+
+    model = queryset.model
+    qn = connections[queryset.db].ops.quote_name
+    column = '%s.%s' % (qn(model._meta.db_table), qn(model._meta.pk.column))
+
+    # Consecutive IDs are collapsed into ranges.
+    clauses = []
+    singles = []
+    start = prev = ids[0]
+    for obj_id in ids[1:] + [None]:
+        if obj_id is not None and obj_id == prev + 1:
+            prev = obj_id
+            continue
+        if prev - start >= 2:
+            clauses.append(
+                '%s BETWEEN %d AND %d' % (column, start, prev)
+            )
+        else:
+            singles.extend(six.moves.range(start, prev + 1))
+        start = prev = obj_id
+
+    # Some backends limit the size of IN lists.
+    for i in six.moves.range(0, len(singles), 1000):
+        chunk = ', '.join('%d' % s for s in singles[i:i + 1000])
+        clauses.append('%s IN (%s)' % (column, chunk))
+
+    where = '(%s)' % ' OR '.join(clauses)
+    if exclude:
+        where = 'NOT %s' % where
+
+    return queryset.extra(where=[where])
+
+
+class _Partition(object):
+    """Postings for the attribute values of one resource type in a Site."""
+    __slots__ = ('version', 'base', 'postings')
+
+    def __init__(self, version, base, postings):
+        self.version = version
+        self.base = base
+        self.postings = postings
+
+    def lookup(self, name, value):
+        """Return the absolute bitmap for ``name=value``."""
+        stored = self.postings.get((name, value))
+        if stored is None:
+            return 0
+        return _unpack(stored) << self.base
+
+    def update(self, resource_id, removed, added):
+        """
+        Apply changes to the values of one resource. Returns False if the
+        change can't be applied in place.
+        """
+        offset = resource_id - self.base
+        if offset < 0:
+            return False
+
+        bit = 1 << offset
+        for pair in removed:
+            stored = self.postings.get(pair)
+            if stored is None:
+                continue
+            bitmap = _unpack(stored) & ~bit
+            if bitmap:
+                self.postings[pair] = _pack(bitmap)
+            else:
+                del self.postings[pair]
+
+        for pair in added:
+            bitmap = _unpack(self.postings.get(pair, 0)) | bit
+            self.postings[pair] = _pack(bitmap)
+
+        return True
+
+
+def _iter_pairs(attributes):
+    """Yield (name, value) pairs from an attributes dict."""
+    for name, value in six.iteritems(attributes or {}):
+        if isinstance(value, list):
+            for val in value:
+                yield (name, val)
+        else:
+            yield (name, value)
+
+
+class AttributeIndex(object):
+    """
+    Process-local inverted index of attribute values.
+
+    Use the ``attribute_index`` instance rather than creating your own.
+    """
+    def __init__(self):
+        self._partitions = {}
+        self._lock = threading.RLock()
+
+    @property
+    def enabled(self):
+        """Whether the index is turned on and may be used."""
+        return (
+            getattr(settings, 'NSOT_ATTRIBUTE_INDEX', False) and
+            versions.is_persistent()
+        )
+
+    def _version_name(self, key):
+        return 'attribute_index_%s_%s' % key
+
+    def _build(self, key, version):
+        site_id, resource_name = key
+        log.debug('Building attribute index partition: %r', key)
+
+        # Avoid a circular import.
+        from .value import Value
+
+        rows = Value.objects.using(DEFAULT_DB_ALIAS).filter(
+            site=site_id, resource_name=resource_name
+        ).order_by().values_list('name', 'value', 'resource_id')
+
+        collected = collections.defaultdict(lambda: array('l'))
+        base = None
+        for name, value, resource_id in rows.iterator():
+            collected[(name, value)].append(resource_id)
+            if base is None or resource_id < base:
+                base = resource_id
+
+        postings = {}
+        for pair in list(collected):
+            ids = collected.pop(pair)
+            postings[pair] = _pack(ids_to_bitmap(ids, base))
+
+        return _Partition(version, base or 0, postings)
+
+    def get_partition(self, site_id, resource_name):
+        """
+        Return the up-to-date partition for a resource type in a Site.
+
+        :param site_id:
+            ID of the Site
+
+        :param resource_name:
+            Name of the Resource type (e.g. 'Device')
+        """
+        key = (site_id, resource_name)
+        version = versions.get_version(self._version_name(key))
+
+        with self._lock:
+            partition = self._partitions.get(key)
+
+        # The lock is never held while querying the database. It's created
+        # when the app is loaded, which may be before a gevent worker patches
+        # ``threading``, in which case it would block the whole worker.
+        if partition is None or partition.version != version:
+            partition = self._build(key, version)
+            with self._lock:
+                self._partitions[key] = partition
+
+        return partition
+
+    def lookup(self, site_ids, resource_name, name, value):
+        """
+        Return a bitmap of resources having ``name=value`` in any of
+        ``site_ids``. Bit ``n`` represents the resource with ID ``n``.
+
+        :param site_ids:
+            Iterable of Site IDs
+
+        :param resource_name:
+            Name of the Resource type (e.g. 'Device')
+
+        :param name:
+            Attribute name
+
+        :param value:
+            Attribute value
+        """
+        # Inside a transaction, a partition would be built from rows that
+        # aren't committed yet, and wouldn't see the transaction's own writes
+        # until it commits, so the resources are looked up directly instead.
+        if connection.in_atomic_block:
+            return self._lookup_sql(site_ids, resource_name, name, value)
+
+        bitmap = 0
+        for site_id in site_ids:
+            partition = self.get_partition(site_id, resource_name)
+            bitmap |= partition.lookup(name, value)
+        return bitmap
+
+    def _lookup_sql(self, site_ids, resource_name, name, value):
+        """Same as ``lookup()``, without using (or building) partitions."""
+        site_ids = list(site_ids)
+        if not site_ids:
+            return 0
+
+        # Avoid a circular import.
+        from .value import Value
+
+        ids = Value.objects.using(DEFAULT_DB_ALIAS).filter(
+            site__in=site_ids, resource_name=resource_name, name=name,
+            value=value
+        ).order_by().values_list('resource_id', flat=True)
+        return ids_to_bitmap(ids)
+
+    def update_resource(self, resource, old_attributes, new_attributes):
+        """
+        Record that the attributes of ``resource`` have changed.
+
+        The change is applied once the current transaction commits.
+
+        :param resource:
+            Resource object
+
+        :param old_attributes:
+            Attributes dict before the change
+
+        :param new_attributes:
+            Attributes dict after the change
+        """
+        if not self.enabled:
+            return
+
+        old = set(_iter_pairs(old_attributes))
+        new = set(_iter_pairs(new_attributes))
+        removed, added = old - new, new - old
+        if not (removed or added):
+            return
+
+        key = (resource.site_id, resource._resource_name)
+        resource_id = resource.id
+
+        def apply_update():
+            new_version = versions.bump_version(self._version_name(key))
+            with self._lock:
+                partition = self._partitions.get(key)
+                if partition is None:
+                    return
+
+                # If nobody else bumped the version in the meantime, we're
+                # still up-to-date after applying the change.
+                current = partition.version + 1 == new_version
+                if current and partition.update(resource_id, removed, added):
+                    partition.version = new_version
+                else:
+                    del self._partitions[key]
+
+        transaction.on_commit(apply_update)
+
+    def invalidate(self, site_id, resource_name):
+        """
+        Invalidate a partition once the current transaction commits.
+
+        :param site_id:
+            ID of the Site
+
+        :param resource_name:
+            Name of the Resource type (e.g. 'Device')
+        """
+        if not self.enabled:
+            return
+
+        key = (site_id, resource_name)
+
+        def apply_invalidate():
+            versions.bump_version(self._version_name(key))
+            with self._lock:
+                self._partitions.pop(key, None)
+
+        transaction.on_commit(apply_invalidate)
+
+    def clear(self):
+        """Drop all partitions."""
+        with self._lock:
+            self._partitions.clear()
+
+
+#: The shared attribute index.
+attribute_index = AttributeIndex()
+
+
+class ValueDictionary(object):
+    """
+    Process-local cache of the distinct values of each Attribute, used to
+    evaluate regex set queries.
+
+    The distinct values of an attribute are fetched once and a pattern is
+    matched against each of them with ``re.search()``, which is how the
+    ``__regex`` lookup behaves. The matching values are memoized per
+    (attribute, pattern).
+
+    Values that are no longer in use are harmless, since looking them up
+    simply matches nothing, so the dictionary of an attribute is only
+    invalidated when new values are added to it.
+
+    Use the ``value_dictionary`` instance rather than creating your own.
+    """
+    #: Upper bound on the number of memoized patterns before they are reset.
+    MAX_MATCHES = 1024
+
+    def __init__(self):
+        self._values = {}
+        self._matches = {}
+        self._lock = threading.RLock()
+
+    def _version_name(self, key):
+        return 'attribute_values_%s_%s_%s' % key
+
+    def get_values(self, site_id, resource_name, name):
+        """
+        Return a tuple of the distinct values of an Attribute.
+
+        :param site_id:
+            ID of the Site
+
+        :param resource_name:
+            Name of the Resource type (e.g. 'Device')
+
+        :param name:
+            Attribute name
+        """
+        key = (site_id, resource_name, name)
+        version = versions.get_version(self._version_name(key))
+
+        cached = self._values.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        log.debug('ValueDictionary miss: %r', key)
+
+        # Avoid a circular import.
+        from .value import Value
+
+        # Read from the primary, like the attribute index.
+        values = tuple(
+            Value.objects.using(DEFAULT_DB_ALIAS).filter(
+                site=site_id, resource_name=resource_name, name=name
+            ).order_by().values_list('value', flat=True).distinct()
+        )
+        with self._lock:
+            self._values[key] = (version, values)
+
+        return values
+
+    def match(self, site_id, resource_name, name, pattern):
+        """
+        Return a tuple of the distinct values of an Attribute matching the
+        regex ``pattern``, or None if the cache backend doesn't retain
+        values. Then, fetching the distinct values for every query would cost
+        more than matching the pattern in the database.
+
+        :param site_id:
+            ID of the Site
+
+        :param resource_name:
+            Name of the Resource type (e.g. 'Device')
+
+        :param name:
+            Attribute name
+
+        :param pattern:
+            Regular expression
+        """
+        try:
+            search = re.compile(pattern).search
+        except re.error as err:
+            raise exc.ValidationError({
+                'query': 'Invalid regex pattern %r: %s' % (pattern, err)
+            })
+
+        if not versions.is_persistent():
+            return None
+
+        key = (site_id, resource_name, name)
+        values = self.get_values(site_id, resource_name, name)
+
+        # Memoized matches are only good for the same tuple of values.
+        cached = self._matches.get((key, pattern))
+        if cached is not None and cached[0] is values:
+            return cached[1]
+
+        matched = tuple(value for value in values if search(value))
+        with self._lock:
+            if len(self._matches) >= self.MAX_MATCHES:
+                self._matches.clear()
+            self._matches[(key, pattern)] = (values, matched)
+
+        return matched
+
+    def add_values(self, site_id, resource_name, names):
+        """
+        Record that values were added for Attribute ``names``, once the
+        current transaction commits.
+
+        :param site_id:
+            ID of the Site
+
+        :param resource_name:
+            Name of the Resource type (e.g. 'Device')
+
+        :param names:
+            Iterable of Attribute names
+        """
+        keys = [(site_id, resource_name, name) for name in set(names)]
+        if not keys:
+            return
+
+        def apply_add():
+            for key in keys:
+                versions.bump_version(self._version_name(key))
+                with self._lock:
+                    self._values.pop(key, None)
+
+        transaction.on_commit(apply_add)
+
+    def update_resource(self, resource, old_attributes, new_attributes):
+        """
+        Record that the attributes of ``resource`` have changed.
+
+        :param resource:
+            Resource object
+
+        :param old_attributes:
+            Attributes dict before the change
+
+        :param new_attributes:
+            Attributes dict after the change
+        """
+        added = set(_iter_pairs(new_attributes)) - set(
+            _iter_pairs(old_attributes)
+        )
+        self.add_values(
+            resource.site_id, resource._resource_name,
+            (name for name, _ in added)
+        )
+
+    def clear(self):
+        """Drop everything from the local cache."""
+        with self._lock:
+            self._values.clear()
+            self._matches.clear()
+
+
+#: The shared value dictionary used for regex set queries.
+value_dictionary = ValueDictionary()
@@ -0,0 +1,623 @@
+"""
+Helpers for writing and deleting many objects at once.
+
+These write the same rows as saving or deleting each object would, but with a
+few queries per batch of objects rather than a few per object. Signals aren't
+sent for the objects written (other than ``post_save`` for Changes), so
+callers take care of any side effects themselves.
+"""
+
+from __future__ import unicode_literals
+from __future__ import absolute_import
+from collections import defaultdict
+import logging
+
+from django.db import connection, transaction
+from django.db.models import Case, Q, Value as V, When, signals
+from django.db.models.functions import Cast
+from django.utils import timezone
+import six
+
+from .. import exc, util
+from .assignment import Assignment
+from .attribute_index import attribute_index, value_dictionary
+from .change import Change
+from .circuit import Circuit
+from .device import Device
+from .interface import Interface, change_api_updated_at
+from .ipam_snapshot import ipam_snapshot
+from .network import Network
+from .prefix_index import prefix_index
+from .protocol import CACHED_NATURAL_KEYS, Protocol
+from .site import Site
+from .value import Value
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = (
+    'BATCH_SIZE', 'bulk_update', 'bulk_set_attributes', 'record_changes',
+    'update_protocols', 'update_device_interfaces', 'delete_networks',
+    'delete_interfaces', 'delete_devices',
+)
+
+
+#: Number of objects written by each query.
+BATCH_SIZE = 500
+
+
+def iter_batches(items, size=BATCH_SIZE):
+    """Yield successive slices of ``items`` of up to ``size`` items."""
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def bulk_update(objects, field_names, batch_size=BATCH_SIZE):
+    """
+    Write ``field_names`` of ``objects`` (of one model) to the database with
+    one ``UPDATE`` per batch, using a ``CASE`` on the primary key for each
+    field.
+
+    :param objects:
+        List of saved model objects
+
+    :param field_names:
+        Names of the fields to write
+    """
+    if not objects or not field_names:
+        return
+
+    model = type(objects[0])
+    fields = [model._meta.get_field(name) for name in field_names]
+
+    # Set ``auto_now`` fields, as saving would.
+    for field in model._meta.concrete_fields:
+        if getattr(field, 'auto_now', False) and field not in fields:
+            now = timezone.now()
+            for obj in objects:
+                setattr(obj, field.attname, now)
+            fields.append(field)
+
+    for batch in iter_batches(objects, batch_size):
+        updates = {}
+        for field in fields:
+            expression = Case(
+                *[
+                    When(pk=obj.pk, then=V(
+                        getattr(obj, field.attname), output_field=field
+                    ))
+                    for obj in batch
+                ],
+                output_field=field
+            )
+
+            # Postgres types a CASE by its parameters (as text), so it must be
+            # cast back to the type of the column.
+            if connection.vendor == 'postgresql':
+                expression = Cast(expression, output_field=field)
+
+            updates[field.name] = expression
+
+        model.objects.filter(pk__in=[obj.pk for obj in batch]).update(
+            **updates
+        )
+
+
+def _validate_attributes(obj, attributes, valid_attributes):
+    """
+    Validate ``attributes`` for ``obj`` as ``Resource.set_attributes()``
+    does, and return its attributes cache and a list of its Values.
+    """
+    if not isinstance(attributes, dict):
+        raise exc.ValidationError({
+            'attributes': 'Expected dictionary but received {}'.format(
+                type(attributes)
+            )
+        })
+
+    missing_attributes = {
+        attribute.name for attribute in six.itervalues(valid_attributes)
+        if attribute.required and attribute.name not in attributes
+    }
+    if missing_attributes:
+        names = ', '.join(missing_attributes)
+        raise exc.ValidationError({
+            'attributes': 'Missing required attributes: {}'.format(names)
+        })
+
+    cache = {}
+    values = []
+    for name, value in six.iteritems(attributes):
+        if name not in valid_attributes:
+            raise exc.ValidationError({
+                'attributes': 'Attribute name ({}) does not exist.'.format(
+                    name
+                )
+            })
+
+        attribute = valid_attributes[name]
+        for insert in attribute.validate_value(value):
+            values.append(Value(
+                attribute_id=attribute.id, value=insert['value'],
+                name=attribute.name, resource_name=obj._resource_name,
+                resource_id=obj.pk, site_id=obj.site_id,
+            ))
+            if attribute.multi:
+                cache.setdefault(attribute.name, []).append(insert['value'])
+            else:
+                cache[attribute.name] = insert['value']
+
+    return cache, values
+
+
+def bulk_set_attributes(objects, attributes, partial=False,
+                        batch_size=BATCH_SIZE):
+    """
+    Validate and set the attributes of many Resources of one type, like
+    calling ``set_attributes()`` on each.
+
+    Only the Values of objects whose attributes changed are rewritten. Their
+    attribute caches are updated in memory, and must be written by the caller.
+
+    :param objects:
+        List of saved Resource objects
+
+    :param attributes:
+        List of attribute dicts (or None) for each of ``objects``
+
+    :param partial:
+        Whether this is a partial update
+
+    Returns the objects whose attributes changed.
+    """
+    changed = []
+    old_caches = []
+    values = []
+
+    for obj, attrs in zip(objects, attributes):
+        if attrs is None and partial:
+            continue
+
+        cache, obj_values = _validate_attributes(
+            obj, attrs, obj.get_valid_attributes()
+        )
+
+        old_cache = obj._attributes_cache or {}
+        if cache == old_cache:
+            continue
+
+        changed.append(obj)
+        old_caches.append(old_cache)
+        values.extend(obj_values)
+        obj._attributes_cache = cache
+
+    if not changed:
+        return changed
+
+    resource_name = changed[0]._resource_name
+    for batch in iter_batches(changed, batch_size):
+        Value.objects.filter(
+            resource_name=resource_name,
+            resource_id__in=[obj.pk for obj in batch],
+        ).delete()
+    Value.objects.bulk_create(values, batch_size=batch_size)
+
+    for obj, old_cache in zip(changed, old_caches):
+        attribute_index.update_resource(obj, old_cache, obj._attributes_cache)
+        value_dictionary.update_resource(
+            obj, old_cache, obj._attributes_cache
+        )
+
+    return changed
+
+
+def record_changes(objects, user, event, batch_size=BATCH_SIZE):
+    """
+    Record a Change of ``event`` by ``user`` for each of ``objects`` (of one
+    model).
+
+    :param objects:
+        List of model objects
+
+    :param user:
+        User making the changes
+
+    :param event:
+        Change event (e.g. 'Update')
+    """
+    if not objects:
+        return []
+
+    prototype = Change()
+    resource_name = prototype.clean_resource_name(type(objects[0]).__name__)
+    event = prototype.clean_event(event)
+    serializer_class = Change.get_serializer_for_resource(resource_name)
+
+    changes = [
+        Change(
+            site_id=obj.pk if isinstance(obj, Site) else obj.site_id,
+            user=user, event=event, resource_name=resource_name,
+            resource_id=obj.pk, _resource=serializer_class(obj).data,
+        )
+        for obj in objects
+    ]
+    Change.objects.bulk_create(changes, batch_size=batch_size)
+
+    # Receivers of Change.post_save (such as metrics) still see each Change.
+    for change in changes:
+        signals.post_save.send(
+            sender=Change, instance=change, created=True, raw=False,
+            using=Change.objects.db, update_fields=None,
+        )
+
+    return changes
+
+
+def update_protocols(objects, batch_size=BATCH_SIZE):
+    """
+    Update the natural keys of ``objects`` (of one model) that are cached on
+    the Protocols that refer to them, as saving each object would.
+
+    :param objects:
+        List of ProtocolTypes, Devices, Interfaces or Circuits
+    """
+    if not objects:
+        return
+
+    field, cached, key = CACHED_NATURAL_KEYS[type(objects[0])]
+    attname = Protocol._meta.get_field(field).attname
+    values = dict((obj.pk, getattr(obj, key)) for obj in objects)
+
+    for batch in iter_batches(list(values), batch_size):
+        protocols = Protocol.objects.filter(
+            **{attname + '__in': batch}
+        ).only('id', attname, cached)
+        changed = []
+        for protocol in protocols:
+            value = values[getattr(protocol, attname)]
+            if getattr(protocol, cached) != value:
+                setattr(protocol, cached, value)
+                changed.append(protocol)
+        bulk_update(changed, [cached])
+
+
+def update_device_interfaces(devices, batch_size=BATCH_SIZE):
+    """
+    Update the ``device_hostname`` and ``name_slug`` of the Interfaces of
+    ``devices``, and the natural keys cached on their Protocols, as saving
+    each Device would.
+
+    :param devices:
+        List of Devices whose hostnames have changed
+    """
+    hostnames = dict((device.pk, device.hostname) for device in devices)
+    for batch in iter_batches(list(hostnames), batch_size):
+        interfaces = list(
+            Interface.objects.filter(device_id__in=batch).only(
+                'id', 'name', 'device'
+            )
+        )
+        for interface in interfaces:
+            interface.device_hostname = hostnames[interface.device_id]
+            interface.name_slug = util.slugify_interface(
+                device_hostname=interface.device_hostname,
+                name=interface.name,
+            )
+        bulk_update(interfaces, ['device_hostname', 'name_slug'])
+        update_protocols(interfaces)
+
+    update_protocols(devices)
+    change_api_updated_at()
+
+
+def _protected(model_name, field_name):
+    """Return the Conflict raised when objects are referenced by others."""
+    return exc.Conflict(
+        'Cannot delete some instances of model %r because they are '
+        'referenced through a protected foreign key: %r' % (
+            model_name, field_name
+        )
+    )
+
+
+def _delete_resources(model, groups, site_ids, batch_size=BATCH_SIZE):
+    """
+    Delete Resources and their Values, once everything that refers to them
+    has been dealt with.
+
+    Rows are deleted directly, without collecting related objects or sending
+    signals for each object.
+
+    :param model:
+        Resource model
+
+    :param groups:
+        Lists of IDs to delete, in order. The objects in each list must not
+        refer to each other.
+
+    :param site_ids:
+        IDs of the Sites of the objects
+    """
+    resource_name = model.__name__
+    for ids in groups:
+        for batch in iter_batches(ids, batch_size):
+            Value.objects.filter(
+                resource_name=resource_name, resource_id__in=batch
+            ).delete()
+            queryset = model.objects.filter(id__in=batch)
+            queryset._raw_delete(queryset.db)
+
+    for site_id in site_ids:
+        attribute_index.invalidate(site_id, resource_name)
+
+
+def _by_depth(parents):
+    """
+    Return lists of the IDs in ``parents`` (a dict of parent IDs keyed by ID)
+    grouped by their depth among each other, deepest first.
+    """
+    depths = {}
+    for pk in parents:
+        chain = []
+        while pk in parents and pk not in depths:
+            chain.append(pk)
+            pk = parents[pk]
+        depth = depths.get(pk, -1)
+        for child_id in reversed(chain):
+            depth += 1
+            depths[child_id] = depth
+
+    groups = defaultdict(list)
+    for pk, depth in six.iteritems(depths):
+        groups[depth].append(pk)
+    return [sorted(groups[depth]) for depth in sorted(groups, reverse=True)]
+
+
+def _refresh_interface_addresses(interface_ids, batch_size=BATCH_SIZE):
+    """Update the cached addresses and networks of Interfaces."""
+    interfaces = []
+    for batch in iter_batches(sorted(interface_ids), batch_size):
+        interfaces.extend(Interface.objects.filter(id__in=batch))
+    for interface in interfaces:
+        interface.clean_addresses()
+    bulk_update(interfaces, ['_addresses_cache', '_networks_cache'])
+
+
+def delete_networks(networks, user, force_delete=False, descendants=False,
+                    batch_size=BATCH_SIZE):
+    """
+    Delete many Networks, recording a Change for each.
+
+    As with ``Network.delete()``, Networks whose children aren't also being
+    deleted are protected, unless ``force_delete`` is set, in which case the
+    children are moved to the closest remaining ancestor.
+
+    :param networks:
+        List of Networks
+
+    :param user:
+        User deleting the Networks
+
+    :param force_delete:
+        Whether to reparent the children of deleted Networks
+
+    :param descendants:
+        Whether to also delete all descendants of ``networks``
+
+    Returns the Changes recorded.
+    """
+    networks = list(networks)
+    ids = set(network.pk for network in networks)
+
+    # Add the descendants one level at a time.
+    frontier = sorted(ids) if descendants else []
+    while frontier:
+        children = []
+        for batch in iter_batches(frontier, batch_size):
+            children.extend(
+                Network.objects.filter(parent_id__in=batch).select_related(
+                    'parent'
+                )
+            )
+        children = [child for child in children if child.pk not in ids]
+        networks.extend(children)
+        frontier = [child.pk for child in children]
+        ids.update(frontier)
+
+    if not networks:
+        return []
+
+    parents = dict((network.pk, network.parent_id) for network in networks)
+
+    # Find the children that aren't being deleted, and their new parents.
+    orphans = defaultdict(list)
+    for batch in iter_batches(sorted(ids), batch_size):
+        children = Network.objects.filter(parent_id__in=batch).values_list(
+            'id', 'parent_id'
+        )
+        for child_id, parent_id in children:
+            if child_id in ids:
+                continue
+            while parent_id in ids:
+                parent_id = parents[parent_id]
+            orphans[parent_id].append(child_id)
+
+    if orphans and not force_delete:
+        raise _protected('Network', 'Network.parent')
+
+    # Without a new parent, children must have children of their own.
+    rootless = set(orphans.get(None, ()))
+    if rootless:
+        branches = set()
+        for batch in iter_batches(sorted(rootless), batch_size):
+            children = Network.objects.filter(
+                parent_id__in=batch
+            ).values_list('id', 'parent_id')
+            branches.update(
+                parent_id for child_id, parent_id in children
+                if child_id not in ids
+            )
+        if rootless - branches:
+            raise exc.Conflict(
+                'You cannot forcefully delete a network that does not have '
+                'a parent, and whose children are leaf nodes.'
+            )
+
+    # Children are deleted before their parents.
+    by_prefix_length = defaultdict(list)
+    for network in networks:
+        by_prefix_length[network.prefix_length].append(network.pk)
+    groups = [
+        by_prefix_length[prefix_length]
+        for prefix_length in sorted(by_prefix_length, reverse=True)
+    ]
+    site_ids = set(network.site_id for network in networks)
+
+    with transaction.atomic():
+        changes = record_changes(networks, user, 'Delete', batch_size)
+
+        for parent_id, children in six.iteritems(orphans):
+            for batch in iter_batches(children, batch_size):
+                Network.objects.filter(id__in=batch).update(
+                    parent_id=parent_id, updated_at=timezone.now()
+                )
+
+        interface_ids = set()
+        for batch in iter_batches(sorted(ids), batch_size):
+            assignments = Assignment.objects.filter(address_id__in=batch)
+            interface_ids.update(
+                assignments.values_list('interface_id', flat=True)
+            )
+            assignments.delete()
+
+        _delete_resources(Network, groups, site_ids, batch_size)
+        for site_id in site_ids:
+            prefix_index.invalidate(site_id)
+            ipam_snapshot.invalidate(site_id)
+
+        if interface_ids:
+            _refresh_interface_addresses(interface_ids, batch_size)
+            change_api_updated_at()
+
+    return changes
+
+
+def _delete_interfaces(parents, site_ids, batch_size=BATCH_SIZE):
+    """
+    Delete Interfaces along with their Protocols and address assignments.
+
+    :param parents:
+        Dict of the parent IDs of the Interfaces, keyed by ID
+
+    :param site_ids:
+        IDs of the Sites of the Interfaces
+    """
+    ids = sorted(parents)
+
+    # Interfaces that aren't being deleted may not refer to these.
+    for batch in iter_batches(ids, batch_size):
+        children = Interface.objects.filter(parent_id__in=batch).values_list(
+            'id', flat=True
+        )
+        if any(child_id not in parents for child_id in children):
+            raise _protected('Interface', 'Interface.parent')
+
+        circuits = Circuit.objects.filter(
+            Q(endpoint_a__in=batch) | Q(endpoint_z__in=batch)
+        )
+        if circuits.exists():
+            raise _protected('Interface', 'Circuit.endpoint_a')
+
+    protocols = {}
+    for batch in iter_batches(ids, batch_size):
+        protocols.update(
+            Protocol.objects.filter(interface_id__in=batch).values_list(
+                'id', 'site_id'
+            )
+        )
+        Assignment.objects.filter(interface_id__in=batch).delete()
+
+    _delete_resources(
+        Protocol, [sorted(protocols)], set(protocols.values()), batch_size
+    )
+    _delete_resources(Interface, _by_depth(parents), site_ids, batch_size)
+    change_api_updated_at()
+
+
+def delete_interfaces(interfaces, user, batch_size=BATCH_SIZE):
+    """
+    Delete many Interfaces, recording a Change for each.
+
+    As with ``Interface.delete()``, Interfaces that are the parents of
+    other Interfaces or the endpoints of Circuits are protected, and their
+    Protocols and address assignments are deleted with them.
+
+    :param interfaces:
+        List of Interfaces
+
+    :param user:
+        User deleting the Interfaces
+
+    Returns the Changes recorded.
+    """
+    interfaces = list(interfaces)
+    if not interfaces:
+        return []
+
+    parents = dict((obj.pk, obj.parent_id) for obj in interfaces)
+    site_ids = set(obj.site_id for obj in interfaces)
+
+    with transaction.atomic():
+        changes = record_changes(interfaces, user, 'Delete', batch_size)
+        _delete_interfaces(parents, site_ids, batch_size)
+
+    return changes
+
+
+def delete_devices(devices, user, batch_size=BATCH_SIZE):
+    """
+    Delete many Devices, recording a Change for each.
+
+    As with ``Device.delete()``, their Interfaces and Protocols are deleted
+    with them, and Devices with Interfaces that are the endpoints of
+    Circuits are protected.
+
+    :param devices:
+        List of Devices
+
+    :param user:
+        User deleting the Devices
+
+    Returns the Changes recorded.
+    """
+    devices = list(devices)
+    if not devices:
+        return []
+
+    ids = sorted(device.pk for device in devices)
+    site_ids = set(device.site_id for device in devices)
+
+    parents = {}
+    protocols = {}
+    for batch in iter_batches(ids, batch_size):
+        parents.update(
+            Interface.objects.filter(device_id__in=batch).values_list(
+                'id', 'parent_id'
+            )
+        )
+        protocols.update(
+            Protocol.objects.filter(device_id__in=batch).values_list(
+                'id', 'site_id'
+            )
+        )
+
+    with transaction.atomic():
+        changes = record_changes(devices, user, 'Delete', batch_size)
+        _delete_interfaces(parents, site_ids, batch_size)
+        _delete_resources(
+            Protocol, [sorted(protocols)], set(protocols.values()), batch_size
+        )
+        _delete_resources(Device, [ids], site_ids, batch_size)
+
+    return changes
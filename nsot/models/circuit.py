@@ -1,6 +1,7 @@
 from __future__ import unicode_literals
 
 from __future__ import absolute_import
+from django.apps import apps
 from django.db import models
 
 from .. import exc, util
@@ -68,31 +69,67 @@ class Circuit(Resource):
         ]
         '''
 
+    @property
+    def endpoint_ids(self):
+        """Return the IDs of the endpoint Interfaces of this Circuit."""
+        return [
+            pk for pk in (self.endpoint_a_id, self.endpoint_z_id)
+            if pk is not None
+        ]
+
+    def _get_model(self, model_name):
+        # Interface and the models it refers to import this module.
+        return apps.get_model(self._meta.app_label, model_name)
+
+    def _a_side_first(self, a_side):
+        """
+        Return an expression to order by so that the objects matching the Q
+        object ``a_side`` come first.
+        """
+        return models.Case(
+            models.When(a_side, then=models.Value(0)),
+            default=models.Value(1), output_field=models.IntegerField()
+        )
+
     @property
     def interfaces(self):
-        """Return interfaces associated with this circuit."""
-        intf_list = [self.endpoint_a, self.endpoint_z]
-        return [i for i in intf_list if i is not None]
+        """Return interfaces associated with this circuit, A-side first."""
+        Interface = self._get_model('Interface')
+        a_side = self._a_side_first(models.Q(pk=self.endpoint_a_id))
+        return Interface.objects.filter(pk__in=self.endpoint_ids).order_by(
+            a_side
+        )
 
     @property
     def addresses(self):
         """Return addresses associated with this circuit. This includes addresses
-        associated with child interfaces."""
-        addresses = []
-        for interface in self.interfaces:
-            addresses.extend(interface.addresses.all())
-
-            # For each interface, get addresses of all child interfaces and
-            # extend the list.
-            for child in interface.children.all():
-                addresses.extend(child.addresses.all())
-
-        return addresses
+        associated with child interfaces. A-side addresses come first."""
+        Assignment = self._get_model('Assignment')
+        Network = self._get_model('Network')
+        ids = self.endpoint_ids
+        assignments = Assignment.objects.filter(
+            models.Q(interface__in=ids) | models.Q(interface__parent__in=ids)
+        )
+        a_side = self._a_side_first(models.Q(pk__in=assignments.filter(
+            models.Q(interface=self.endpoint_a_id) |
+            models.Q(interface__parent=self.endpoint_a_id)
+        ).values('address')))
+        return Network.objects.filter(
+            pk__in=assignments.values('address')
+        ).order_by(a_side, 'id')
 
     @property
     def devices(self):
-        """Return devices associated with this circuit."""
-        return [i.device for i in self.interfaces]
+        """Return devices associated with this circuit, A-side first."""
+        Device = self._get_model('Device')
+        Interface = self._get_model('Interface')
+        interfaces = Interface.objects.filter(pk__in=self.endpoint_ids)
+        a_side = self._a_side_first(models.Q(
+            pk__in=interfaces.filter(pk=self.endpoint_a_id).values('device')
+        ))
+        return Device.objects.filter(
+            pk__in=interfaces.values('device')
+        ).order_by(a_side, 'id')
 
     def interface_for(self, device):
         """
@@ -149,6 +186,43 @@ class Circuit(Resource):
 
         self.name_slug = util.slugify(self.name)
 
+    @classmethod
+    def bulk_clean(cls, objects, validate_unique=True):
+        """
+        Validate many Circuits, checking whether their endpoints are used by
+        other Circuits with one query for each side rather than two queries
+        per Circuit.
+        """
+        a_ids = set(obj.endpoint_a_id for obj in objects)
+        z_ids = set(obj.endpoint_z_id for obj in objects if obj.endpoint_z_id)
+        used_as_z = set(
+            Circuit.objects.filter(endpoint_z__in=a_ids).values_list(
+                'endpoint_z', flat=True
+            )
+        )
+        used_as_a = set(
+            Circuit.objects.filter(endpoint_a__in=z_ids).values_list(
+                'endpoint_a', flat=True
+            )
+        )
+
+        for obj in objects:
+            if obj.endpoint_a_id in used_as_z:
+                raise exc.ValidationError({
+                    'endpoint_a': 'Interface already used as an endpoint_z'
+                })
+            if obj.endpoint_z_id in used_as_a:
+                raise exc.ValidationError({
+                    'endpoint_z': 'Interface already used as an endpoint_a'
+                })
+
+            obj.site_id = obj.clean_site(obj.site_id)
+            obj.name = obj.clean_name(obj.name)
+            obj.name_slug = util.slugify(obj.name)
+
+        if validate_unique:
+            cls.bulk_validate_unique(objects)
+
     def save(self, *args, **kwargs):
         self.full_clean()
         super(Circuit, self).save(*args, **kwargs)
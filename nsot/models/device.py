@@ -31,14 +31,11 @@ class Device(Resource):
     @property
     def circuits(self):
         """All circuits related to this Device."""
-        interfaces = self.interfaces.all()
-        circuits = []
-        for intf in interfaces:
-            try:
-                circuits.append(intf.circuit)
-            except Circuit.DoesNotExist:
-                continue
-        return circuits
+        interfaces = self.interfaces.values('id')
+        return Circuit.objects.filter(
+            models.Q(endpoint_a__in=interfaces) |
+            models.Q(endpoint_z__in=interfaces)
+        ).order_by('id')
 
     def clean_hostname(self, value):
         if not value:
@@ -7,6 +7,7 @@ from django.conf import settings
 from django.core.cache import cache as djcache
 from django.db import models
 from django.utils import timezone
+from netaddr import EUI
 
 from .assignment import Assignment
 from .circuit import Circuit
@@ -15,6 +16,7 @@ from .network import Network
 from .resource import Resource
 
 from .. import exc, fields, util, validators
+from ..util import instrumentation
 from . import constants
 
 
@@ -84,7 +86,7 @@ class Interface(Resource):
     # SNMP: ifPhysAddress
     mac_address = fields.MACAddressField(
         'MAC Address', blank=True, db_index=True, null=True,
-        default=int(settings.INTERFACE_DEFAULT_MAC), help_text=(
+        default=int(EUI(settings.INTERFACE_DEFAULT_MAC)), help_text=(
             'If not provided, defaults to %s.' %
             settings.INTERFACE_DEFAULT_MAC
         )
@@ -407,6 +409,11 @@ class Interface(Resource):
         self.parent = self.clean_parent(self.parent)
         self.name_slug = self.clean_name_slug()
 
+    @classmethod
+    def bulk_clean(cls, objects, validate_unique=False):
+        # As with save(), unique constraints are left to the database.
+        super(Interface, cls).bulk_clean(objects, validate_unique=False)
+
     def save(self, *args, **kwargs):
         # We don't want to validate unique because we want the IntegrityError
         # to fall through so we can catch it an raise a 409 CONFLICT.
@@ -447,11 +454,13 @@ class Interface(Resource):
 
 
 # Signals
+@instrumentation.timed('signal')
 def change_api_updated_at(sender=None, instance=None, *args, **kwargs):
     """Anytime the API is updated, invalidate the cache."""
     djcache.set('api_updated_at_timestamp', timezone.now())
 
 
+@instrumentation.timed('signal')
 def update_device_interfaces(sender, instance, **kwargs):
     """Anytime a device is saved, update device_hostname on its interfaces"""
     interfaces = Interface.objects.filter(device=instance)
@@ -0,0 +1,560 @@
+"""
+Compact in-memory snapshot of the Networks in each Site.
+
+For each Site and IP version, the snapshot keeps the network address, prefix
+length, ID and parent ID of every Network in parallel arrays, sorted by
+network address and prefix length. Broadcast addresses aren't stored, since
+they follow from the other two. IPv4 addresses take 4 bytes each, and IPv6
+addresses are split into high and low 64-bit halves, so a Network costs about
+21 bytes (or 33 for IPv6) on 64-bit platforms rather than a model instance.
+
+The descendants of a Network are then the slice of the arrays between its
+network and broadcast addresses, found by binary search, and its ancestors
+are found with one binary search per distinct prefix length in the Site. The
+Network helpers for supernets, subnets, utilization, closest parents and
+next free networks use the snapshot for these lookups, leaving at most a
+lookup of the matching IDs to the database.
+
+A snapshot is built with a single query to the primary database the first
+time it's needed and is versioned with ``nsot.util.versions``. Creating or
+deleting a Network bumps the version of its Site, after which the snapshot is
+rebuilt when next needed, so it suits read-heavy workloads. The snapshot is
+enabled with the ``NSOT_IPAM_SNAPSHOT`` setting and is only used if a cache
+backend that retains values is configured. It's never used inside a
+transaction, whose own changes it wouldn't reflect.
+
+If ``NSOT_IPAM_SNAPSHOT_DIR`` is set, snapshots are shared by the server
+processes on a host. Each Site's snapshot is written to a file in that
+directory, which every process maps read-only, so that the arrays are kept in
+memory once per host rather than once per worker, and workers start with
+whatever snapshots are already current. A snapshot is built and written by
+whichever process first takes the lock on an out-of-date file, to a temporary
+file that is then renamed over the old one. Other processes don't repeat the
+work: until the new file is in place, they query the database instead.
+"""
+
+from __future__ import absolute_import
+from array import array
+from bisect import bisect_left, bisect_right
+import ctypes
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows
+    fcntl = None
+
+from django.conf import settings
+from django.db import connection, transaction, DEFAULT_DB_ALIAS
+import ipaddress
+
+from ..util import versions
+from .prefix_index import parse_cidr
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = ('IpamSnapshot', 'ipam_snapshot')
+
+
+def _typecode(size):
+    """Return the first unsigned array typecode of at least ``size`` bytes."""
+    for typecode in ('I', 'L', 'Q'):
+        try:
+            if array(typecode).itemsize >= size:
+                return typecode
+        except ValueError:  # No 'Q' on Python 2
+            continue
+    raise RuntimeError('No array typecode of %d bytes' % size)
+
+
+#: Typecodes of IPv4 addresses and the halves of IPv6 addresses.
+IPV4_TYPECODE = _typecode(4)
+HALF_TYPECODE = _typecode(8)
+
+LOW_MASK = (1 << 64) - 1
+
+#: Typecodes of the IDs of Networks and their parents.
+ID_TYPECODE = 'l'
+
+#: Header of snapshot files: magic, layout of the arrays, snapshot version,
+#: numbers of IPv4 and IPv6 Networks, and numbers of distinct IPv4 and IPv6
+#: prefix lengths. Arrays follow in native byte order, each padded to a
+#: multiple of 8 bytes.
+HEADER = struct.Struct('=8s16sQQQQQ')
+MAGIC = b'NSOTIPAM'
+LAYOUT = ''.join(
+    '%s%d' % (typecode, array(typecode).itemsize)
+    for typecode in (IPV4_TYPECODE, HALF_TYPECODE, 'B', ID_TYPECODE)
+).encode('ascii')
+
+
+def _to_bytes(values):
+    if hasattr(values, 'tobytes'):
+        return values.tobytes()
+    return values.tostring()  # Python 2
+
+
+#: C types of the array typecodes, for viewing a buffer on Python 2.
+CTYPES = {
+    'B': ctypes.c_ubyte, 'I': ctypes.c_uint, 'L': ctypes.c_ulong,
+    'Q': ctypes.c_ulonglong, 'l': ctypes.c_long,
+}
+
+#: Python 2's ``memoryview`` can't be cast to other types, so arrays are
+#: viewed with ``ctypes`` instead, which needs a writable buffer. Snapshot
+#: files are then mapped copy-on-write. Nothing writes to them, so their pages
+#: are still shared by every process that maps them.
+if hasattr(memoryview, 'cast'):
+    MAP_ACCESS = mmap.ACCESS_READ
+else:
+    MAP_ACCESS = mmap.ACCESS_COPY
+
+
+def _view(buf, offset, typecode, count):
+    """
+    Return a sequence of ``count`` values of ``typecode`` at ``offset`` in
+    ``buf``, without copying them.
+    """
+    if hasattr(memoryview, 'cast'):
+        size = array(typecode).itemsize * count
+        return memoryview(buf)[offset:offset + size].cast(typecode)
+    return (CTYPES[typecode] * count).from_buffer(buf, offset)
+
+
+class _Block(object):
+    """The Networks of one IP version in a Site, sorted by address."""
+    __slots__ = (
+        'bits', 'network_class', 'addresses', 'high', 'low', 'lengths',
+        'ids', 'parent_ids', 'prefix_lengths',
+    )
+
+    def __init__(self, ip_version):
+        if ip_version == 4:
+            self.bits = 32
+            self.network_class = ipaddress.IPv4Network
+            self.addresses = array(IPV4_TYPECODE)
+            self.high = self.low = None
+        else:
+            self.bits = 128
+            self.network_class = ipaddress.IPv6Network
+            self.addresses = None
+            self.high = array(HALF_TYPECODE)
+            self.low = array(HALF_TYPECODE)
+        self.lengths = array('B')
+        self.ids = array('l')
+        self.parent_ids = array('l')
+
+        #: Distinct prefix lengths, shortest first
+        self.prefix_lengths = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def arrays(self):
+        """Return (attribute name, typecode) of each array, in file order."""
+        if self.bits == 32:
+            addresses = [('addresses', IPV4_TYPECODE)]
+        else:
+            addresses = [('high', HALF_TYPECODE), ('low', HALF_TYPECODE)]
+        return addresses + [
+            ('lengths', 'B'), ('ids', ID_TYPECODE),
+            ('parent_ids', ID_TYPECODE),
+        ]
+
+    def append(self, network_id, parent_id, address, prefix_length):
+        """Add a Network. They must be added in order."""
+        if self.addresses is not None:
+            self.addresses.append(address)
+        else:
+            self.high.append(address >> 64)
+            self.low.append(address & LOW_MASK)
+        self.lengths.append(prefix_length)
+        self.ids.append(network_id)
+        self.parent_ids.append(parent_id or 0)
+
+    def finish(self):
+        self.prefix_lengths = sorted(set(self.lengths))
+
+    def address(self, i):
+        """Return the network address at index ``i`` as an integer."""
+        if self.addresses is not None:
+            return self.addresses[i]
+        return (self.high[i] << 64) | self.low[i]
+
+    def network(self, i):
+        """Return the network at index ``i`` as an ``ipaddress`` object."""
+        return self.network_class((self.address(i), self.lengths[i]))
+
+    def _bisect(self, address, bisect):
+        if self.addresses is not None:
+            return bisect(self.addresses, address)
+
+        # Narrow down to the addresses with the same high half.
+        high = address >> 64
+        start = bisect_left(self.high, high)
+        end = bisect_right(self.high, high, start)
+        return bisect(self.low, address & LOW_MASK, start, end)
+
+    def descendants(self, address, prefix_length):
+        """
+        Return the indexes of the Networks within a network, in order.
+
+        :param address:
+            Network address as an integer
+
+        :param prefix_length:
+            Prefix length of the network
+        """
+        broadcast = address | ((1 << (self.bits - prefix_length)) - 1)
+        start = self._bisect(address, bisect_left)
+        end = self._bisect(broadcast, bisect_right)
+        lengths = self.lengths
+        return [i for i in range(start, end) if lengths[i] > prefix_length]
+
+    def ancestors(self, address, prefix_length, minimum=0):
+        """
+        Return the indexes of the Networks containing a network, shortest
+        prefix first.
+
+        :param address:
+            Network address as an integer
+
+        :param prefix_length:
+            Prefix length of the network
+
+        :param minimum:
+            Shortest prefix length of the ancestors to include
+        """
+        return [
+            i for i in (
+                self._find(address, length)
+                for length in self.prefix_lengths
+                if minimum <= length < prefix_length
+            )
+            if i is not None
+        ]
+
+    def closest(self, address, prefix_length, minimum=0):
+        """
+        Return the index of the Network with the longest prefix containing a
+        network, or None. Takes the same arguments as ``ancestors()``.
+        """
+        for length in reversed(self.prefix_lengths):
+            if length >= prefix_length:
+                continue
+            if length < minimum:
+                break
+            i = self._find(address, length)
+            if i is not None:
+                return i
+
+        return None
+
+    def _find(self, address, length):
+        """
+        Return the index of the Network of ``length`` containing
+        ``address``, or None.
+        """
+        full = (1 << self.bits) - 1
+        masked = address & (full ^ (full >> length))
+
+        # Networks with the same address are sorted by prefix length.
+        i = self._bisect(masked, bisect_left)
+        size = len(self)
+        while i < size and self.address(i) == masked:
+            if self.lengths[i] >= length:
+                return i if self.lengths[i] == length else None
+            i += 1
+
+        return None
+
+
+class _Snapshot(object):
+    """The Networks of a Site, keyed by IP version."""
+    __slots__ = ('version', 'blocks', 'mapped')
+
+    def __init__(self, version, mapped=False):
+        self.version = version
+        self.blocks = {4: _Block(4), 6: _Block(6)}
+
+        #: Whether the arrays are in a shared snapshot file
+        self.mapped = mapped
+
+    def dump(self, fh):
+        """Write the snapshot to the file object ``fh``."""
+        v4, v6 = self.blocks[4], self.blocks[6]
+        fh.write(HEADER.pack(
+            MAGIC, LAYOUT, self.version, len(v4), len(v6),
+            len(v4.prefix_lengths), len(v6.prefix_lengths),
+        ))
+        for block in (v4, v6):
+            arrays = [array('B', block.prefix_lengths)]
+            arrays.extend(getattr(block, name) for name, _ in block.arrays())
+            for values in arrays:
+                data = _to_bytes(values)
+                fh.write(data)
+                fh.write(b'\0' * (-len(data) % 8))
+
+    @classmethod
+    def load(cls, buf):
+        """
+        Return the snapshot in ``buf`` (such as a memory-mapped file), with
+        arrays that refer to it.
+        """
+        magic, layout, version, n4, n6, lengths4, lengths6 = (
+            HEADER.unpack_from(buf)
+        )
+        snapshot = cls(version, mapped=True)
+        offset = HEADER.size
+        for ip_version, count, num_lengths in (
+            (4, n4, lengths4), (6, n6, lengths6)
+        ):
+            block = snapshot.blocks[ip_version]
+            arrays = [('prefix_lengths', 'B', num_lengths)]
+            arrays.extend(
+                (name, typecode, count) for name, typecode in block.arrays()
+            )
+            for name, typecode, num in arrays:
+                setattr(block, name, _view(buf, offset, typecode, num))
+                size = array(typecode).itemsize * num
+                offset += size + (-size % 8)
+            block.prefix_lengths = list(block.prefix_lengths)
+
+        return snapshot
+
+
+class IpamSnapshot(object):
+    """
+    Process-local snapshots of the Networks in each Site.
+
+    Use the ``ipam_snapshot`` instance rather than creating your own.
+    """
+    def __init__(self):
+        self._snapshots = {}
+        self._lock = threading.RLock()
+
+    @property
+    def enabled(self):
+        """Whether the snapshot is turned on and may be used."""
+        return (
+            getattr(settings, 'NSOT_IPAM_SNAPSHOT', False) and
+            versions.is_persistent()
+        )
+
+    @property
+    def directory(self):
+        """Directory of the snapshot files shared by processes, if any."""
+        if fcntl is None:
+            return None
+        return getattr(settings, 'NSOT_IPAM_SNAPSHOT_DIR', None)
+
+    def _version_name(self, site_id):
+        return 'ipam_snapshot_%s' % site_id
+
+    def _path(self, site_id):
+        return os.path.join(self.directory, 'ipam-snapshot-%s' % site_id)
+
+    def _load(self, site_id, version):
+        """
+        Return the snapshot of a Site mapped from its file, or None if the
+        file doesn't hold ``version``.
+        """
+        try:
+            with open(self._path(site_id), 'rb') as fh:
+                header = fh.read(HEADER.size)
+                if len(header) < HEADER.size:
+                    return None
+                magic, layout, file_version = HEADER.unpack(header)[:3]
+                if (magic, layout.rstrip(b'\0'), file_version) != (
+                    MAGIC, LAYOUT, version
+                ):
+                    return None
+
+                # The mapping stays valid once the file is closed, or renamed
+                # over by a newer snapshot.
+                buf = mmap.mmap(fh.fileno(), 0, access=MAP_ACCESS)
+        except (IOError, OSError):
+            return None
+
+        log.debug('Mapped IPAM snapshot of site: %r', site_id)
+        return _Snapshot.load(buf)
+
+    def _refresh(self, site_id, version):
+        """
+        Build the snapshot of a Site, write it to its file and return it
+        mapped from there, or None if another process is busy building it.
+
+        The lock on the file is taken before building, so that only one
+        process per host queries the database for each version.
+        """
+        path = self._path(site_id)
+        snapshot = None
+        try:
+            with open(path + '.lock', 'a') as lock:
+                try:
+                    fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except (IOError, OSError):
+                    return None
+
+                # Another process may have just written the same version.
+                mapped = self._load(site_id, version)
+                if mapped is not None:
+                    return mapped
+
+                snapshot = self._build(site_id, version)
+                fd, temp_path = tempfile.mkstemp(
+                    dir=self.directory, prefix='.ipam-snapshot-'
+                )
+                try:
+                    with os.fdopen(fd, 'wb') as fh:
+                        snapshot.dump(fh)
+                    os.rename(temp_path, path)
+                except Exception:
+                    os.remove(temp_path)
+                    raise
+        except (IOError, OSError) as err:
+            # Keep whatever we built in memory.
+            log.warning('Unable to write IPAM snapshot %r: %s', path, err)
+            return snapshot
+
+        log.debug('Wrote IPAM snapshot of site: %r', site_id)
+        return self._load(site_id, version) or snapshot
+
+    def _build(self, site_id, version):
+        log.debug('Building IPAM snapshot of site: %r', site_id)
+
+        # Avoid a circular import.
+        from .network import Network
+
+        snapshot = _Snapshot(version)
+        rows = Network.objects.using(DEFAULT_DB_ALIAS).filter(
+            site=site_id
+        ).order_by(
+            'ip_version', 'network_address', 'prefix_length'
+        ).values_list(
+            'id', 'parent_id', 'ip_version', 'network_address',
+            'prefix_length'
+        )
+        blocks = snapshot.blocks
+        for pk, parent_id, ip_version, address, prefix_length in (
+            rows.iterator()
+        ):
+            blocks[int(ip_version)].append(
+                pk, parent_id, int(address), prefix_length
+            )
+        for block in blocks.values():
+            block.finish()
+
+        return snapshot
+
+    def get_block(self, site_id, ip_version):
+        """
+        Return the up-to-date Networks of an IP version in a Site, or None if
+        the snapshot may not be used, or another process is busy building the
+        shared snapshot file.
+
+        :param site_id:
+            ID of the Site
+
+        :param ip_version:
+            IP version (4 or 6)
+        """
+        if not self.enabled or connection.in_atomic_block:
+            return None
+
+        site_id = int(site_id)
+        version = versions.get_version(self._version_name(site_id))
+
+        with self._lock:
+            snapshot = self._snapshots.get(site_id)
+
+        # As with the attribute index, the lock is never held while querying
+        # the database.
+        if snapshot is None or snapshot.version != version:
+            if self.directory:
+                snapshot = self._load(site_id, version)
+                if snapshot is None:
+                    snapshot = self._refresh(site_id, version)
+                if snapshot is None:
+                    return None
+            else:
+                snapshot = self._build(site_id, version)
+            with self._lock:
+                self._snapshots[site_id] = snapshot
+
+        return snapshot.blocks[int(ip_version)]
+
+    def closest_parents(self, cidrs, site_ids, prefix_length=0):
+        """
+        Return the ID of the closest parent Network of each of ``cidrs``, or
+        None for those without one, like ``PrefixIndex.closest_parents()``.
+        Returns None if the snapshot may not be used.
+
+        :param cidrs:
+            List of IPv4/IPv6 addresses or CIDR strings
+
+        :param site_ids:
+            IDs of the Sites to look in
+
+        :param prefix_length:
+            Shortest prefix length of the parents to consider
+        """
+        if not self.enabled or connection.in_atomic_block:
+            return None
+
+        parsed = [parse_cidr(cidr) for cidr in cidrs]
+        blocks = dict(
+            ((site_id, ip_version), self.get_block(site_id, ip_version))
+            for site_id in site_ids
+            for ip_version in set(ip_version for ip_version, _, _ in parsed)
+        )
+        if any(block is None for block in blocks.values()):
+            return None
+
+        results = []
+        for ip_version, address, below in parsed:
+            best = None
+            best_length = -1
+            for site_id in site_ids:
+                block = blocks[(site_id, ip_version)]
+                i = block.closest(address, below, prefix_length)
+                if i is not None and block.lengths[i] > best_length:
+                    best = block.ids[i]
+                    best_length = block.lengths[i]
+            results.append(best)
+
+        return results
+
+    def invalidate(self, site_id):
+        """
+        Invalidate the snapshot of a Site once the current transaction
+        commits.
+
+        :param site_id:
+            ID of the Site
+        """
+        if not self.enabled:
+            return
+
+        def apply_invalidate():
+            versions.bump_version(self._version_name(site_id))
+            with self._lock:
+                self._snapshots.pop(site_id, None)
+
+        transaction.on_commit(apply_invalidate)
+
+    def clear(self):
+        """Drop all snapshots."""
+        with self._lock:
+            self._snapshots.clear()
+
+
+#: The shared IPAM snapshot.
+ipam_snapshot = IpamSnapshot()
@@ -7,18 +7,29 @@ from operator import attrgetter
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 import ipaddress
 import netaddr
 import six
 
 from .. import exc, fields, util, validators
+from ..util import instrumentation
 from . import constants
+from .attribute_index import filter_ids
+from .ipam_snapshot import ipam_snapshot
+from .prefix_index import prefix_index
 from .resource import Resource, ResourceManager
 
 
 log = logging.getLogger(__name__)
 
 
+#: Subnets are fetched by ID from the IPAM snapshot only if there are at most
+#: this many of them. Larger subtrees are left to the range query, which the
+#: database answers from its index without a long list of IDs.
+MAX_SNAPSHOT_SUBNETS = 500
+
+
 class NetworkManager(ResourceManager):
     """Manager for NetworkInterface objects."""
     def get_by_address(self, cidr, site=None):
@@ -76,6 +87,20 @@ class NetworkManager(ResourceManager):
         else:
             supernets.reverse()
 
+        if site is not None:
+            block = ipam_snapshot.get_block(
+                getattr(site, 'pk', site), ip_version
+            )
+            if block is not None:
+                i = block.closest(
+                    int(cidr.network_address), cidr.prefixlen, prefix_length
+                )
+                if i is None:
+                    raise Network.DoesNotExist(
+                        'Network matching query does not exist.'
+                    )
+                return Network.objects.get(pk=block.ids[i])
+
         # Enumerate all unique networks and prefixes
         network_addresses = {six.text_type(s.network) for s in supernets}
         prefix_lengths = {s.prefixlen for s in supernets}
@@ -105,6 +130,64 @@ class NetworkManager(ResourceManager):
                 'Network matching query does not exist.'
             )
 
+    def get_closest_parents(self, cidrs, prefix_length=0, site=None):
+        """
+        Return the closest existing parent Network for each of ``cidrs``, in
+        order, or None for those without one.
+
+        Lookups are answered by the IPAM snapshot if it's enabled, or else
+        the in-memory prefix index of each Site, after which the parents are
+        fetched with a single query.
+
+        :param cidrs:
+            List of IPv4/IPv6 addresses or CIDR strings
+
+        :param prefix_length:
+            Maximum prefix length depth for closest parent lookup. It must be
+            within the address width of every one of ``cidrs``.
+
+        :param site:
+            ``Site`` instance or ``site_id``. If not set, the closest parent
+            in any Site is returned.
+        """
+        try:
+            prefix_length = int(prefix_length)
+        except (TypeError, ValueError):
+            raise exc.ValidationError({
+                'prefix_length': 'Invalid prefix_length: %r' %
+                prefix_length
+            })
+
+        for cidr in cidrs:
+            max_prefixlen = 128 if ':' in six.text_type(cidr) else 32
+            if not 0 <= prefix_length <= max_prefixlen:
+                raise exc.ValidationError({
+                    'prefix_length': 'Invalid prefix_length for %s: %r' % (
+                        cidr, prefix_length
+                    )
+                })
+
+        if site is None:
+            site_ids = list(Network.objects.order_by().values_list(
+                'site_id', flat=True
+            ).distinct())
+        else:
+            site_ids = [int(getattr(site, 'pk', site))]
+
+        parent_ids = ipam_snapshot.closest_parents(
+            cidrs, site_ids, prefix_length
+        )
+        if parent_ids is None:
+            parent_ids = prefix_index.closest_parents(
+                cidrs, site_ids, prefix_length
+            )
+        queryset = filter_ids(
+            Network.objects.select_related('parent'),
+            sorted(set(pk for pk in parent_ids if pk is not None))
+        )
+        parents = dict((network.pk, network) for network in queryset)
+        return [parents.get(pk) for pk in parent_ids]
+
     def reserved(self):
         return Network.objects.filter(state=Network.RESERVED)
 
@@ -183,7 +266,8 @@ class Network(Resource):
     def supernets(self, direct=False, discover_mode=False, for_update=False):
         query = Network.objects.all()
 
-        if self.parent is None and not discover_mode:
+        # Only the parent's ID is needed, so don't fetch it.
+        if self.parent_id is None and not discover_mode:
             return query.none()
 
         if discover_mode and direct:
@@ -195,7 +279,20 @@ class Network(Resource):
             query = query.select_for_update()
 
         if direct:
-            return query.filter(id=self.parent.id)
+            return query.filter(id=self.parent_id)
+
+        # Parents discovered while saving, and rows to be locked, must come
+        # from the database.
+        if discover_mode or for_update:
+            block = None
+        else:
+            block = self._get_snapshot_block()
+        if block is not None:
+            ip_network = self.ip_network
+            found = block.ancestors(
+                int(ip_network.network_address), ip_network.prefixlen
+            )
+            return filter_ids(query, sorted(block.ids[i] for i in found))
 
         return query.filter(
             site=self.site,
@@ -225,6 +322,12 @@ class Network(Resource):
         if direct:
             return query.filter(parent__id=self.id)
 
+        block = None if for_update else self._get_snapshot_block()
+        if block is not None:
+            found = self._descendants(block)
+            if len(found) <= MAX_SNAPSHOT_SUBNETS:
+                return filter_ids(query, sorted(block.ids[i] for i in found))
+
         return query.filter(
             site=self.site,
             ip_version=self.ip_version,
@@ -290,7 +393,20 @@ class Network(Resource):
             except ValueError as err:
                 raise exc.ValidationError({'prefix_length': err.message})
 
-        if strict:
+        block = self._get_snapshot_block()
+        if block is not None:
+            found = self._descendants(block)
+            if strict:
+                children = [
+                    block.network(i) for i in found
+                    if block.parent_ids[i] == self.id
+                ]
+            else:
+                children = [
+                    block.network(i) for i in found
+                    if block.lengths[i] >= prefix_length
+                ]
+        elif strict:
             children = [c.ip_network for c in self.get_children()]
         else:
             children = [
@@ -448,6 +564,47 @@ class Network(Resource):
             'network_address', 'prefix_length'
         )
 
+    def iter_tree(self, depth=None, include_ips=True):
+        """
+        Yield (network, level) for me (at level 0) and my descendants, with
+        every Network before its children.
+
+        Descendants are fetched with a single query ordered by network address
+        and prefix length, and nested by keeping a stack of the Networks
+        containing the current one. Each Network's parent is set from the
+        stack, so that it isn't fetched again.
+
+        :param depth:
+            Number of levels of descendants to include (default: all)
+
+        :param include_ips:
+            Whether to include IP addresses
+        """
+        yield self, 0
+        if depth is not None and depth < 1:
+            return
+
+        descendants = self.subnets(include_ips=include_ips).order_by(
+            'network_address', 'prefix_length'
+        )
+
+        # (network, broadcast address) of the Networks containing the
+        # current one, starting with me.
+        stack = [(self, None)]
+        for network in descendants.iterator():
+            address = int(network.network_address)
+            while len(stack) > 1 and address > stack[-1][1]:
+                stack.pop()
+
+            parent = stack[-1][0]
+            if parent.id == network.parent_id:
+                network.parent = parent
+
+            level = len(stack)
+            stack.append((network, int(network.broadcast_address)))
+            if depth is None or level <= depth:
+                yield network, level
+
     def get_root(self):
         """
         Returns the root node (the parent of all of my ancestors).
@@ -468,7 +625,15 @@ class Network(Resource):
         return query
 
     def get_utilization(self):
-        return util.get_network_utilization(self)
+        block = self._get_snapshot_block()
+        if block is None:
+            return util.get_network_utilization(self)
+
+        lengths = block.lengths
+        num_used = sum(
+            1 for i in self._descendants(block) if lengths[i] == block.bits
+        )
+        return util.summarize_network_utilization(self, num_used)
 
     def set_reserved(self, commit=True):
         self.state = self.RESERVED
@@ -485,12 +650,34 @@ class Network(Resource):
         if commit:
             self.save()
 
+    def _get_snapshot_block(self):
+        """Return my Site's Networks from the IPAM snapshot, or None."""
+        if self.site_id is None:
+            return None
+        return ipam_snapshot.get_block(self.site_id, self.ip_version)
+
+    def _descendants(self, block):
+        """Return the indexes of my descendants in ``block``."""
+        ip_network = self.ip_network
+        return block.descendants(
+            int(ip_network.network_address), ip_network.prefixlen
+        )
+
     @property
     def cidr(self):
         return u'%s/%s' % (self.network_address, self.prefix_length)
 
     @property
     def ip_network(self):
+        address = self.network_address
+        if isinstance(address, fields.IPAddress):
+            # Build it from the integer, rather than parsing the CIDR.
+            if address.version == 4:
+                network_class = ipaddress.IPv4Network
+            else:
+                network_class = ipaddress.IPv6Network
+            return network_class((int(address), self.prefix_length))
+
         return ipaddress.ip_network(self.cidr)
 
     def reparent_subnets(self):
@@ -506,7 +693,7 @@ class Network(Resource):
             broadcast_address__lte=self.broadcast_address
         )
 
-        query.update(parent=self)
+        query.update(parent=self, updated_at=timezone.now())
 
     def clean_state(self, value):
         """Enforce that state is one of the valid states."""
@@ -576,7 +763,9 @@ class Network(Resource):
                             )
                 # Otherwise, update all children to use the new parent and
                 # delete the old parent of these child nodes.
-                err.protected_objects.update(parent=new_parent)
+                err.protected_objects.update(
+                    parent=new_parent, updated_at=timezone.now()
+                )
                 super(Network, self).delete(**kwargs)
             else:
                 raise
@@ -612,7 +801,7 @@ class Network(Resource):
             'site_id': self.site_id,
             'is_ip': self.is_ip,
             'ip_version': self.ip_version,
-            'network_address': self.network_address,
+            'network_address': six.text_type(self.network_address),
             'prefix_length': self.prefix_length,
             'state': self.state,
             'attributes': self.get_attributes(),
@@ -620,6 +809,7 @@ class Network(Resource):
 
 
 # Signals
+@instrumentation.timed('signal')
 def refresh_assignment_interface_networks(sender, instance, **kwargs):
     """This signal fires each time a Network object is saved. Upon save,
     the signal iterates through all the child networks of the network
@@ -640,3 +830,49 @@ models.signals.post_save.connect(
     refresh_assignment_interface_networks, sender=Network,
     dispatch_uid='refresh_interface_assignment_networks_post_save_network'
 )
+
+
+@instrumentation.timed('signal')
+def add_to_prefix_index(sender, instance, created, **kwargs):
+    """Add a new Network to the prefix index of its Site."""
+    if created:
+        prefix_index.add_network(instance)
+
+
+@instrumentation.timed('signal')
+def remove_from_prefix_index(sender, instance, **kwargs):
+    """Remove a Network from the prefix index of its Site."""
+    prefix_index.remove_network(instance)
+
+
+models.signals.post_save.connect(
+    add_to_prefix_index, sender=Network,
+    dispatch_uid='add_to_prefix_index_post_save_network'
+)
+
+models.signals.post_delete.connect(
+    remove_from_prefix_index, sender=Network,
+    dispatch_uid='remove_from_prefix_index_post_delete_network'
+)
+
+
+@instrumentation.timed('signal')
+def invalidate_ipam_snapshot(sender, instance, **kwargs):
+    """
+    Invalidate the IPAM snapshot of a Network's Site when the Network is
+    created or deleted. Updates leave the addresses and tree unchanged.
+    """
+    # post_delete doesn't send ``created``.
+    if kwargs.get('created', True):
+        ipam_snapshot.invalidate(instance.site_id)
+
+
+models.signals.post_save.connect(
+    invalidate_ipam_snapshot, sender=Network,
+    dispatch_uid='invalidate_ipam_snapshot_post_save_network'
+)
+
+models.signals.post_delete.connect(
+    invalidate_ipam_snapshot, sender=Network,
+    dispatch_uid='invalidate_ipam_snapshot_post_delete_network'
+)
@@ -0,0 +1,281 @@
+"""
+In-memory index of the Networks in each Site, for longest prefix matching.
+
+For each Site and IP version, the index maps each prefix length to a dict of
+the Networks with that prefix length, keyed by their network address as an
+integer. The closest parent of an address is found by masking it to each
+prefix length in the index, longest first, and looking up the result in the
+dict for that length. That's at most one dict lookup per distinct prefix
+length, rather than a query per address.
+
+IP addresses (Networks with ``is_ip`` set) are left out, since they can't be
+the parent of anything.
+
+As with the attribute index, a Site's index is built with a single query the
+first time it's needed, kept in sync with the Networks created and deleted by
+this process, and versioned with ``nsot.util.versions`` so that changes made
+by other processes cause it to be rebuilt. It's always built from the primary
+database. If the cache backend doesn't retain values, the index is rebuilt for
+every lookup.
+"""
+
+from __future__ import absolute_import
+import logging
+import threading
+
+from django.db import transaction, DEFAULT_DB_ALIAS
+import six
+
+from .. import validators
+from ..util import versions
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = ('PrefixIndex', 'prefix_index', 'parse_cidr')
+
+
+#: Number of bits in the addresses of each IP version.
+ADDRESS_BITS = {4: 32, 6: 128}
+
+
+def parse_cidr(cidr):
+    """
+    Return (ip_version, network address as an integer, prefix length) for an
+    IPv4/IPv6 address or CIDR string.
+    """
+    network = validators.validate_cidr(cidr)
+    return (
+        network.version, int(network.network_address), network.prefixlen
+    )
+
+
+class _Table(object):
+    """The Networks of one Site keyed by prefix length and address."""
+    __slots__ = ('version', 'prefixes', 'lengths')
+
+    def __init__(self, version):
+        self.version = version
+
+        #: Network IDs keyed by network address, keyed by prefix length,
+        #: keyed by IP version
+        self.prefixes = {4: {}, 6: {}}
+
+        #: (prefix length, netmask, Network IDs keyed by network address),
+        #: longest prefix first, keyed by IP version
+        self.lengths = {4: [], 6: []}
+
+    def _update_lengths(self, ip_version):
+        bits = ADDRESS_BITS[ip_version]
+        full = (1 << bits) - 1
+        self.lengths[ip_version] = [
+            (length, full ^ (full >> length), networks)
+            for length, networks in sorted(
+                six.iteritems(self.prefixes[ip_version]), reverse=True
+            )
+        ]
+
+    def add(self, network_id, ip_version, address, prefix_length):
+        by_length = self.prefixes[ip_version]
+        networks = by_length.get(prefix_length)
+        if networks is None:
+            networks = by_length[prefix_length] = {}
+            self._update_lengths(ip_version)
+        networks[address] = network_id
+
+    def remove(self, network_id, ip_version, address, prefix_length):
+        by_length = self.prefixes[ip_version]
+        networks = by_length.get(prefix_length, {})
+        if networks.get(address) == network_id:
+            del networks[address]
+            if not networks:
+                del by_length[prefix_length]
+                self._update_lengths(ip_version)
+
+    def match(self, ip_version, address, below, minimum=0):
+        """
+        Return (Network ID, prefix length) of the longest prefix shorter than
+        ``below`` and no shorter than ``minimum`` containing ``address``, or
+        None.
+        """
+        for length, netmask, networks in self.lengths[ip_version]:
+            if length >= below:
+                continue
+            if length < minimum:
+                break
+            network_id = networks.get(address & netmask)
+            if network_id is not None:
+                return network_id, length
+
+        return None
+
+
+class PrefixIndex(object):
+    """
+    Process-local index of the Networks in each Site.
+
+    Use the ``prefix_index`` instance rather than creating your own.
+    """
+    def __init__(self):
+        self._tables = {}
+        self._lock = threading.RLock()
+
+    def _version_name(self, site_id):
+        return 'prefix_index_%s' % site_id
+
+    def _build(self, site_id, version):
+        log.debug('Building prefix index of site: %r', site_id)
+
+        # Avoid a circular import.
+        from .network import Network
+
+        table = _Table(version)
+        rows = Network.objects.using(DEFAULT_DB_ALIAS).filter(
+            site=site_id, is_ip=False
+        ).order_by().values_list(
+            'id', 'ip_version', 'network_address', 'prefix_length'
+        )
+        for network_id, ip_version, address, prefix_length in rows.iterator():
+            table.add(
+                network_id, int(ip_version), int(address), prefix_length
+            )
+
+        return table
+
+    def get_table(self, site_id):
+        """
+        Return the up-to-date index of a Site.
+
+        :param site_id:
+            ID of the Site
+        """
+        version = versions.get_version(self._version_name(site_id))
+
+        with self._lock:
+            table = self._tables.get(site_id)
+
+        # As with the attribute index, the lock is never held while querying
+        # the database.
+        if table is None or table.version != version:
+            table = self._build(site_id, version)
+            with self._lock:
+                self._tables[site_id] = table
+
+        return table
+
+    def closest_parents(self, cidrs, site_ids, prefix_length=0):
+        """
+        Return the ID of the closest parent Network of each of ``cidrs``, or
+        None for those without one.
+
+        :param cidrs:
+            List of IPv4/IPv6 addresses or CIDR strings
+
+        :param site_ids:
+            IDs of the Sites to look in. If there are several, the longest
+            prefix in any of them is chosen.
+
+        :param prefix_length:
+            Shortest prefix length of the parents to consider
+        """
+        parsed = [parse_cidr(cidr) for cidr in cidrs]
+        tables = [self.get_table(site_id) for site_id in site_ids]
+
+        results = []
+        with self._lock:
+            for ip_version, address, below in parsed:
+                best = None
+                for table in tables:
+                    found = table.match(
+                        ip_version, address, below, prefix_length
+                    )
+                    if found is not None and (
+                        best is None or found[1] > best[1]
+                    ):
+                        best = found
+                results.append(best and best[0])
+
+        return results
+
+    def _apply(self, site_id, change):
+        """Apply ``change`` to the index of a Site, or drop it."""
+        new_version = versions.bump_version(self._version_name(site_id))
+        with self._lock:
+            table = self._tables.get(site_id)
+            if table is None:
+                return
+
+            # If nobody else bumped the version in the meantime, we're still
+            # up-to-date after applying the change.
+            if table.version + 1 == new_version:
+                change(table)
+                table.version = new_version
+            else:
+                del self._tables[site_id]
+
+    def _network_key(self, network):
+        ip_network = network.ip_network
+        return (
+            network.id, ip_network.version, int(ip_network.network_address),
+            ip_network.prefixlen
+        )
+
+    def add_network(self, network):
+        """
+        Record that a Network has been created.
+
+        The change is applied once the current transaction commits.
+
+        :param network:
+            Network object
+        """
+        if network.is_ip:
+            return
+
+        site_id = network.site_id
+        key = self._network_key(network)
+        transaction.on_commit(
+            lambda: self._apply(site_id, lambda table: table.add(*key))
+        )
+
+    def remove_network(self, network):
+        """
+        Record that a Network has been deleted.
+
+        The change is applied once the current transaction commits.
+
+        :param network:
+            Network object
+        """
+        if network.is_ip:
+            return
+
+        site_id = network.site_id
+        key = self._network_key(network)
+        transaction.on_commit(
+            lambda: self._apply(site_id, lambda table: table.remove(*key))
+        )
+
+    def invalidate(self, site_id):
+        """
+        Invalidate the index of a Site once the current transaction commits.
+
+        :param site_id:
+            ID of the Site
+        """
+        def apply_invalidate():
+            versions.bump_version(self._version_name(site_id))
+            with self._lock:
+                self._tables.pop(site_id, None)
+
+        transaction.on_commit(apply_invalidate)
+
+    def clear(self):
+        """Drop all indexes."""
+        with self._lock:
+            self._tables.clear()
+
+
+#: The shared prefix index.
+prefix_index = PrefixIndex()
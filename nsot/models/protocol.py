@@ -1,12 +1,29 @@
 from __future__ import absolute_import
+import copy
+
 from django.db import models
+from django.utils import timezone
 import six
 
 from .. import exc
-from .attribute import Attribute
+from ..util import instrumentation
+from .circuit import Circuit
+from .device import Device
+from .interface import Interface
+from .protocol_type import ProtocolType
 from .resource import Resource
 
 
+#: Natural keys of related objects that are cached on Protocols, as
+#: (field, cached field, natural key field) keyed by the related model.
+CACHED_NATURAL_KEYS = {
+    ProtocolType: ('type', 'type_name', 'name'),
+    Device: ('device', 'device_hostname', 'hostname'),
+    Interface: ('interface', 'interface_name_slug', 'name_slug'),
+    Circuit: ('circuit', 'circuit_name_slug', 'name_slug'),
+}
+
+
 class Protocol(Resource):
     """
     Representation of a routing protocol
@@ -49,6 +66,24 @@ class Protocol(Resource):
         help_text='Description for this Protocol'
     )
 
+    # Cached natural keys of the related objects.
+    type_name = models.CharField(
+        max_length=255, null=False, blank=True, db_index=True, editable=False,
+        help_text='The name of the ProtocolType. (Internal use only)'
+    )
+    device_hostname = models.CharField(
+        max_length=255, null=False, blank=True, db_index=True, editable=False,
+        help_text='The hostname of the Device. (Internal use only)'
+    )
+    interface_name_slug = models.CharField(
+        max_length=255, null=True, blank=True, db_index=True, editable=False,
+        help_text='The natural key of the Interface. (Internal use only)'
+    )
+    circuit_name_slug = models.CharField(
+        max_length=255, null=True, blank=True, db_index=True, editable=False,
+        help_text='The natural key of the Circuit. (Internal use only)'
+    )
+
     def __unicode__(self):
         description = six.text_type(self.type)
 
@@ -118,51 +153,92 @@ class Protocol(Resource):
 
         return value
 
-    def set_attributes(self, attributes, valid_attributes=None, partial=False):
+    def _require_type_attributes(self, valid_attributes):
         """
-        Ensure that all attributes are set that are required by the set
-        ProtocolType.
+        Mark the attributes required by the set ProtocolType as ``required``
+        in ``valid_attributes``.
         """
         required = self.type.get_required_attributes()
-        if valid_attributes is None:
-            valid_attributes = Attribute.all_by_name(
-                'Protocol', site=self.site
-            )
 
         # Temporarily mark required attributes as ``required`` at run-time for
-        # injecting required_attributes into validation.
+        # injecting required_attributes into validation. These are copied
+        # first because Attribute objects may be shared by the schema cache.
         for r in required:
             if r in valid_attributes:
-                valid_attributes[r].required = True
+                attribute = copy.copy(valid_attributes[r])
+                attribute.required = True
+                valid_attributes[r] = attribute
+
+        return valid_attributes
+
+    def get_valid_attributes(self):
+        return self._require_type_attributes(
+            super(Protocol, self).get_valid_attributes()
+        )
+
+    def set_attributes(self, attributes, valid_attributes=None, partial=False):
+        """
+        Ensure that all attributes are set that are required by the set
+        ProtocolType.
+        """
+        if valid_attributes is None:
+            valid_attributes = self.get_valid_attributes()
+        else:
+            valid_attributes = self._require_type_attributes(valid_attributes)
 
         return super(Protocol, self).set_attributes(
             attributes, valid_attributes=valid_attributes,
             partial=partial
         )
 
+    def clean_natural_keys(self):
+        """Cache the natural keys of the related objects."""
+        for field, cached, key in six.itervalues(CACHED_NATURAL_KEYS):
+            obj = getattr(self, field)
+            setattr(self, cached, obj and getattr(obj, key))
+
     def clean_fields(self, exclude=None):
         self.site = self.clean_site(self.site)
         self.type = self.clean_type(self.type)
         self.interface = self.clean_interface(self.interface)
         self.circuit = self.clean_circuit(self.circuit)
+        self.clean_natural_keys()
 
     def save(self, *args, **kwargs):
         self.full_clean()
         super(Protocol, self).save(*args, **kwargs)
 
-    # TODO(jathan): type, device, interface, circuit need indexing. We might
-    # consider caching these values ON the Protocol object similarly how we've
-    # done it with other objects, so that the related lookups are only done on
-    # update.
     def to_dict(self):
         return {
             'id': self.id,
             'site': self.site_id,
-            'type': self.type.name,
-            'device': self.device.hostname,
-            'interface': self.interface and self.interface.name_slug,
-            'circuit': self.circuit and self.circuit.name_slug,
+            'type': self.type_name,
+            'device': self.device_hostname,
+            'interface': self.interface_name_slug,
+            'circuit': self.circuit_name_slug,
             'description': self.description,
             'auth_string': self.auth_string,
             'attributes': self.get_attributes(),
         }
+
+
+# Signals
+@instrumentation.timed('signal')
+def update_protocol_natural_keys(sender, instance, **kwargs):
+    """
+    Anytime an object that Protocols refer to is saved, update its natural key
+    cached on those Protocols.
+    """
+    field, cached, key = CACHED_NATURAL_KEYS[sender]
+    value = getattr(instance, key)
+    protocols = Protocol.objects.filter(**{field: instance}).exclude(
+        **{cached: value}
+    )
+    protocols.update(**{cached: value, 'updated_at': timezone.now()})
+
+
+for model_class in CACHED_NATURAL_KEYS:
+    models.signals.post_save.connect(
+        update_protocol_natural_keys, sender=model_class,
+        dispatch_uid='update_protocol_post_save_' + model_class.__name__
+    )
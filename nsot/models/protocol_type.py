@@ -2,6 +2,8 @@ from __future__ import absolute_import
 from django.db import models
 
 from .. import exc
+from ..util import instrumentation
+from .attribute import invalidate_attribute_schema, schema_cache
 
 
 class ProtocolType(models.Model):
@@ -37,10 +39,13 @@ class ProtocolType(models.Model):
         unique_together = ('site', 'name')
 
     def get_required_attributes(self):
-        """Return a list of the names of ``self.required_attributes``."""
-        # FIXME(jathan): These should probably cached on the model and updated
-        # on write. Revisit after we see how performance plays out in practice.
-        return list(self.required_attributes.values_list('name', flat=True))
+        """
+        Return a list of the names of ``self.required_attributes``.
+
+        These are served from the attribute schema cache, which is invalidated
+        any time ``required_attributes`` is changed.
+        """
+        return schema_cache.get_required_names(self.id)
 
     def to_dict(self):
         return {
@@ -53,6 +58,7 @@ class ProtocolType(models.Model):
 
 
 # Signals
+@instrumentation.timed('signal')
 def required_attributes_changed(sender, instance, action, reverse, model,
                                 pk_set, **kwargs):
     """
@@ -79,8 +85,23 @@ def required_attributes_changed(sender, instance, action, reverse, model,
             })
 
 
+@instrumentation.timed('signal')
+def invalidate_required_attributes(sender, instance, action, **kwargs):
+    """
+    Signal handler that invalidates cached schemas after a ProtocolType's
+    required_attributes have been modified.
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_attribute_schema()
+
+
 # Register required_attributes_changed -> ProtocolType.required_attributes
 models.signals.m2m_changed.connect(
     required_attributes_changed,
     sender=ProtocolType.required_attributes.through
 )
+models.signals.m2m_changed.connect(
+    invalidate_required_attributes,
+    sender=ProtocolType.required_attributes.through,
+    dispatch_uid='invalidate_attribute_schema_m2m_changed_protocol_type'
+)
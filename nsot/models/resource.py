@@ -9,12 +9,24 @@ import six
 
 from .. import exc, fields, util
 from .attribute import Attribute
+from .attribute_index import (
+    attribute_index, bitmap_to_ids, filter_ids, value_dictionary
+)
 from .value import Value
 
 
 log = logging.getLogger(__name__)
 
 
+#: Regex set queries matching more distinct values than this are left to the
+#: database, to stay within the query parameter limits of some backends.
+MAX_REGEX_VALUES = 500
+
+#: Number of objects whose unique fields are checked by each query of
+#: ``Resource.bulk_validate_unique()``.
+UNIQUE_BATCH_SIZE = 500
+
+
 class ResourceSetTheoryQuerySet(models.query.QuerySet):
     """
     Set theory QuerySet for Resource objects to add ``.set_query()`` method.
@@ -59,9 +71,9 @@ class ResourceSetTheoryQuerySet(models.query.QuerySet):
                 })
             return objects.none()
 
-        # Iterate a/v pairs and combine query results using MySQL-compatible
-        # set operations w/ the ORM
-        log.debug('QUERY [start]: objects = %r', objects)
+        # Resolve the Attribute for each term up front, so that an invalid
+        # query fails before any work is done.
+        terms = []
         for action, name, value in attributes:
             # Is this a regex pattern?
             regex_query = False
@@ -70,6 +82,9 @@ class ResourceSetTheoryQuerySet(models.query.QuerySet):
                 regex_query = True
                 log.debug('Regex enabled for %r' % name)
 
+            if action not in ('union', 'difference', 'intersection'):
+                raise exc.BadRequest('BAD SET QUERY: %r' % (action,))
+
             # Attribute lookup params
             params = dict(
                 name=name, resource_name=resource_name
@@ -89,6 +104,39 @@ class ResourceSetTheoryQuerySet(models.query.QuerySet):
                     'query': '%s: %r' % (err.message.rstrip('.'), name)
                 })
 
+            # Regex patterns are resolved to the matching distinct values.
+            matched = None
+            if regex_query:
+                matched = value_dictionary.match(
+                    attr.site_id, resource_name, attr.name, value
+                )
+
+            terms.append((action, attr, value, regex_query, matched))
+
+        if attribute_index.enabled:
+            objects = self._set_query_index(objects, terms)
+        else:
+            objects = self._set_query_sql(objects, terms)
+
+        count = objects.count()
+        if unique and count != 1:
+            # There can be only one
+            raise exc.ValidationError({
+                'query': 'Query returned %r results, but exactly 1 expected'
+                % count
+            })
+        else:
+            # Gotta call .distinct() or we might get dupes.
+            return objects.distinct()
+
+    def _set_query_sql(self, objects, terms):
+        """Combine set query ``terms`` using subqueries in the database."""
+        resource_name = self.model.__name__
+
+        # Iterate a/v pairs and combine query results using MySQL-compatible
+        # set operations w/ the ORM
+        log.debug('QUERY [start]: objects = %r', objects)
+        for action, attr, value, regex_query, matched in terms:
             # Set lookup params
             next_set_params = {
                 'name': attr.name,
@@ -96,9 +144,14 @@ class ResourceSetTheoryQuerySet(models.query.QuerySet):
                 'resource_name': resource_name
             }
 
-            # If it's a regex query, swap ``value`` with ``value__regex``.
+            # If it's a regex query, swap ``value`` with the matching values,
+            # unless they weren't resolved or there are too many to list.
             if regex_query:
-                next_set_params['value__regex'] = next_set_params.pop('value')
+                value = next_set_params.pop('value')
+                if matched is not None and len(matched) <= MAX_REGEX_VALUES:
+                    next_set_params['value__in'] = matched
+                else:
+                    next_set_params['value__regex'] = value
 
             next_set = Q(
                 id__in=Value.objects.filter(
@@ -119,20 +172,50 @@ class ResourceSetTheoryQuerySet(models.query.QuerySet):
             elif action == 'intersection':
                 log.debug('SQL INTERSECTION')
                 objects = objects.filter(next_set)
-            else:
-                raise exc.BadRequest('BAD SET QUERY: %r' % (action,))
             log.debug('QUERY [iter]: objects = %r', objects)
 
-        count = objects.count()
-        if unique and count != 1:
-            # There can be only one
-            raise exc.ValidationError({
-                'query': 'Query returned %r results, but exactly 1 expected'
-                % count
-            })
-        else:
-            # Gotta call .distinct() or we might get dupes.
-            return objects.distinct()
+        return objects
+
+    def _set_query_index(self, objects, terms):
+        """
+        Combine set query ``terms`` using bitmaps from the attribute index.
+
+        The result is tracked as ``(negated, bitmap)``, where a negated result
+        stands for every object *except* those in the bitmap. A query starts
+        out as "everything" and only the final result is looked up in the
+        database.
+        """
+        resource_name = self.model.__name__
+
+        negated, result = True, 0
+        for action, attr, value, _, values in terms:
+            if values is None:
+                values = [value]
+
+            matched = 0
+            for val in values:
+                matched |= attribute_index.lookup(
+                    [attr.site_id], resource_name, attr.name, val
+                )
+            log.debug('INDEX %s: %r=%r', action.upper(), attr.name, value)
+
+            if action == 'union':
+                if negated:
+                    result &= ~matched
+                else:
+                    result |= matched
+            elif action == 'difference':
+                if negated:
+                    result |= matched
+                else:
+                    result &= ~matched
+            elif action == 'intersection':
+                if negated:
+                    negated, result = False, matched & ~result
+                else:
+                    result &= matched
+
+        return filter_ids(objects, bitmap_to_ids(result), exclude=negated)
 
     def by_attribute(self, name, value, site_id=None):
         """
@@ -218,6 +301,10 @@ class Resource(models.Model):
         null=False, blank=True,
         help_text='Local cache of attributes. (Internal use only)'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True, db_index=True,
+        help_text='When this object was last changed. (Internal use only)'
+    )
 
     def __init__(self, *args, **kwargs):
         self._set_attributes = kwargs.pop('attributes', None)
@@ -246,6 +333,13 @@ class Resource(models.Model):
         """Return the JSON-encoded attributes as a dict."""
         return self._attributes_cache
 
+    def get_valid_attributes(self):
+        """
+        Return a dict of the Attribute objects that may be set on this object,
+        keyed by name.
+        """
+        return Attribute.all_by_name(self._resource_name, self.site_id)
+
     def set_attributes(self, attributes, valid_attributes=None, partial=False):
         """Validate and store the attributes dict as a JSON-encoded string."""
         log.debug('Resource.set_attributes() attributes = %r',
@@ -266,9 +360,7 @@ class Resource(models.Model):
         # attribute name. If not provided, defaults to all matching
         # resource_name.
         if valid_attributes is None:
-            valid_attributes = Attribute.all_by_name(
-                self._resource_name, self.site
-            )
+            valid_attributes = self.get_valid_attributes()
         log.debug('Resource.set_attributes() valid_attributes = %r',
                   valid_attributes)
 
@@ -310,6 +402,13 @@ class Resource(models.Model):
         # Purge all of our previously existing attribute values and recreate
         # them anew.
         # FIXME(jathan): This isn't exactly efficient. How can make gud?
+        old_attributes = self._attributes_cache
+        if attribute_index.enabled:
+            # The cache of an object created with ``attributes`` isn't saved
+            # with it, so read the values being replaced back for the index.
+            old_attributes = {}
+            for name, value in self.attributes.values_list('name', 'value'):
+                old_attributes.setdefault(name, []).append(value)
         self._purge_attribute_index()
         for insert in inserts:
             Value.objects.create(
@@ -318,6 +417,12 @@ class Resource(models.Model):
             )
 
         self.clean_attributes()
+        attribute_index.update_resource(
+            self, old_attributes, self._attributes_cache
+        )
+        value_dictionary.update_resource(
+            self, old_attributes, self._attributes_cache
+        )
 
     def clean_attributes(self):
         """Make sure that attributes are saved as JSON."""
@@ -335,6 +440,79 @@ class Resource(models.Model):
 
         return attrs
 
+    @classmethod
+    def bulk_clean(cls, objects, validate_unique=True):
+        """
+        Validate many objects of this type before they are written by a bulk
+        update, as ``save()`` would.
+
+        :param objects:
+            List of objects
+
+        :param validate_unique:
+            Whether to check unique constraints
+        """
+        for obj in objects:
+            obj.full_clean(validate_unique=False)
+
+        if validate_unique:
+            cls.bulk_validate_unique(objects)
+
+    @classmethod
+    def bulk_validate_unique(cls, objects):
+        """
+        Check the unique constraints of many objects as ``validate_unique()``
+        does, with one query per constraint rather than per object.
+
+        :param objects:
+            List of saved objects
+        """
+        if not objects:
+            return
+
+        ids = [obj.pk for obj in objects]
+        unique_checks, _ = objects[0]._get_unique_checks()
+        for model_class, unique_check in unique_checks:
+            # The objects are saved, so their primary keys are unique.
+            if unique_check == (cls._meta.pk.name,):
+                continue
+
+            attnames = [
+                cls._meta.get_field(name).attname for name in unique_check
+            ]
+
+            owners = {}
+            for obj in objects:
+                key = tuple(getattr(obj, attname) for attname in attnames)
+                if None in key:
+                    continue
+                if key in owners:
+                    cls._raise_unique_error(obj, model_class, unique_check)
+                owners[key] = obj
+
+            keys = list(owners)
+            for i in range(0, len(keys), UNIQUE_BATCH_SIZE):
+                query = Q()
+                for key in keys[i:i + UNIQUE_BATCH_SIZE]:
+                    query |= Q(**dict(zip(attnames, key)))
+                taken = cls.objects.filter(query).exclude(
+                    pk__in=ids
+                ).values_list(*attnames)[:1]
+                for key in taken:
+                    obj = owners[tuple(key)]
+                    cls._raise_unique_error(obj, model_class, unique_check)
+
+    @staticmethod
+    def _raise_unique_error(obj, model_class, unique_check):
+        """Raise the error that ``validate_unique()`` would for ``obj``."""
+        if len(unique_check) == 1:
+            key = unique_check[0]
+        else:
+            key = exc.NON_FIELD_ERRORS
+        raise exc.DjangoValidationError({
+            key: [obj.unique_error_message(model_class, unique_check)]
+        })
+
     def save(self, *args, **kwargs):
         self._is_new = self.id is None  # Check if this is a new object.
 
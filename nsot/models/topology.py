@@ -0,0 +1,438 @@
+"""
+In-memory topology of the Devices in each Site.
+
+The topology of a Site is an undirected graph whose nodes are Devices and
+whose edges are the Circuits between them, found by way of the Device of each
+endpoint Interface. It's built lazily with a single query the first time it's
+needed, after which neighbor, shortest path and connected component queries
+are answered from memory.
+
+Devices that aren't connected to any Circuits aren't in the graph. Each of
+them is a component of its own.
+
+As with the attribute index, graphs are kept in sync with the Circuits saved
+and deleted by this process and are versioned with ``nsot.util.versions``, so
+that changes made by other processes cause them to be rebuilt. Graphs are
+built from the primary database. If the cache backend doesn't retain values,
+graphs are rebuilt for every query.
+"""
+
+from __future__ import absolute_import
+import collections
+import logging
+import threading
+
+from django.db import models, transaction, DEFAULT_DB_ALIAS
+import six
+
+from ..util import instrumentation, versions
+from .circuit import Circuit
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = ('Topology', 'topology')
+
+
+class _Graph(object):
+    """Devices in a Site and the Circuits connecting them."""
+    __slots__ = ('version', 'adjacency', 'circuits', '_components')
+
+    def __init__(self, version):
+        self.version = version
+
+        #: Circuit IDs keyed by neighbor ID, keyed by Device ID
+        self.adjacency = {}
+
+        #: (endpoint_a device ID, endpoint_z device ID) keyed by Circuit ID
+        self.circuits = {}
+
+        #: Component number keyed by Device ID, computed when first needed
+        self._components = None
+
+    def _link(self, circuit_id, devices, add):
+        a_id, z_id = devices
+        if a_id is None or z_id is None or a_id == z_id:
+            return
+
+        for source, target in ((a_id, z_id), (z_id, a_id)):
+            links = self.adjacency.setdefault(source, {})
+            if add:
+                links.setdefault(target, []).append(circuit_id)
+                continue
+
+            circuit_ids = links.get(target, [])
+            if circuit_id in circuit_ids:
+                circuit_ids.remove(circuit_id)
+            if not circuit_ids:
+                links.pop(target, None)
+            if not links:
+                del self.adjacency[source]
+
+        self._components = None
+
+    def set_circuit(self, circuit_id, devices):
+        """
+        Add or replace a Circuit.
+
+        :param devices:
+            Tuple of the IDs of the Devices at either end, or None for a
+            missing endpoint_z
+        """
+        self.remove_circuit(circuit_id)
+        self.circuits[circuit_id] = devices
+        self._link(circuit_id, devices, add=True)
+
+    def remove_circuit(self, circuit_id):
+        """Remove a Circuit, if it's in the graph."""
+        devices = self.circuits.pop(circuit_id, None)
+        if devices is not None:
+            self._link(circuit_id, devices, add=False)
+
+    def neighbors(self, device_id):
+        """
+        Return a sorted list of (neighbor ID, Circuit IDs) for a Device.
+        """
+        links = self.adjacency.get(device_id, {})
+        return sorted(
+            (neighbor_id, sorted(circuit_ids))
+            for neighbor_id, circuit_ids in six.iteritems(links)
+        )
+
+    def _expand(self, frontier, seen, other):
+        """
+        Visit the neighbors of ``frontier`` that haven't been ``seen``.
+        Returns the next frontier and the first neighbor found in ``other``.
+        """
+        adjacency = self.adjacency
+        next_frontier = []
+        for node in frontier:
+            for neighbor in adjacency[node]:
+                if neighbor in seen:
+                    continue
+                seen[neighbor] = node
+                if neighbor in other:
+                    return next_frontier, neighbor
+                next_frontier.append(neighbor)
+
+        return next_frontier, None
+
+    def shortest_path(self, source, target):
+        """
+        Return the IDs of the Devices on a shortest path from ``source`` to
+        ``target`` (inclusive), or None if they aren't connected.
+
+        The search runs breadth-first from both ends at once, always
+        expanding the smaller frontier, so it only visits a fraction of the
+        graph for nearby Devices.
+        """
+        if source == target:
+            return [source]
+        if source not in self.adjacency or target not in self.adjacency:
+            return None
+
+        forward = {source: None}
+        backward = {target: None}
+        forward_frontier = [source]
+        backward_frontier = [target]
+        meet = None
+        while forward_frontier and backward_frontier:
+            if len(forward_frontier) <= len(backward_frontier):
+                forward_frontier, meet = self._expand(
+                    forward_frontier, forward, backward
+                )
+            else:
+                backward_frontier, meet = self._expand(
+                    backward_frontier, backward, forward
+                )
+            if meet is not None:
+                break
+        else:
+            return None
+
+        path = []
+        node = meet
+        while node is not None:
+            path.append(node)
+            node = forward[node]
+        path.reverse()
+        node = backward[meet]
+        while node is not None:
+            path.append(node)
+            node = backward[node]
+
+        return path
+
+    def path_circuits(self, path):
+        """Return the Circuit IDs between each pair of Devices on ``path``."""
+        return [
+            sorted(self.adjacency[source][target])
+            for source, target in zip(path, path[1:])
+        ]
+
+    @property
+    def components(self):
+        """Component number keyed by Device ID, for connected Devices."""
+        if self._components is None:
+            components = {}
+            number = 0
+            for start in self.adjacency:
+                if start in components:
+                    continue
+                components[start] = number
+                queue = collections.deque([start])
+                while queue:
+                    node = queue.popleft()
+                    for neighbor in self.adjacency[node]:
+                        if neighbor not in components:
+                            components[neighbor] = number
+                            queue.append(neighbor)
+                number += 1
+            self._components = components
+
+        return self._components
+
+    def component(self, device_id):
+        """Return the sorted IDs of the Devices connected to a Device."""
+        components = self.components
+        number = components.get(device_id)
+        if number is None:
+            return [device_id]
+        return sorted(
+            pk for pk, num in six.iteritems(components) if num == number
+        )
+
+    def summary(self):
+        """Return counts of the connected Devices, Circuits and components."""
+        components = self.components
+        return {
+            'connected_devices': len(components),
+            'circuits': len(self.circuits),
+            'components': len(set(six.itervalues(components))),
+        }
+
+
+class Topology(object):
+    """
+    Process-local topology graphs of each Site.
+
+    Use the ``topology`` instance rather than creating your own.
+    """
+    def __init__(self):
+        self._graphs = {}
+        self._lock = threading.RLock()
+
+    def _version_name(self, site_id):
+        return 'topology_%s' % site_id
+
+    def _build(self, site_id, version):
+        log.debug('Building topology of site: %r', site_id)
+        graph = _Graph(version)
+        rows = Circuit.objects.using(DEFAULT_DB_ALIAS).filter(
+            site=site_id
+        ).order_by().values_list(
+            'id', 'endpoint_a__device', 'endpoint_z__device'
+        )
+        for circuit_id, a_id, z_id in rows.iterator():
+            graph.set_circuit(circuit_id, (a_id, z_id))
+
+        return graph
+
+    def get_graph(self, site_id):
+        """
+        Return the up-to-date graph of a Site.
+
+        :param site_id:
+            ID of the Site
+        """
+        version = versions.get_version(self._version_name(site_id))
+
+        with self._lock:
+            graph = self._graphs.get(site_id)
+
+        # As with the attribute index, the lock is never held while querying
+        # the database.
+        if graph is None or graph.version != version:
+            graph = self._build(site_id, version)
+            with self._lock:
+                self._graphs[site_id] = graph
+
+        return graph
+
+    def neighbors(self, site_id, device_id):
+        """
+        Return a sorted list of (neighbor ID, Circuit IDs) for a Device.
+
+        :param site_id:
+            ID of the Site
+
+        :param device_id:
+            ID of the Device
+        """
+        graph = self.get_graph(site_id)
+        with self._lock:
+            return graph.neighbors(device_id)
+
+    def shortest_path(self, site_id, source, target):
+        """
+        Return a shortest path between two Devices as a tuple of a list of
+        Device IDs (including both ends) and a list of the Circuit IDs
+        between each pair of them, or None if they aren't connected.
+
+        :param site_id:
+            ID of the Site
+
+        :param source:
+            ID of the Device to start from
+
+        :param target:
+            ID of the Device to end at
+        """
+        graph = self.get_graph(site_id)
+        with self._lock:
+            path = graph.shortest_path(source, target)
+            if path is None:
+                return None
+            return path, graph.path_circuits(path)
+
+    def component(self, site_id, device_id):
+        """
+        Return the sorted IDs of the Devices in the connected component of a
+        Device.
+
+        :param site_id:
+            ID of the Site
+
+        :param device_id:
+            ID of the Device
+        """
+        graph = self.get_graph(site_id)
+        with self._lock:
+            return graph.component(device_id)
+
+    def summary(self, site_id):
+        """
+        Return counts of the connected Devices, Circuits and connected
+        components of a Site.
+
+        :param site_id:
+            ID of the Site
+        """
+        graph = self.get_graph(site_id)
+        with self._lock:
+            return graph.summary()
+
+    def _apply(self, site_id, change):
+        """Apply ``change`` to the graph of a Site, or drop it."""
+        new_version = versions.bump_version(self._version_name(site_id))
+        with self._lock:
+            graph = self._graphs.get(site_id)
+            if graph is None:
+                return
+
+            # If nobody else bumped the version in the meantime, we're still
+            # up-to-date after applying the change.
+            if graph.version + 1 == new_version:
+                change(graph)
+                graph.version = new_version
+            else:
+                del self._graphs[site_id]
+
+    def update_circuit(self, circuit):
+        """
+        Record that a Circuit has been saved.
+
+        The change is applied once the current transaction commits, unless
+        this process already knows that the Circuit's endpoints haven't
+        changed.
+
+        :param circuit:
+            Circuit object
+        """
+        site_id = circuit.site_id
+        circuit_id = circuit.id
+        devices = (
+            circuit.endpoint_a.device_id,
+            circuit.endpoint_z and circuit.endpoint_z.device_id,
+        )
+
+        def apply_update():
+            with self._lock:
+                current = self._graphs.get(site_id)
+                unchanged = (
+                    current is not None and
+                    current.circuits.get(circuit_id) == devices
+                )
+            name = self._version_name(site_id)
+            if unchanged and current.version == versions.get_version(name):
+                return
+
+            self._apply(
+                site_id, lambda graph: graph.set_circuit(circuit_id, devices)
+            )
+
+        transaction.on_commit(apply_update)
+
+    def remove_circuit(self, circuit):
+        """
+        Record that a Circuit has been deleted.
+
+        The change is applied once the current transaction commits.
+
+        :param circuit:
+            Circuit object
+        """
+        site_id = circuit.site_id
+        circuit_id = circuit.id
+
+        transaction.on_commit(lambda: self._apply(
+            site_id, lambda graph: graph.remove_circuit(circuit_id)
+        ))
+
+    def invalidate(self, site_id):
+        """
+        Invalidate the graph of a Site once the current transaction commits.
+
+        :param site_id:
+            ID of the Site
+        """
+        def apply_invalidate():
+            versions.bump_version(self._version_name(site_id))
+            with self._lock:
+                self._graphs.pop(site_id, None)
+
+        transaction.on_commit(apply_invalidate)
+
+    def clear(self):
+        """Drop all graphs."""
+        with self._lock:
+            self._graphs.clear()
+
+
+#: The shared topology.
+topology = Topology()
+
+
+# Signals
+@instrumentation.timed('signal')
+def update_topology(sender, instance, **kwargs):
+    """Update the topology of a Circuit's Site when the Circuit is saved."""
+    topology.update_circuit(instance)
+
+
+@instrumentation.timed('signal')
+def remove_from_topology(sender, instance, **kwargs):
+    """Remove a Circuit from the topology of its Site when it's deleted."""
+    topology.remove_circuit(instance)
+
+
+models.signals.post_save.connect(
+    update_topology, sender=Circuit,
+    dispatch_uid='update_topology_post_save_circuit'
+)
+
+models.signals.post_delete.connect(
+    remove_from_topology, sender=Circuit,
+    dispatch_uid='remove_from_topology_post_delete_circuit'
+)
@@ -4,7 +4,6 @@ from __future__ import absolute_import
 import json
 import logging
 
-from cryptography.fernet import (Fernet, InvalidToken)
 from custom_user.models import AbstractEmailUser
 from django.conf import settings
 from django.db import models
@@ -52,6 +51,7 @@ class User(AbstractEmailUser):
         data = json.dumps({'email': self.email})
 
         # Encrypt w/ servers's secret_key
+        from cryptography.fernet import Fernet
         f = Fernet(bytes(settings.SECRET_KEY))
         auth_token = f.encrypt(bytes(data))
         return auth_token
@@ -78,6 +78,7 @@ class User(AbstractEmailUser):
             # return None  # Invalid user
 
         # Decrypt auth_token w/ user's secret_key
+        from cryptography.fernet import Fernet, InvalidToken
         f = Fernet(bytes(settings.SECRET_KEY))
         try:
             decrypted_data = f.decrypt(bytes(auth_token), ttl=expiration)
@@ -6,6 +6,7 @@ from django.db import models
 from .. import exc
 from . import constants
 from .attribute import Attribute
+from .attribute_index import attribute_index, value_dictionary
 
 
 class Value(models.Model):
@@ -94,6 +95,18 @@ class Value(models.Model):
         self.full_clean()
         super(Value, self).save(*args, **kwargs)
 
+        # Values saved through ``Resource.set_attributes()`` update the
+        # attribute indexes themselves. Anything else invalidates them.
+        if self._obj is None:
+            attribute_index.invalidate(self.site_id, self.resource_name)
+            value_dictionary.add_values(
+                self.site_id, self.resource_name, [self.name]
+            )
+
+    def delete(self, *args, **kwargs):
+        attribute_index.invalidate(self.site_id, self.resource_name)
+        return super(Value, self).delete(*args, **kwargs)
+
     def to_dict(self):
         return {
             'id': self.id,
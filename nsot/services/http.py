@@ -1,13 +1,81 @@
 from __future__ import absolute_import, print_function
+import glob
+import os
+import shutil
+import tempfile
 
+from django.conf import settings
 from gunicorn.app.base import Application
 
 from nsot.services.base import Service
 
 
+#: Environment variable used by prometheus_client for multiprocess mode.
+METRICS_DIR_ENV = 'prometheus_multiproc_dir'
+
+#: Supported gunicorn worker classes.
+WORKER_CLASSES = ('sync', 'gthread', 'gevent')
+
+
+def prepare_metrics_dir(path=None):
+    """
+    Prepare the directory shared by workers for their metrics.
+
+    This must happen before ``prometheus_client`` is first imported, which is
+    why it doesn't live in ``nsot.util.metrics``.
+
+    :param path:
+        Directory to use. Defaults to a new temporary directory.
+    """
+    if path is None:
+        path = tempfile.mkdtemp(prefix='nsot-metrics-')
+    elif not os.path.isdir(path):
+        os.makedirs(path)
+
+    # Metrics left over from a previous run would be added to ours.
+    for filename in glob.glob(os.path.join(path, '*.db')):
+        os.remove(filename)
+
+    os.environ[METRICS_DIR_ENV] = path
+    return path
+
+
+def child_exit(server, worker):
+    """
+    Clean up the metrics of a worker that has exited.
+
+    This runs in the master, so it's also called for workers that were
+    killed, e.g. after a timeout.
+    """
+    if METRICS_DIR_ENV in os.environ:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def remove_metrics_dir(server):
+    """Remove the temporary metrics directory once the server exits."""
+    path = os.environ.get(METRICS_DIR_ENV)
+    if path is not None:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def post_worker_init(worker):
+    """Set up database connections for a worker that has just started."""
+    from nsot.util import db, instrumentation
+
+    # The gevent worker has now monkey-patched ``threading``.
+    db.reset_connections()
+    instrumentation.reset()
+    db.configure_pool(
+        getattr(settings, 'NSOT_DB_POOL_SIZE', 10),
+        getattr(settings, 'NSOT_DB_POOL_TIMEOUT', 30),
+    )
+
+
 class NsotGunicornCommand(Application):
     """Gunicorn WSGI service."""
-    def __init__(self, options):
+    def __init__(self, options, fast_start=False):
+        self.fast_start = fast_start
         self.usage = None
         self.prog = None
         self.cfg = None
@@ -25,7 +93,25 @@ class NsotGunicornCommand(Application):
         return cfg
 
     def load(self):
-        import nsot.wsgi
+        if not self.fast_start:
+            import nsot.wsgi
+            return nsot.wsgi.application
+
+        # The app is loaded once by the master process and shared by the
+        # workers, so do as much of the work up front as possible.
+        from nsot.util import startup
+
+        with startup.ImportTimer() as timer:
+            import nsot.wsgi
+            startup.preload_app()
+        print(timer.report())
+
+        # The workers would otherwise inherit the connections used to check
+        # for migrations, and share their sockets.
+        from django.db import connections
+        connections.close_all()
+
+        startup.freeze()
         return nsot.wsgi.application
 
 
@@ -35,30 +121,57 @@ class NsotHTTPServer(Service):
 
     def __init__(self, host=None, port=None, debug=False, workers=None,
                  worker_class=None, timeout=None, loglevel='info',
-                 preload=False, max_requests=0, max_requests_jitter=0):
+                 preload=False, max_requests=0, max_requests_jitter=0,
+                 threads=None, worker_connections=None, fast_start=False):
+
+        if worker_class not in WORKER_CLASSES:
+            raise ValueError(
+                'Invalid worker class %r; must be one of: %s' % (
+                    worker_class, ', '.join(WORKER_CLASSES)
+                )
+            )
 
         options = {
             'bind': '%s:%s' % (host, port),
             'workers': workers,
             'worker_class': worker_class,
+            'threads': threads if worker_class == 'gthread' else None,
+            'worker_connections': (
+                worker_connections if worker_class == 'gevent' else None
+            ),
             'timeout': timeout,
             'proc_name': 'NSoT',
             'access_logfile': '-',  # 'accesslog': '-',
             'errorlog': '-',
             'loglevel': loglevel,
             'limit_request_line': 0,
-            'preload_app': preload,
+            'preload_app': preload or fast_start,
             'max_requests': max_requests,
             'max_requests_jitter': max_requests_jitter,
         }
 
+        # A sync worker handles one request at a time with Django's own
+        # connection, so there's nothing to pool.
+        if worker_class != 'sync':
+            options['post_worker_init'] = post_worker_init
+
+        if getattr(settings, 'NSOT_METRICS', False):
+            metrics_dir = getattr(settings, 'NSOT_METRICS_DIR', None)
+            prepare_metrics_dir(metrics_dir)
+            options['child_exit'] = child_exit
+            if metrics_dir is None:
+                options['on_exit'] = remove_metrics_dir
+
         self.options = options
+        self.fast_start = fast_start
 
         print(
-            'Running service: %r, num workers: %s, worker timeout: %s' % (
-                self.name, self.options['workers'], self.options['timeout']
+            'Running service: %r, num workers: %s, worker class: %s, '
+            'worker timeout: %s' % (
+                self.name, self.options['workers'], worker_class,
+                self.options['timeout']
             )
         )
 
     def run(self):
-        NsotGunicornCommand(self.options).run()
+        NsotGunicornCommand(self.options, fast_start=self.fast_start).run()
@@ -4,16 +4,19 @@ Used for caching read-only REST API responses (provided by drf-extensions).
 
 from __future__ import absolute_import
 import logging
+from rest_framework_extensions.cache.decorators import CacheResponse
 from rest_framework_extensions.key_constructor import bits, constructors
 from django.core.cache import cache as djcache
 from django.utils import timezone
 from django.utils.encoding import force_text
 
+from . import instrumentation
+
 
 log = logging.getLogger(__name__)
 
 
-__all__ = ('object_key_func', 'list_key_func')
+__all__ = ('object_key_func', 'list_key_func', 'cache_response')
 
 
 class UpdatedAtKeyBit(bits.KeyBitBase):
@@ -53,3 +56,13 @@ class ListKeyConstructor(constructors.DefaultKeyConstructor):
 
 
 list_key_func = ListKeyConstructor()
+
+
+class InstrumentedCacheResponse(CacheResponse):
+    """``cache_response`` that records cache hits and misses per-request."""
+    def __init__(self, *args, **kwargs):
+        super(InstrumentedCacheResponse, self).__init__(*args, **kwargs)
+        self.cache = instrumentation.InstrumentedCache(self.cache)
+
+
+cache_response = InstrumentedCacheResponse
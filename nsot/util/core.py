@@ -7,9 +7,7 @@ import collections
 import logging
 import shlex
 
-from cryptography.fernet import Fernet
 from django.core.exceptions import FieldDoesNotExist
-from logan.runner import run_app
 import six
 
 
@@ -22,7 +20,7 @@ _TRUTHY = set([
 
 __all__ = (
     'qpbool', 'normalize_auth_header', 'generate_secret_key', 'get_field_attr',
-    'SetQuery', 'parse_set_query', 'generate_settings', 'initialize_app',
+    'SetQuery', 'parse_set_query', 'generate_settings',
     'main', 'cidr_to_dict', 'slugify', 'slugify_interface'
 )
 
@@ -60,6 +58,7 @@ def generate_secret_key():
     >>> generate_secret_key()
     '1BpuqeM5d5pi-U2vIsqeQ8YnTrXRRUAfqV-hu6eQ5Gw='
     """
+    from cryptography.fernet import Fernet
     return Fernet.generate_key()
 
 
@@ -275,6 +274,14 @@ NSOT_PORT = 8990
 # Default: 4
 NSOT_NUM_WORKERS = 4
 
+# The type of gunicorn workers to use: 'sync', 'gthread' or 'gevent'.
+# Default: gevent
+NSOT_WORKER_CLASS = 'gevent'
+
+# The maximum number of database connections used at once by each worker.
+# Default: 10
+NSOT_DB_POOL_SIZE = 10
+
 # Timeout in seconds before gunicorn workers are killed/restarted.
 # Default: 30
 NSOT_WORKER_TIMEOUT = 30
@@ -324,34 +331,16 @@ def generate_settings(config_template=None):
     return config_template % dict(secret_key=secret_key)
 
 
-def initialize_app(config):
-    """
-    Actions to be performed prior to creating the Application object.
-
-    :param config:
-        Config object
-    """
-    # FIXME(jathan): Move this to a setting/parameter that can be toggled when
-    # gevent workers are not used.
-    USE_GEVENT = True  # Hard-coding gevent for now.
-
-    if USE_GEVENT:
-        # TODO(jathan): We need to keep an eye on this. If we run into any race
-        # conditions w/ database updates, this should be the first place we
-        # look.
-        from django.db import connections
-        connections['default'].allow_thread_sharing = True
-
-
 def main():
     """CLI application used to manage NSoT."""
+    from logan.runner import run_app
+
     run_app(
         project='nsot',
         default_config_path='~/.nsot/nsot.conf.py',
         default_settings='nsot.conf.settings',
         settings_initializer=generate_settings,
         settings_envvar='NSOT_CONF',
-        initializer=initialize_app,
     )
 
 
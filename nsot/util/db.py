@@ -0,0 +1,347 @@
+"""
+Database connection handling for the requests handled by a worker.
+
+Connection pool
+---------------
+
+Django keeps one connection per thread. Under the gevent worker each request
+runs in its own greenlet (which Django sees as a thread), so every request
+would open a new connection, with no limit on how many are open at once, and
+with ``CONN_MAX_AGE`` the connections of finished greenlets are never reused.
+
+Instead, ``ConnectionMiddleware`` lends each request a connection from the
+worker's pool for as long as the request (including a streamed response) is
+being handled. No more than ``NSOT_DB_POOL_SIZE`` connections per database are
+in use at once, and requests wait up to ``NSOT_DB_POOL_TIMEOUT`` seconds for
+one to become free. A connection is only ever used by one request at a time.
+
+Whether connections are kept open between requests is still controlled by
+Django's ``CONN_MAX_AGE`` database setting.
+
+The pool is set up by the HTTP service once a worker has started (see
+``nsot.services.http``), so the management commands, the test suite and the
+development server use Django's connection handling unchanged.
+
+Read replicas
+-------------
+
+``ReplicaRouter`` sends reads to one of the ``NSOT_READ_REPLICAS`` while
+``use_replica()`` is in effect on the current thread. API viewsets call it for
+safe requests (see ``BaseNsotViewSet.initial()``), and it's undone when the
+request finishes. Writes always go to the primary (``default``).
+
+After a successful write through an API viewset (see
+``BaseNsotViewSet.finalize_response()``), a user's requests are served from
+the primary for ``NSOT_READ_REPLICA_STICKY_SECONDS``, so that they always read
+their own writes. This is tracked in the cache for authenticated users, and
+with the ``nsot_primary`` cookie for clients that keep cookies. A client may
+also ask for the primary by sending the ``X-NSoT-Primary`` header.
+"""
+
+from __future__ import absolute_import
+import logging
+import random
+import threading
+import timeit
+
+from django.conf import settings
+from django.core import signals
+from django.core.cache import cache
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.utils import load_backend
+
+from . import instrumentation
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = (
+    'PoolTimeout', 'ConnectionPool', 'get_pool', 'configure_pool',
+    'reset_connections', 'ReplicaRouter', 'get_replicas', 'use_replica',
+    'use_primary', 'is_sticky', 'mark_written',
+)
+
+
+#: Cookie set after a write so that the client's next reads use the primary.
+STICKY_COOKIE = 'nsot_primary'
+
+#: Request header a client may send to read from the primary.
+PRIMARY_HEADER = 'HTTP_X_NSOT_PRIMARY'
+
+#: Cache key marking that a user has recently written.
+STICKY_CACHE_KEY = 'nsot:db:primary:%s'
+
+_routing = threading.local()
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection became free in time."""
+
+
+class ConnectionPool(object):
+    """
+    Lends database connections to one thread (or greenlet) at a time.
+
+    :param size:
+        Maximum number of connections to each database
+
+    :param timeout:
+        Seconds to wait for a free connection (None waits forever)
+    """
+    def __init__(self, size, timeout=None):
+        self.size = size
+        self.timeout = timeout
+
+        # These are created here, rather than at import, so that they are
+        # gevent-aware once the worker has monkey-patched ``threading``.
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._idle = {}
+        self._in_use = {}
+
+    def stats(self, alias=DEFAULT_DB_ALIAS):
+        """Return a dict of connections in use and idle for ``alias``."""
+        return {
+            'in_use': self._in_use.get(alias, 0),
+            'idle': len(self._idle.get(alias, [])),
+            'size': self.size,
+        }
+
+    def held(self):
+        """Return a dict of the connections held by this thread by alias."""
+        held = getattr(self._local, 'held', None)
+        if held is None:
+            held = self._local.held = {}
+        return held
+
+    def _reserve(self, alias):
+        """Wait for a free slot for ``alias``."""
+        timer = timeit.default_timer
+        deadline = None if self.timeout is None else timer() + self.timeout
+
+        with self._cond:
+            while self._in_use.get(alias, 0) >= self.size:
+                if deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - timer()
+                if remaining <= 0:
+                    raise PoolTimeout(
+                        'No database connection became free within %ss.' %
+                        self.timeout
+                    )
+                self._cond.wait(remaining)
+
+            self._in_use[alias] = self._in_use.get(alias, 0) + 1
+            idle = self._idle.get(alias)
+            return idle.pop() if idle else None
+
+    def _create(self, alias):
+        """Return a new (unconnected) connection for ``alias``."""
+        connections.ensure_defaults(alias)
+        connections.prepare_test_settings(alias)
+        db = connections.databases[alias]
+        backend = load_backend(db['ENGINE'])
+        conn = backend.DatabaseWrapper(db, alias)
+
+        # The pool only lends a connection to one thread at a time, so it's
+        # safe for whichever thread currently holds it to use it.
+        conn.allow_thread_sharing = True
+
+        # Connections are lent out after ``LoggingMiddleware`` has started
+        # collecting metrics, so the pool instruments its own.
+        if getattr(settings, 'NSOT_INSTRUMENTATION', True):
+            instrumentation.instrument_connection(conn)
+        return conn
+
+    def acquire(self, alias=DEFAULT_DB_ALIAS):
+        """
+        Lend a connection for ``alias`` to this thread and install it as
+        ``django.db.connections[alias]``. Does nothing if this thread already
+        holds one.
+        """
+        held = self.held()
+        if alias in held:
+            return held[alias]
+
+        conn = self._reserve(alias)
+        if conn is None:
+            try:
+                conn = self._create(alias)
+            except Exception:
+                self._return(alias, None)
+                raise
+
+        held[alias] = conn
+        connections[alias] = conn
+        return conn
+
+    def _return(self, alias, conn):
+        with self._cond:
+            if conn is not None:
+                self._idle.setdefault(alias, []).append(conn)
+            self._in_use[alias] -= 1
+            self._cond.notify()
+
+    def release(self, alias=DEFAULT_DB_ALIAS):
+        """Return the connection held by this thread for ``alias``."""
+        conn = self.held().pop(alias, None)
+        if conn is None:
+            return
+
+        try:
+            del connections[alias]
+        except AttributeError:
+            pass
+
+        # Don't hand on a connection that's broken or left in a transaction.
+        try:
+            if conn.connection is None:
+                pass
+            elif conn.in_atomic_block or not conn.get_autocommit():
+                conn.close()
+            else:
+                conn.close_if_unusable_or_obsolete()
+        except Exception:
+            log.exception('Discarding database connection %r', alias)
+            conn = None
+
+        self._return(alias, conn)
+
+    def release_all(self, **kwargs):
+        """Return every connection held by this thread."""
+        for alias in list(self.held()):
+            self.release(alias)
+
+
+_pool = None
+
+
+def get_pool():
+    """Return the worker's ``ConnectionPool``, or None if there isn't one."""
+    return _pool
+
+
+def configure_pool(size, timeout=None):
+    """
+    Create the connection pool for this worker process.
+
+    :param size:
+        Maximum number of connections to each database. If this is 0 (or
+        None), connections aren't pooled.
+
+    :param timeout:
+        Seconds a request will wait for a free connection
+    """
+    global _pool
+
+    if _pool is not None:
+        signals.request_finished.disconnect(
+            dispatch_uid='db_pool_release_all'
+        )
+        _pool = None
+
+    if not size:
+        return None
+
+    _pool = ConnectionPool(size, timeout)
+
+    # Connections are returned once the response has been sent, so that a
+    # streamed response may keep using its connection.
+    signals.request_finished.connect(
+        _pool.release_all, dispatch_uid='db_pool_release_all'
+    )
+    return _pool
+
+
+def reset_connections():
+    """
+    Forget database connections inherited from the parent process.
+
+    Django keeps connections in a thread-local that was created before a
+    gevent worker monkey-patches ``threading`` (e.g. when the app is
+    preloaded), so without this every greenlet would share one connection.
+    """
+    global _routing
+
+    connections._connections = threading.local()
+    _routing = threading.local()
+
+
+def get_replicas():
+    """Return the aliases of the configured read replicas."""
+    return [
+        alias for alias in getattr(settings, 'NSOT_READ_REPLICAS', ())
+        if alias in settings.DATABASES
+    ]
+
+
+def use_replica():
+    """
+    Read from a random replica on this thread until ``use_primary()`` is
+    called. Returns the replica's alias, or None if there are no replicas.
+    """
+    replicas = get_replicas()
+    if not replicas:
+        return None
+
+    alias = random.choice(replicas)
+    if _pool is not None:
+        _pool.acquire(alias)
+    _routing.read_alias = alias
+    return alias
+
+
+def use_primary(**kwargs):
+    """Read from the primary on this thread."""
+    _routing.read_alias = None
+
+
+def is_sticky(request):
+    """Return whether ``request`` must read from the primary."""
+    if PRIMARY_HEADER in request.META or STICKY_COOKIE in request.COOKIES:
+        return True
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return bool(cache.get(STICKY_CACHE_KEY % user.pk))
+
+    return False
+
+
+def mark_written(request, response):
+    """Have the requests following a write by this client use the primary."""
+    seconds = getattr(settings, 'NSOT_READ_REPLICA_STICKY_SECONDS', 10)
+    if not seconds:
+        return
+
+    response.set_cookie(STICKY_COOKIE, '1', max_age=seconds)
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        cache.set(STICKY_CACHE_KEY % user.pk, True, seconds)
+
+
+class ReplicaRouter(object):
+    """Routes reads to the replica chosen by ``use_replica()``."""
+    def db_for_read(self, model, **hints):
+        return getattr(_routing, 'read_alias', None)
+
+    def db_for_write(self, model, **hints):
+        # Objects read from a replica are saved to the primary.
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in get_replicas():
+            return False
+        return None
+
+
+signals.request_finished.connect(
+    use_primary, dispatch_uid='db_use_primary_request_finished'
+)
@@ -0,0 +1,258 @@
+"""
+Lightweight per-request instrumentation.
+
+While a request is being handled, the time spent in SQL queries, serializers,
+signal handlers and authentication is accumulated, along with query counts and
+cache hits and misses. The ``LoggingMiddleware`` starts and finishes the
+collection and reports the results.
+
+Only NSoT's own signal handlers are timed, by decorating them with
+``timed('signal')``. Cache hits and misses are those of cached API responses;
+reads of the version counters in ``nsot.util.versions`` aren't counted.
+
+Queries are timed on the connections of the current thread when a request
+starts, and on every connection created by the worker's connection pool
+(see ``nsot.util.db``), which may be lent to the request later on.
+
+Everything here is a no-op outside of a request, or if the
+``NSOT_INSTRUMENTATION`` setting is disabled, so that the overhead of the
+hooks is a thread-local lookup.
+"""
+
+from __future__ import absolute_import
+from contextlib import contextmanager
+import functools
+import logging
+import random
+import threading
+import timeit
+
+from django.conf import settings
+from django.db import connections
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = (
+    'RequestMetrics', 'InstrumentedCache', 'current', 'start', 'finish',
+    'timer', 'timed', 'record_cache', 'instrument_connection', 'reset',
+)
+
+
+_local = threading.local()
+_timer = timeit.default_timer
+
+#: Maximum length of SQL statements kept in traces.
+MAX_SQL_LENGTH = 1000
+
+
+class RequestMetrics(object):
+    """Metrics collected for a single request."""
+    __slots__ = (
+        'started', 'sql_count', 'sql_time', 'cache_hits', 'cache_misses',
+        'timings', 'active', 'trace',
+    )
+
+    def __init__(self, trace=False):
+        self.started = _timer()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.timings = {}
+
+        #: Names of timers currently running, so nested calls count once.
+        self.active = set()
+
+        #: List of (sql, seconds) if this request is sampled for tracing.
+        self.trace = [] if trace else None
+
+    def add_time(self, name, elapsed):
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed
+
+    def record_query(self, sql, elapsed):
+        self.sql_count += 1
+        self.sql_time += elapsed
+        if self.trace is not None:
+            self.trace.append((sql[:MAX_SQL_LENGTH], elapsed))
+
+    def to_dict(self):
+        """Return the metrics as a flat dict with times in milliseconds."""
+        data = {
+            'duration_ms': (_timer() - self.started) * 1000,
+            'sql_count': self.sql_count,
+            'sql_ms': self.sql_time * 1000,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+        for name in ('serializer', 'signal', 'auth'):
+            data[name + '_ms'] = self.timings.get(name, 0.0) * 1000
+        return data
+
+    def server_timing(self, data=None):
+        """Return the value for a ``Server-Timing`` header."""
+        if data is None:
+            data = self.to_dict()
+
+        return ', '.join([
+            'total;dur=%.2f' % data['duration_ms'],
+            'sql;dur=%.2f;desc="%d queries"' % (
+                data['sql_ms'], data['sql_count']
+            ),
+            'cache;desc="%d hits, %d misses"' % (
+                data['cache_hits'], data['cache_misses']
+            ),
+            'serializer;dur=%.2f' % data['serializer_ms'],
+            'signal;dur=%.2f' % data['signal_ms'],
+            'auth;dur=%.2f' % data['auth_ms'],
+        ])
+
+
+def current():
+    """Return the ``RequestMetrics`` for the current request, if any."""
+    return getattr(_local, 'metrics', None)
+
+
+def start():
+    """
+    Start collecting metrics for a request on this thread. Returns the new
+    ``RequestMetrics``, or None if instrumentation is disabled.
+    """
+    # Drop anything left over from an earlier request on this thread first.
+    _local.metrics = None
+    if not getattr(settings, 'NSOT_INSTRUMENTATION', True):
+        return None
+
+    for conn in connections.all():
+        instrument_connection(conn)
+
+    rate = getattr(settings, 'NSOT_SQL_TRACE_SAMPLE_RATE', 0)
+    metrics = RequestMetrics(trace=bool(rate) and random.random() < rate)
+    _local.metrics = metrics
+
+    return metrics
+
+
+def reset():
+    """
+    Recreate the thread-local state, e.g. once a gevent worker has patched
+    ``threading`` so that each greenlet gets its own.
+    """
+    global _local
+    _local = threading.local()
+
+
+def finish():
+    """Stop collecting metrics on this thread and return them."""
+    metrics = current()
+    _local.metrics = None
+    return metrics
+
+
+@contextmanager
+def timer(name):
+    """
+    Context manager that adds the time spent within it to ``name``.
+
+    :param name:
+        Category of the timing (e.g. 'serializer')
+    """
+    metrics = current()
+    if metrics is None or name in metrics.active:
+        yield
+        return
+
+    metrics.active.add(name)
+    started = _timer()
+    try:
+        yield
+    finally:
+        metrics.active.discard(name)
+        metrics.add_time(name, _timer() - started)
+
+
+def timed(name):
+    """Decorator that times calls to a function using ``timer(name)``."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if current() is None:
+                return func(*args, **kwargs)
+            with timer(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_cache(hit):
+    """Record a cache hit (or miss) for the current request."""
+    metrics = current()
+    if metrics is not None:
+        if hit:
+            metrics.cache_hits += 1
+        else:
+            metrics.cache_misses += 1
+
+
+class InstrumentedCache(object):
+    """Proxy for a Django cache that records hits and misses of ``get()``."""
+    def __init__(self, cache):
+        self._cache = cache
+
+    def __getattr__(self, name):
+        return getattr(self._cache, name)
+
+    def get(self, key, default=None, version=None):
+        value = self._cache.get(key, default=default, version=version)
+        record_cache(value is not default)
+        return value
+
+
+class InstrumentedCursor(object):
+    """Cursor wrapper that records the time taken by each query."""
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _timed(self, method, sql, params):
+        metrics = current()
+        if metrics is None:
+            return method(sql, params)
+
+        started = _timer()
+        try:
+            return method(sql, params)
+        finally:
+            metrics.record_query(sql, _timer() - started)
+
+    def execute(self, sql, params=None):
+        return self._timed(self.cursor.execute, sql, params)
+
+    def executemany(self, sql, param_list):
+        return self._timed(self.cursor.executemany, sql, param_list)
+
+
+def instrument_connection(conn):
+    """Wrap the cursors of database connection ``conn``."""
+    if getattr(conn, '_nsot_instrumented', False):
+        return
+
+    make_cursor = conn.make_cursor
+    make_debug_cursor = conn.make_debug_cursor
+    conn.make_cursor = lambda cursor: InstrumentedCursor(make_cursor(cursor))
+    conn.make_debug_cursor = (
+        lambda cursor: InstrumentedCursor(make_debug_cursor(cursor))
+    )
+    conn._nsot_instrumented = True
@@ -0,0 +1,215 @@
+"""
+Prometheus metrics for the API server.
+
+Metrics are recorded by ``nsot.middleware.metrics.MetricsMiddleware`` and
+exposed in the Prometheus text format at ``/metrics``.
+
+When running under gunicorn, the HTTP service sets the
+``prometheus_multiproc_dir`` environment variable, so that every worker writes
+its metrics to memory-mapped files in that directory and a scrape of any
+worker reports the totals across all of them (see ``nsot.services.http``).
+``prometheus_client`` reads that variable when it's first imported, so it's
+only imported once metrics are first recorded or exposed, rather than with
+this module. The URLconf imports this module, which Django's system checks
+load before the service has started.
+"""
+
+from __future__ import absolute_import
+from contextlib import contextmanager
+import logging
+import os
+import threading
+import timeit
+
+from django.conf import settings
+from django.db.models import signals
+from django.http import HttpResponse, Http404
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = (
+    'enabled', 'get_metrics', 'get_view_labels', 'observe_request',
+    'time_next_network', 'metrics_view', 'install',
+)
+
+
+#: Environment variable used by prometheus_client for multiprocess mode.
+MULTIPROC_ENV = 'prometheus_multiproc_dir'
+
+#: Label used for requests that didn't resolve to a view.
+UNMATCHED = '<unmatched>'
+
+
+class Metrics(object):
+    """The metrics recorded by the server."""
+    def __init__(self):
+        from prometheus_client import Counter, Histogram
+
+        self.requests = Counter(
+            'nsot_requests_total', 'Total HTTP requests.',
+            ['view', 'action', 'method', 'status']
+        )
+        self.request_seconds = Histogram(
+            'nsot_request_duration_seconds',
+            'HTTP request latency in seconds.',
+            ['view', 'action'],
+            buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+        )
+        self.request_queries = Histogram(
+            'nsot_request_db_queries',
+            'Database queries made per HTTP request.',
+            ['view', 'action'],
+            buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+        )
+        self.cache_requests = Counter(
+            'nsot_cache_requests_total',
+            'Cache lookups made by HTTP requests.',
+            ['result']
+        )
+        self.next_network_seconds = Histogram(
+            'nsot_next_network_duration_seconds',
+            'Latency of finding (and allocating) the next available networks.',
+            ['method'],
+            buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+        )
+        self.changes = Counter(
+            'nsot_changes_total', 'Change events written.',
+            ['event', 'resource_name']
+        )
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_metrics():
+    """Return the ``Metrics``, creating them on first use."""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = Metrics()
+    return _metrics
+
+
+def enabled():
+    """Return whether metrics are turned on."""
+    return getattr(settings, 'NSOT_METRICS', False)
+
+
+def get_view_labels(request):
+    """
+    Return (view, action) labels for ``request``.
+
+    For viewsets these are the viewset class and the action (e.g.
+    ``('NetworkViewSet', 'next_network')``). Other views use the view name
+    and the request method.
+    """
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNMATCHED, UNMATCHED
+
+    func = match.func
+    cls = getattr(func, 'cls', None)
+    if cls is None:
+        return getattr(func, '__name__', UNMATCHED), request.method.lower()
+
+    actions = getattr(func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return cls.__name__, action
+
+
+def observe_request(request, response, duration, request_metrics=None):
+    """
+    Record metrics for a finished request.
+
+    :param duration:
+        Request duration in seconds
+
+    :param request_metrics:
+        ``nsot.util.instrumentation.RequestMetrics`` for the request, if any
+    """
+    metrics = get_metrics()
+    view, action = get_view_labels(request)
+    metrics.requests.labels(
+        view, action, request.method, str(response.status_code)
+    ).inc()
+    metrics.request_seconds.labels(view, action).observe(duration)
+
+    if request_metrics is not None:
+        metrics.request_queries.labels(view, action).observe(
+            request_metrics.sql_count
+        )
+        if request_metrics.cache_hits:
+            metrics.cache_requests.labels('hit').inc(
+                request_metrics.cache_hits
+            )
+        if request_metrics.cache_misses:
+            metrics.cache_requests.labels('miss').inc(
+                request_metrics.cache_misses
+            )
+
+
+@contextmanager
+def time_next_network(method):
+    """Context manager that records the latency of ``next_network``."""
+    if not enabled():
+        yield
+        return
+
+    started = timeit.default_timer()
+    try:
+        yield
+    finally:
+        get_metrics().next_network_seconds.labels(method).observe(
+            timeit.default_timer() - started
+        )
+
+
+def metrics_view(request):
+    """Expose metrics in the Prometheus text format."""
+    if not enabled():
+        raise Http404('Metrics are disabled.')
+
+    from prometheus_client import (
+        CollectorRegistry, REGISTRY, generate_latest, CONTENT_TYPE_LATEST,
+        multiprocess
+    )
+
+    if MULTIPROC_ENV in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
+
+
+def record_change(sender, instance, created=False, **kwargs):
+    """Count Change events as they are written."""
+    if created and enabled():
+        get_metrics().changes.labels(
+            instance.event, instance.resource_name
+        ).inc()
+
+
+_installed = False
+
+
+def install():
+    """Connect signal handlers. Safe to call more than once."""
+    global _installed
+    if _installed:
+        return
+
+    from ..models import Change
+
+    signals.post_save.connect(
+        record_change, sender=Change,
+        dispatch_uid='metrics_record_change_post_save_change'
+    )
+    _installed = True
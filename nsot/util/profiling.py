@@ -0,0 +1,179 @@
+"""
+Utilities for capturing and summarizing request profiles.
+
+API views decide whether to profile a request once it has been authenticated
+(see ``start_profile()``), and the ``ProfilingMiddleware`` finishes the
+profile and writes it to ``NSOT_PROFILE_DIR`` in the ``pstats`` format.
+Profiles may be listed and summarized with ``nsot-server profiles``.
+"""
+
+from __future__ import absolute_import, division
+import cProfile
+import datetime
+import os
+import pstats
+import random
+import re
+from time import time
+
+from django.conf import settings
+import six
+
+from .core import qpbool
+
+
+__all__ = (
+    'PROFILE_EXT', 'should_profile', 'start_profile', 'slugify_path',
+    'save_profile', 'list_profiles', 'summarize'
+)
+
+
+#: File extension of captured profiles.
+PROFILE_EXT = '.prof'
+
+#: Request header used to ask for a profile.
+PROFILE_HEADER = 'HTTP_X_NSOT_PROFILE'
+
+#: Query parameter used to ask for a profile.
+PROFILE_PARAM = 'profile'
+
+#: Pattern of profile file names (see ``save_profile()``).
+PROFILE_NAME = re.compile(
+    r'^(?P<timestamp>\d{8}T\d{6})-(?P<duration>\d+)ms-(?P<method>[A-Z]+)-'
+    r'(?P<path>.*)-(?P<token>[0-9a-f]{6})' + re.escape(PROFILE_EXT) + '$'
+)
+
+
+def should_profile(request, user):
+    """
+    Return whether to profile ``request``.
+
+    A request is profiled if it is made by a superuser with the
+    ``X-NSoT-Profile`` header or ``profile`` query parameter set, or if it is
+    picked at random according to ``NSOT_PROFILE_SAMPLE_RATE``.
+
+    :param request:
+        Django ``HttpRequest``
+
+    :param user:
+        The authenticated user
+    """
+    if not getattr(settings, 'NSOT_PROFILE_DIR', None):
+        return False
+
+    requested = (
+        qpbool(request.META.get(PROFILE_HEADER)) or
+        qpbool(request.GET.get(PROFILE_PARAM))
+    )
+    if requested:
+        return bool(user is not None and user.is_superuser)
+
+    rate = getattr(settings, 'NSOT_PROFILE_SAMPLE_RATE', 0)
+    return bool(rate) and random.random() < rate
+
+
+def start_profile(request, user):
+    """
+    Profile the rest of ``request`` if ``should_profile()`` says so. Returns
+    the profiler, or None.
+
+    The profile is finished and saved by ``ProfilingMiddleware`` once the
+    response has been rendered.
+
+    :param request:
+        Django ``HttpRequest``
+
+    :param user:
+        The authenticated user
+    """
+    if getattr(request, 'profiler', None) is not None:
+        return None
+    if not should_profile(request, user):
+        return None
+
+    profiler = cProfile.Profile()
+    request.profiler = profiler
+    request.profile_started = time()
+    profiler.enable()
+
+    return profiler
+
+
+def slugify_path(path):
+    """Return a file name-safe version of a request path."""
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', path).strip('_')
+    return slug[:100] or 'root'
+
+
+def save_profile(profiler, directory, method, path, duration):
+    """
+    Write the stats of ``profiler`` to ``directory`` and return the file name.
+
+    :param profiler:
+        A ``cProfile.Profile`` that has finished running
+
+    :param method:
+        HTTP request method
+
+    :param path:
+        HTTP request path
+
+    :param duration:
+        Duration of the request in seconds
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    name = '%s-%dms-%s-%s-%06x%s' % (
+        datetime.datetime.utcnow().strftime('%Y%m%dT%H%M%S'),
+        duration * 1000, method.upper(), slugify_path(path),
+        random.getrandbits(24), PROFILE_EXT,
+    )
+    profiler.dump_stats(os.path.join(directory, name))
+
+    return name
+
+
+def list_profiles(directory):
+    """
+    Return a list of dicts describing the profiles in ``directory``, oldest
+    first.
+    """
+    if not os.path.isdir(directory):
+        return []
+
+    profiles = []
+    for name in sorted(os.listdir(directory)):
+        match = PROFILE_NAME.match(name)
+        if match is None:
+            continue
+        info = match.groupdict()
+        info['name'] = name
+        info['duration'] = int(info['duration'])
+        info['size'] = os.path.getsize(os.path.join(directory, name))
+        profiles.append(info)
+
+    return profiles
+
+
+def summarize(paths, sort='tottime', limit=20):
+    """
+    Return a text report of the hottest functions across the profiles at
+    ``paths``.
+
+    :param paths:
+        List of profile file paths
+
+    :param sort:
+        ``pstats`` sort key (e.g. 'tottime' or 'cumulative')
+
+    :param limit:
+        Number of functions to include
+    """
+    # On Python 2, pstats writes a mix of byte and unicode strings, which
+    # only StringIO.StringIO accepts.
+    stream = six.StringIO()
+    stats = pstats.Stats(*paths, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+
+    return stream.getvalue()
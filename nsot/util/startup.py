@@ -0,0 +1,207 @@
+"""
+Helpers for starting the server quickly.
+
+In fast-start mode (``nsot-server start --fast-start``), the application is
+loaded once by the gunicorn master process and then shared by the workers it
+forks, rather than being loaded again by every worker. Migrations are only run
+if there are migrations on disk that haven't been applied, and the time taken
+to import each module while loading the application is reported. Database
+connections opened by the master are closed before the workers are forked, so
+that no two processes share one.
+
+Django is only imported when it's needed, so that ``ImportTimer`` may be used
+to time importing it.
+"""
+
+from __future__ import absolute_import
+import gc
+import logging
+from importlib import import_module
+import pkgutil
+import sys
+import timeit
+
+import six
+from six.moves import builtins
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = (
+    'ImportTimer', 'get_migration_names', 'get_pending_migrations',
+    'preload_app', 'freeze',
+)
+
+
+#: Default ``level`` argument of ``__import__``.
+DEFAULT_LEVEL = -1 if six.PY2 else 0
+
+
+class ImportTimer(object):
+    """
+    Context manager that records how long each module takes to import.
+
+    For each module first imported while it's active, both the cumulative
+    time (including the modules it imported) and the time spent in the module
+    itself are recorded.
+    """
+    def __init__(self):
+        self.timings = {}
+        self.elapsed = 0.0
+        self._stack = []
+        self._import = None
+
+    def __enter__(self):
+        self._started = timeit.default_timer()
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        builtins.__import__ = self._import
+        self.elapsed = timeit.default_timer() - self._started
+
+    def _resolve(self, name, globals, level):
+        """Return the absolute name of the module being imported."""
+        if level <= 0 or not globals:
+            return name
+
+        package = globals.get('__package__')
+        if not package:
+            package = globals.get('__name__', '')
+            if '__path__' not in globals:
+                package = package.rpartition('.')[0]
+
+        for _ in range(level - 1):
+            package = package.rpartition('.')[0]
+
+        return '%s.%s' % (package, name) if name else package
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(),
+                      level=DEFAULT_LEVEL):
+        module_name = self._resolve(name, globals, level)
+        if module_name in sys.modules or module_name in self.timings:
+            return self._import(name, globals, locals, fromlist, level)
+
+        timer = timeit.default_timer
+        self._stack.append(0.0)
+        started = timer()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = timer() - started
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            if module_name in sys.modules:
+                self.timings[module_name] = (elapsed, elapsed - children)
+
+    def report(self, limit=20):
+        """
+        Return a report of the slowest imports as a string.
+
+        :param limit:
+            Number of modules to include
+        """
+        lines = [
+            'Loaded application in %.2fs (%d modules imported)' % (
+                self.elapsed, len(self.timings)
+            ),
+            '%11s %11s  %s' % ('cumulative', 'self', 'module'),
+        ]
+        slowest = sorted(
+            self.timings.items(), key=lambda item: item[1][0], reverse=True
+        )
+        for name, (cumulative, own) in slowest[:limit]:
+            lines.append(
+                '%9.1fms %9.1fms  %s' % (cumulative * 1000, own * 1000, name)
+            )
+        return '\n'.join(lines)
+
+
+def get_migration_names():
+    """
+    Return a set of (app_label, name) of the migrations on disk.
+
+    Unlike Django's migration loader, this doesn't import the migrations.
+    """
+    from django.apps import apps
+    from django.conf import settings
+
+    names = set()
+    for app_config in apps.get_app_configs():
+        label = app_config.label
+        module_name = settings.MIGRATION_MODULES.get(
+            label, '%s.migrations' % app_config.name
+        )
+        if module_name is None:
+            continue
+
+        try:
+            module = import_module(module_name)
+        except ImportError:
+            continue
+
+        path = getattr(module, '__path__', None)
+        if not path:
+            continue
+
+        for _, name, is_pkg in pkgutil.iter_modules(list(path)):
+            if not is_pkg and name[0] not in '_~':
+                names.add((label, name))
+
+    return names
+
+
+def get_pending_migrations(database='default'):
+    """
+    Return a set of (app_label, name) of the migrations on disk that haven't
+    been applied to ``database``.
+    """
+    from django.db import connections
+    from django.db.migrations.recorder import MigrationRecorder
+
+    connection = connections[database]
+    recorder = MigrationRecorder(connection)
+
+    # A new database doesn't have the migrations table yet.
+    table = recorder.Migration._meta.db_table
+    if table in connection.introspection.table_names():
+        applied = recorder.applied_migrations()
+    else:
+        applied = ()
+    return get_migration_names() - set(applied)
+
+
+def preload_app():
+    """
+    Do the work that a worker would otherwise do on its first requests: build
+    the URL resolvers and the fields of every API serializer.
+    """
+    from django.core.urlresolvers import get_resolver
+    from nsot.api.urls import router
+
+    resolver = get_resolver()
+    resolver.reverse_dict
+
+    for _, viewset, _ in router.registry:
+        serializer_class = getattr(viewset, 'serializer_class', None)
+        if serializer_class is None:
+            continue
+        try:
+            serializer_class().fields
+        except Exception:
+            log.debug('Unable to preload %r', serializer_class, exc_info=True)
+
+
+def freeze():
+    """
+    Move every object allocated so far out of reach of the garbage collector,
+    so that collections in the workers don't write to (and therefore copy)
+    the memory pages they share with the master process. Only Python 3.7 and
+    later support this.
+    """
+    gc.collect()
+    if hasattr(gc, 'freeze'):
+        gc.freeze()
@@ -5,10 +5,11 @@ from __future__ import absolute_import
 Gettings stats out of NSoT.
 """
 
-from netaddr import IPNetwork, IPSet
 
-
-__all__ = ('calculate_network_utilization', 'get_network_utilization')
+__all__ = (
+    'calculate_network_utilization', 'get_network_utilization',
+    'summarize_network_utilization',
+)
 
 
 def calculate_network_utilization(parent, hosts, as_string=False):
@@ -24,16 +25,38 @@ def calculate_network_utilization(parent, hosts, as_string=False):
     :param as_string:
         Whether to return stats as a string
     """
+    from netaddr import IPNetwork, IPSet
+
     parent = IPNetwork(str(parent))
     hosts = IPSet(str(ip) for ip in hosts if IPNetwork(str(ip)) in parent)
 
-    used = float(hosts.size) / float(parent.size)
+    return summarize_network_utilization(parent, hosts.size, as_string)
+
+
+def summarize_network_utilization(parent, num_used, as_string=False):
+    """
+    Calculate utilization for a network with a known number of used hosts.
+
+    :param parent:
+        The parent network
+
+    :param num_used:
+        Number of distinct host IPs descendant from parent
+
+    :param as_string:
+        Whether to return stats as a string
+    """
+    from netaddr import IPNetwork
+
+    parent = IPNetwork(str(parent))
+
+    used = float(num_used) / float(parent.size)
     free = 1 - used
-    num_free = parent.size - hosts.size
+    num_free = parent.size - num_used
 
     stats = {
         'percent_used': used,
-        'num_used': hosts.size,
+        'num_used': num_used,
         'percent_free': free,
         'num_free': num_free,
         'max': parent.size,
@@ -42,7 +65,7 @@ def calculate_network_utilization(parent, hosts, as_string=False):
     # 10.47.216.0/22 - 14% used (139), 86% free (885)
     if as_string:
         return '{} - {:.0%} used ({}), {:.0%} free ({})'.format(
-            parent, used, hosts.size, free, num_free
+            parent, used, num_used, free, num_free
         )
 
     return stats
@@ -0,0 +1,660 @@
+"""
+Exporting and importing the contents of the database as NDJSON.
+
+Used by ``nsot-server export`` and ``nsot-server import``. An export is a
+header line followed by one JSON object per line for every object, in an order
+that satisfies their foreign keys::
+
+    {"format": "nsot", "version": 1, "exported_at": "..."}
+    {"model": "Site", "pk": 1, "site": 1, "fields": {"name": "...", ...}}
+    {"model": "Device", "pk": 1, "site": 1, "fields": {"hostname": ...}}
+
+Objects are read and written ``chunk_size`` at a time, so memory use doesn't
+depend on the size of the export.
+
+Each chunk of an import only holds objects of one model and one site. Chunks
+are validated without querying the database (other than for the Attributes of
+Values), optionally by a pool of worker processes, and then inserted in order
+with ``bulk_create()`` by the importing process. Each is committed in a
+transaction of its own, after which the line reached is saved to the
+checkpoint file. Objects whose primary key already exists are
+skipped, so an interrupted import may be run again to resume it.
+
+Imported objects are not recorded as Changes, and keep the primary keys they
+were exported with. The ``created`` time of Assignments and the ``updated_at``
+time of Resources is the time they were imported.
+"""
+
+from __future__ import absolute_import
+from collections import deque, namedtuple
+import datetime
+import io
+import json
+import logging
+import multiprocessing
+import os
+
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+import six
+
+from .. import exc, models
+from ..models.attribute import AttributeValidator, invalidate_attribute_schema
+from ..models.attribute_index import attribute_index, value_dictionary
+from ..models.ipam_snapshot import ipam_snapshot
+from ..models.prefix_index import prefix_index
+from ..models.topology import topology
+from . import core
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = (
+    'FORMAT', 'FORMAT_VERSION', 'MODELS', 'TransferError', 'Chunk',
+    'export', 'iter_chunks', 'prepare_chunk', 'prepare_chunks', 'Importer',
+)
+
+
+#: Identifies the header line of an export.
+FORMAT = 'nsot'
+
+#: Version of the export format.
+FORMAT_VERSION = 1
+
+#: Models in the order they're exported and imported, with the ordering of
+#: their objects. Networks are ordered by prefix length so that parents come
+#: before their children.
+MODELS = (
+    ('Site', ('pk',)),
+    ('Attribute', ('site_id', 'pk')),
+    ('ProtocolType', ('site_id', 'pk')),
+    ('Device', ('site_id', 'pk')),
+    ('Network', ('site_id', 'prefix_length', 'pk')),
+    ('Interface', ('site_id', 'pk')),
+    ('Assignment', ('site_id', 'pk')),
+    ('Circuit', ('site_id', 'pk')),
+    ('Protocol', ('pk',)),
+    ('Value', ('site_id', 'pk')),
+)
+
+#: Default number of objects read or written at once.
+CHUNK_SIZE = 1000
+
+#: A run of records of one model and site, read from lines ``start``-``end``.
+Chunk = namedtuple('Chunk', 'model site_id start end records')
+
+
+class TransferError(Exception):
+    """Raised when an export can't be imported."""
+
+
+def _get_model(name):
+    return getattr(models, name)
+
+
+def _get_m2m_fields(model):
+    """Return the many-to-many fields without a custom through model."""
+    return [
+        field for field in model._meta.many_to_many
+        if field.remote_field.through._meta.auto_created
+    ]
+
+
+def _dump_value(value):
+    """Return ``value`` as something that may be encoded as JSON."""
+    if value is None or isinstance(value, (bool, float, dict, list)):
+        return value
+    if isinstance(value, six.integer_types + six.string_types):
+        return value
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return six.text_type(value)
+
+
+def _get_queryset(name, site_ids=None):
+    model = _get_model(name)
+    queryset = model.objects.all()
+
+    if name == 'Site':
+        if site_ids:
+            queryset = queryset.filter(pk__in=site_ids)
+        return queryset
+
+    if name == 'Assignment':
+        queryset = queryset.annotate(site_id=F('interface__site_id'))
+
+    m2m_fields = _get_m2m_fields(model)
+    if m2m_fields:
+        queryset = queryset.prefetch_related(*[f.name for f in m2m_fields])
+
+    if site_ids:
+        queryset = queryset.filter(site_id__in=site_ids)
+    return queryset
+
+
+def _after(order, values):
+    """Return a filter for the objects that come after ``values``."""
+    query = Q()
+    for i, name in enumerate(order):
+        terms = dict(zip(order[:i], values[:i]))
+        terms[name + '__gt'] = values[i]
+        query |= Q(**terms)
+    return query
+
+
+def _iter_queryset(queryset, order, chunk_size):
+    """
+    Yield the objects of ``queryset`` sorted by ``order``, fetching them
+    ``chunk_size`` at a time. Each chunk is fetched by the ordering values of
+    the last object, so that later chunks aren't slower to fetch.
+    """
+    queryset = queryset.order_by(*order)
+    last = None
+    while True:
+        chunk = queryset if last is None else queryset.filter(
+            _after(order, last)
+        )
+        objects = list(chunk[:chunk_size])
+        for obj in objects:
+            yield obj
+
+        if len(objects) < chunk_size:
+            return
+        last = [getattr(objects[-1], name) for name in order]
+
+
+def _dump_object(name, obj, m2m_fields):
+    fields = {}
+    for field in obj._meta.concrete_fields:
+        if field.primary_key:
+            continue
+        fields[field.attname] = _dump_value(field.value_from_object(obj))
+
+    for field in m2m_fields:
+        fields[field.name] = [o.pk for o in getattr(obj, field.name).all()]
+
+    return {
+        'model': name,
+        'pk': obj.pk,
+        'site': obj.pk if name == 'Site' else obj.site_id,
+        'fields': fields,
+    }
+
+
+def export(fh, site_ids=None, chunk_size=CHUNK_SIZE):
+    """
+    Write every object (of ``site_ids``, if given) to ``fh``.
+
+    :param fh:
+        File object opened for writing text
+
+    :param site_ids:
+        IDs of the Sites to export
+
+    :param chunk_size:
+        Number of objects to fetch at once
+
+    Returns a dict of the number of objects exported by model name.
+    """
+    header = {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'exported_at': timezone.now().isoformat(),
+    }
+    fh.write(six.text_type(json.dumps(header)) + '\n')
+
+    counts = {}
+    for name, order in MODELS:
+        m2m_fields = _get_m2m_fields(_get_model(name))
+        queryset = _get_queryset(name, site_ids)
+
+        count = 0
+        for obj in _iter_queryset(queryset, order, chunk_size):
+            record = _dump_object(name, obj, m2m_fields)
+            line = json.dumps(record, cls=DjangoJSONEncoder)
+            fh.write(six.text_type(line) + '\n')
+            count += 1
+
+        counts[name] = count
+        log.info('Exported %d %s objects.', count, name)
+
+    return counts
+
+
+def read_header(fh):
+    """Read and check the header line of an export."""
+    line = fh.readline()
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+
+    if not isinstance(header, dict) or header.get('format') != FORMAT:
+        raise TransferError('Not an NSoT export.')
+    if header.get('version') != FORMAT_VERSION:
+        raise TransferError(
+            'Unsupported export version: %r.' % header.get('version')
+        )
+
+    return header
+
+
+def iter_chunks(fh, chunk_size=CHUNK_SIZE, start=1):
+    """
+    Yield the records of an export (after its header) as ``Chunk`` objects.
+
+    :param fh:
+        File object positioned after the header line
+
+    :param chunk_size:
+        Maximum number of records in each chunk
+
+    :param start:
+        Number of the first line to read; earlier lines are skipped
+    """
+    chunk = None
+    for lineno, line in enumerate(fh, 2):
+        if lineno < start or not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+            key = (record['model'], record['site'])
+        except (ValueError, TypeError, KeyError):
+            raise TransferError('Line %d: invalid record.' % lineno)
+
+        if chunk is not None and (
+            (chunk.model, chunk.site_id) != key or
+            len(chunk.records) >= chunk_size
+        ):
+            yield chunk
+            chunk = None
+
+        if chunk is None:
+            chunk = Chunk(key[0], key[1], lineno, lineno, [])
+        chunk.records.append(record)
+        chunk = chunk._replace(end=lineno)
+
+    if chunk is not None:
+        yield chunk
+
+
+#: Attributes by ID, looked up when validating Values.
+_attributes = {}
+
+
+def _get_attributes(ids):
+    missing = set(ids).difference(_attributes)
+    if missing:
+        for attribute in models.Attribute.objects.filter(pk__in=missing):
+            _attributes[attribute.pk] = attribute
+    return _attributes
+
+
+def _validate_device(obj):
+    obj.hostname = obj.clean_hostname(obj.hostname)
+
+
+def _validate_network(obj):
+    obj._cidr = '%s/%s' % (obj.network_address, obj.prefix_length)
+    obj.clean_fields()
+
+
+def _validate_interface(obj):
+    obj.name = obj.clean_name(obj.name)
+    obj.type = obj.clean_type(obj.type)
+    obj.speed = obj.clean_speed(obj.speed)
+    obj.mac_address = obj.clean_mac_address(obj.mac_address)
+    obj.name_slug = core.slugify_interface(
+        device_hostname=obj.device_hostname, name=obj.name
+    )
+
+
+def _validate_circuit(obj):
+    obj.name_slug = core.slugify(obj.name)
+
+
+def _validate_value(obj):
+    attribute = _get_attributes([obj.attribute_id]).get(obj.attribute_id)
+    if attribute is None:
+        raise exc.ValidationError(
+            'Attribute %r does not exist.' % obj.attribute_id
+        )
+    obj.resource_name = obj.clean_resource_name(obj.resource_name)
+    obj.name = attribute.name
+    AttributeValidator.for_constraints(
+        attribute.name, attribute.constraints
+    ).validate_values([obj.value])
+
+
+#: Functions to validate (and normalize) an object of each model. These only
+#: check the object itself, as the objects it refers to may not have been
+#: imported yet.
+VALIDATORS = {
+    'Site': lambda obj: obj.clean_fields(),
+    'Attribute': lambda obj: obj.clean_fields(),
+    'Device': _validate_device,
+    'Network': _validate_network,
+    'Interface': _validate_interface,
+    'Circuit': _validate_circuit,
+    'Value': _validate_value,
+}
+
+
+def prepare_chunk(chunk):
+    """
+    Return the objects of ``chunk``, validated, and the IDs of their
+    many-to-many relations as a list of (obj, {field name: [ids]}).
+    """
+    model = _get_model(chunk.model)
+    fields = dict(
+        (f.attname, f) for f in model._meta.concrete_fields
+        if not f.primary_key
+    )
+    m2m_names = set(f.name for f in _get_m2m_fields(model))
+    validate = VALIDATORS.get(chunk.model)
+
+    if chunk.model == 'Value':
+        _get_attributes(
+            r['fields'].get('attribute_id') for r in chunk.records
+        )
+
+    prepared = []
+    for lineno, record in enumerate(chunk.records, chunk.start):
+        try:
+            values = {}
+            related = {}
+            for name, value in six.iteritems(record['fields']):
+                if name in m2m_names:
+                    related[name] = value
+                elif name in fields:
+                    values[name] = fields[name].to_python(value)
+
+            obj = model(pk=record['pk'], **values)
+            if validate is not None:
+                validate(obj)
+        except (exc.ValidationError, exc.DjangoValidationError, ValueError,
+                TypeError, KeyError) as err:
+            raise TransferError(
+                'Line %d: invalid %s %s: %s' % (
+                    lineno, chunk.model, record.get('pk'), err
+                )
+            )
+        prepared.append((obj, related))
+
+    return prepared
+
+
+def _init_worker():
+    """Set up a worker process to use database connections of its own."""
+    from . import db
+
+    db.reset_connections()
+    _attributes.clear()
+
+
+def _next_prepared(pending):
+    chunk, result = pending.popleft()
+    return chunk, result.get()
+
+
+def prepare_chunks(chunks, workers=1):
+    """
+    Yield (chunk, prepared objects) for each of ``chunks``, in order.
+
+    If ``workers`` is more than 1, chunks are validated by that many worker
+    processes while the caller writes the chunks already yielded. No more
+    than twice as many chunks as there are workers are held at once.
+
+    Chunks of a model are only validated once the chunks of the models
+    before it have been yielded, as Values are validated against the
+    Attributes imported before them. The caller must have written a chunk
+    before asking for the next one.
+
+    :param chunks:
+        Iterable of ``Chunk`` objects
+
+    :param workers:
+        Number of worker processes
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield chunk, prepare_chunk(chunk)
+        return
+
+    # Workers are forked, so don't hand them our connection.
+    if not connection.in_atomic_block:
+        connection.close()
+
+    pool = multiprocessing.Pool(workers, initializer=_init_worker)
+    pending = deque()
+    try:
+        for chunk in chunks:
+            if pending and pending[-1][0].model != chunk.model:
+                while pending:
+                    yield _next_prepared(pending)
+
+            pending.append(
+                (chunk, pool.apply_async(prepare_chunk, (chunk,)))
+            )
+            while len(pending) > workers * 2:
+                yield _next_prepared(pending)
+
+        while pending:
+            yield _next_prepared(pending)
+    except BaseException:
+        pool.terminate()
+        raise
+    else:
+        pool.close()
+    finally:
+        pool.join()
+
+
+class Importer(object):
+    """
+    Imports an export into the database.
+
+    :param chunk_size:
+        Maximum number of objects inserted in each transaction
+
+    :param checkpoint:
+        Path of the file recording the progress of the import
+
+    :param resume:
+        Whether to resume from the checkpoint, if there is one
+
+    :param workers:
+        Number of processes validating chunks in parallel
+    """
+    def __init__(self, chunk_size=CHUNK_SIZE, checkpoint=None, resume=True,
+                 workers=1):
+        self.chunk_size = chunk_size
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.workers = workers
+
+        self.counts = dict((name, 0) for name, _ in MODELS)
+        self.skipped = dict((name, 0) for name, _ in MODELS)
+
+        # (pk, parent_id) by model name of objects whose parent didn't exist
+        # yet when they were inserted.
+        self.orphans = {}
+
+        # Attribute names of imported Values by (site_id, resource_name).
+        self.value_names = {}
+        self.resources = set()
+
+    def load_checkpoint(self):
+        """Return the number of the line to resume from."""
+        if not (self.resume and self.checkpoint):
+            return 1
+        if not os.path.exists(self.checkpoint):
+            return 1
+
+        with io.open(self.checkpoint, encoding='utf-8') as fh:
+            state = json.load(fh)
+
+        self.orphans = dict(
+            (name, [tuple(pair) for pair in pairs])
+            for name, pairs in six.iteritems(state.get('orphans', {}))
+        )
+        log.info('Resuming from line %d.', state['line'] + 1)
+        return state['line'] + 1
+
+    def save_checkpoint(self, line):
+        if not self.checkpoint:
+            return
+
+        state = {'line': line, 'orphans': self.orphans}
+        temp = self.checkpoint + '.tmp'
+        with io.open(temp, 'w', encoding='utf-8') as fh:
+            fh.write(six.text_type(json.dumps(state)))
+        os.rename(temp, self.checkpoint)
+
+    def run(self, fh):
+        """
+        Import the export read from ``fh``.
+
+        Returns a dict of the number of objects imported by model name.
+        """
+        read_header(fh)
+        start = self.load_checkpoint()
+
+        chunks = iter_chunks(fh, self.chunk_size, start)
+        for chunk, prepared in prepare_chunks(chunks, self.workers):
+            self.write_chunk(chunk, prepared)
+
+        self.finish()
+        return self.counts
+
+    def write_chunk(self, chunk, prepared):
+        """Insert the objects of ``chunk`` in a transaction."""
+        model = _get_model(chunk.model)
+        pks = [obj.pk for obj, _ in prepared]
+
+        try:
+            with transaction.atomic():
+                existing = set(
+                    model.objects.filter(pk__in=pks).values_list(
+                        'pk', flat=True
+                    )
+                )
+                new = [
+                    (obj, related) for obj, related in prepared
+                    if obj.pk not in existing
+                ]
+                objects = [obj for obj, _ in new]
+
+                orphans = self.detach_orphans(model, objects)
+                model.objects.bulk_create(objects)
+                self.set_related(model, new)
+        except IntegrityError as err:
+            raise TransferError(
+                'Lines %d-%d: unable to import %s objects: %s' % (
+                    chunk.start, chunk.end, chunk.model, err
+                )
+            )
+
+        if orphans:
+            self.orphans.setdefault(chunk.model, []).extend(orphans)
+        self.record(chunk.model, objects)
+        self.skipped[chunk.model] += len(existing)
+        self.save_checkpoint(chunk.end)
+
+    def detach_orphans(self, model, objects):
+        """
+        Clear the parents of ``objects`` that don't exist yet, returning
+        (pk, parent_id) for each, so that they may be set once the parents
+        have been imported.
+        """
+        if not any(f.name == 'parent' for f in model._meta.concrete_fields):
+            return []
+
+        parent_ids = set(o.parent_id for o in objects if o.parent_id)
+        parent_ids.difference_update(o.pk for o in objects)
+        if not parent_ids:
+            return []
+
+        parent_ids.difference_update(
+            model.objects.filter(pk__in=parent_ids).values_list(
+                'pk', flat=True
+            )
+        )
+
+        orphans = []
+        for obj in objects:
+            if obj.parent_id in parent_ids:
+                orphans.append((obj.pk, obj.parent_id))
+                obj.parent_id = None
+        return orphans
+
+    def set_related(self, model, new):
+        for field in _get_m2m_fields(model):
+            through = field.remote_field.through
+            source = field.m2m_field_name() + '_id'
+            target = field.m2m_reverse_field_name() + '_id'
+            through.objects.bulk_create([
+                through(**{source: obj.pk, target: pk})
+                for obj, related in new
+                for pk in related.get(field.name, ())
+            ])
+
+    def record(self, name, objects):
+        """Record what must be invalidated once the import is done."""
+        self.counts[name] += len(objects)
+        if not objects:
+            return
+
+        if name == 'Value':
+            for value in objects:
+                key = (value.site_id, value.resource_name)
+                self.value_names.setdefault(key, set()).add(value.name)
+        elif issubclass(_get_model(name), models.Resource):
+            self.resources.add((objects[0].site_id, name))
+
+    def finish(self):
+        """Restore orphaned parents, sequences and cached state."""
+        with transaction.atomic():
+            for name, orphans in six.iteritems(self.orphans):
+                model = _get_model(name)
+                by_parent = {}
+                for pk, parent_id in orphans:
+                    by_parent.setdefault(parent_id, []).append(pk)
+                for parent_id, pks in six.iteritems(by_parent):
+                    model.objects.filter(pk__in=pks).update(
+                        parent_id=parent_id
+                    )
+
+        # Objects were inserted with their primary keys, so make sure that
+        # the next ones created don't reuse them.
+        statements = connection.ops.sequence_reset_sql(
+            no_style(), [_get_model(name) for name, _ in MODELS]
+        )
+        if statements:
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+
+        if self.counts['Attribute']:
+            invalidate_attribute_schema()
+        for site_id, resource_name in self.resources:
+            attribute_index.invalidate(site_id, resource_name)
+            if resource_name == 'Circuit':
+                topology.invalidate(site_id)
+            elif resource_name == 'Network':
+                prefix_index.invalidate(site_id)
+                ipam_snapshot.invalidate(site_id)
+        for (site_id, resource_name), names in six.iteritems(
+            self.value_names
+        ):
+            attribute_index.invalidate(site_id, resource_name)
+            value_dictionary.add_values(site_id, resource_name, names)
+
+        _attributes.clear()
+        if self.checkpoint and os.path.exists(self.checkpoint):
+            os.remove(self.checkpoint)
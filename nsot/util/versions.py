@@ -0,0 +1,88 @@
+"""
+Cache-backed version counters used to invalidate process-local caches.
+
+A version is an integer stored in the Django cache under a well-known name.
+Process-local caches remember the version they were built against and rebuild
+themselves whenever it changes. Bumping a version (typically from a signal
+handler) therefore invalidates the matching cache in every worker that shares
+the cache backend.
+
+Versions are advanced atomically with ``incr``, so a process that bumps a
+version from ``n`` to ``n + 1`` knows that nobody else changed it in between
+and may update its own cache in place instead of rebuilding it. New counters
+start at a random value so that a counter evicted from the cache is never
+mistaken for an older one.
+
+If the cache backend does not retain values (such as the default "dummy"
+cache), every lookup returns a fresh version, so local caches are always
+rebuilt and behavior is identical to having no cache at all.
+"""
+
+from __future__ import absolute_import
+import logging
+import random
+
+from django.core.cache import cache as djcache, caches, DEFAULT_CACHE_ALIAS
+from django.core.cache.backends.dummy import DummyCache
+
+
+log = logging.getLogger(__name__)
+
+
+__all__ = ('get_version', 'bump_version', 'is_persistent')
+
+
+def _make_key(name):
+    return 'nsot_version_%s' % name
+
+
+def _new_version():
+    return random.getrandbits(48)
+
+
+def get_version(name):
+    """
+    Return the current version for ``name``.
+
+    :param name:
+        Name of the versioned resource (e.g. 'attribute_schema')
+    """
+    key = _make_key(name)
+    version = djcache.get(key)
+    if version is None:
+        # Another process may win the race to initialize the key, in which
+        # case we adopt whatever it stored.
+        version = _new_version()
+        djcache.add(key, version, timeout=None)
+        version = djcache.get(key, version)
+
+    return version
+
+
+def bump_version(name):
+    """
+    Advance the version for ``name``, invalidating local caches, and return
+    the new version.
+
+    :param name:
+        Name of the versioned resource (e.g. 'attribute_schema')
+    """
+    log.debug('Bumping version for %r', name)
+    key = _make_key(name)
+    try:
+        return djcache.incr(key)
+    except ValueError:
+        # The key doesn't exist (yet, or anymore).
+        version = _new_version()
+        djcache.set(key, version, timeout=None)
+        return version
+
+
+def is_persistent():
+    """
+    Return whether the default cache backend retains versions.
+
+    Caches that are only worth keeping when versions can be compared (such as
+    the attribute index) should check this before being used.
+    """
+    return not isinstance(caches[DEFAULT_CACHE_ALIAS], DummyCache)
@@ -665,6 +665,11 @@ def test_detail_routes(site, client):
     devices_uri = reverse('circuit-devices', args=(site.id, cir['name']))
     assert_success(client.retrieve(devices_uri), expected)
 
+    # Related objects may be filtered by their own fields.
+    assert_success(
+        client.retrieve(devices_uri, hostname='foo-bar2'), [dev_z]
+    )
+
     # Verify Device.circuits
     dev_circuits_uri = reverse('device-circuits', args=(site.id, dev_a['id']))
     expected = [cir]
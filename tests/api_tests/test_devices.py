@@ -120,6 +120,130 @@ def test_bulk_operations(site, client):
     assert updated == expected
 
 
+def test_bulk_update(site, client):
+    """Test that bulk updates rename Interfaces and record Changes."""
+    dev_uri = site.list_uri('device')
+    ifc_uri = site.list_uri('interface')
+    change_uri = site.list_uri('change')
+
+    devices = get_result(
+        client.post(dev_uri, data=json.dumps([
+            {'hostname': 'device1'}, {'hostname': 'device2'},
+        ]))
+    )
+    ifc = get_result(
+        client.create(ifc_uri, device=devices[0]['id'], name='eth0')
+    )
+
+    # Rename one Device, and leave the other as it was.
+    updated = copy.deepcopy(devices)
+    updated[0]['hostname'] = 'device3'
+    assert_success(client.put(dev_uri, data=json.dumps(updated)), updated)
+
+    ifc_obj_uri = site.detail_uri('interface', id=ifc['id'])
+    ifc_resp = client.get(ifc_obj_uri)
+    assert get_result(ifc_resp)['name_slug'] == 'device3:eth0'
+
+    changes = get_result(
+        client.retrieve(change_uri, event='Update', resource_name='Device')
+    )
+    assert sorted(c['resource_id'] for c in changes) == sorted(
+        d['id'] for d in devices
+    )
+
+    # Duplicate hostnames are rejected, and nothing is changed.
+    updated[1]['hostname'] = 'device3'
+    assert_error(
+        client.put(dev_uri, data=json.dumps(updated)),
+        status.HTTP_400_BAD_REQUEST
+    )
+    dev2_uri = site.detail_uri('device', id=devices[1]['id'])
+    assert get_result(client.get(dev2_uri))['hostname'] == 'device2'
+
+    # Unknown ids are rejected.
+    updated[1].update(id=0, hostname='device4')
+    assert_error(
+        client.put(dev_uri, data=json.dumps(updated)),
+        status.HTTP_400_BAD_REQUEST
+    )
+
+
+def test_bulk_deletion(site, client):
+    """Test deleting many Devices at once."""
+    dev_uri = site.list_uri('device')
+    ifc_uri = site.list_uri('interface')
+
+    devices = get_result(
+        client.post(dev_uri, data=json.dumps([
+            {'hostname': 'device1'}, {'hostname': 'device2'},
+            {'hostname': 'device3'},
+        ]))
+    )
+    for dev in devices:
+        client.create(ifc_uri, device=dev['id'], name='eth0')
+
+    # Devices are deleted along with their Interfaces.
+    body = json.dumps(devices[:2])
+    assert_deleted(client.delete(dev_uri, data=body))
+    assert get_result(client.get(dev_uri)) == devices[2:]
+    assert [i['device'] for i in get_result(client.get(ifc_uri))] == [
+        devices[2]['id']
+    ]
+
+    # Unknown or empty filters don't select anything.
+    for params in ({}, {'hostnmae': 'device3'}, {'hostname': ''}):
+        assert_error(
+            client.delete(dev_uri, params=params),
+            status.HTTP_400_BAD_REQUEST
+        )
+    assert get_result(client.get(dev_uri)) == devices[2:]
+
+    # Or selected by filter.
+    assert_deleted(client.delete(dev_uri, params={'hostname': 'device3'}))
+    assert get_result(client.get(dev_uri)) == []
+
+
+def test_conditional_get(site, client):
+    """Test that unchanged Devices aren't sent again."""
+    dev_uri = site.list_uri('device')
+    dev = get_result(client.create(dev_uri, hostname='device1'))
+    dev_obj_uri = site.detail_uri('device', id=dev['id'])
+
+    resp = client.get(dev_obj_uri)
+    etag = resp.headers['ETag']
+    assert 'Last-Modified' in resp.headers
+
+    resp = client.get(dev_obj_uri, headers={'If-None-Match': etag})
+    assert resp.status_code == status.HTTP_304_NOT_MODIFIED
+    assert resp.content == b''
+
+    resp = client.get(
+        dev_obj_uri,
+        headers={'If-Modified-Since': resp.headers['Last-Modified']}
+    )
+    assert resp.status_code == status.HTTP_304_NOT_MODIFIED
+
+    # Changing the Device changes its version.
+    client.update(dev_obj_uri, hostname='device2', attributes={})
+    resp = client.get(dev_obj_uri, headers={'If-None-Match': etag})
+    assert_success(resp, get_result(client.get(dev_obj_uri)))
+    assert resp.headers['ETag'] != etag
+
+    # Lists change when objects are added or removed.
+    list_etag = client.get(dev_uri).headers['ETag']
+    resp = client.get(dev_uri, headers={'If-None-Match': list_etag})
+    assert resp.status_code == status.HTTP_304_NOT_MODIFIED
+
+    dev3 = get_result(client.create(dev_uri, hostname='device3'))
+    resp = client.get(dev_uri, headers={'If-None-Match': list_etag})
+    assert resp.status_code == status.HTTP_200_OK
+    list_etag = resp.headers['ETag']
+
+    client.delete(site.detail_uri('device', id=dev3['id']))
+    resp = client.get(dev_uri, headers={'If-None-Match': list_etag})
+    assert resp.status_code == status.HTTP_200_OK
+
+
 def test_filters(site, client):
     """Test hostname/attribute filters for Devices."""
     # URIs
@@ -784,6 +784,33 @@ def test_deletion(site, client):
     assert_deleted(client.delete(dev1_eth2_natural_uri))
 
 
+def test_bulk_deletion(site, client, device):
+    """Test deleting many Interfaces at once."""
+    ifc_uri = site.list_uri('interface')
+    cir_uri = site.list_uri('circuit')
+
+    eth0 = get_result(client.create(ifc_uri, device=device['id'], name='eth0'))
+    eth1 = get_result(client.create(
+        ifc_uri, device=device['id'], name='eth1', parent_id=eth0['id']
+    ))
+    eth2 = get_result(client.create(ifc_uri, device=device['id'], name='eth2'))
+    client.create(cir_uri, endpoint_a=eth2['id'])
+
+    # A parent can't be deleted without its children.
+    body = json.dumps([{'id': eth0['id']}])
+    assert_error(client.delete(ifc_uri, data=body), status.HTTP_409_CONFLICT)
+
+    # Nor can the endpoint of a Circuit.
+    assert_error(
+        client.delete(ifc_uri, params={'name': 'eth2'}),
+        status.HTTP_409_CONFLICT
+    )
+
+    body = json.dumps([{'id': eth0['id']}, {'id': eth1['id']}])
+    assert_deleted(client.delete(ifc_uri, data=body))
+    assert [i['id'] for i in get_result(client.get(ifc_uri))] == [eth2['id']]
+
+
 def test_detail_routes(site, client):
     """Test detail routes for Interfaces objects."""
     ifc_uri = site.list_uri('interface')
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from __future__ import absolute_import
+import pytest
+
+# Allow everything in there to access the DB
+pytestmark = pytest.mark.django_db
+
+from django.core.urlresolvers import reverse
+import logging
+import os
+import subprocess
+import sys
+
+from .fixtures import live_server, client, site
+from .util import get_result
+
+
+log = logging.getLogger(__name__)
+
+
+def test_metrics(site, client, settings):
+    """Test that request, allocation and Change metrics are exposed."""
+    # Metrics are off by default.
+    assert client.get(reverse('metrics')).status_code == 404
+    settings.NSOT_METRICS = True
+
+    net_uri = site.list_uri('network')
+    client.create(net_uri, cidr='10.1.2.0/24')
+    net_24 = get_result(client.retrieve(net_uri, cidr='10.1.2.0/24'))[0]
+
+    uri = reverse('network-next-network', args=(site.id, net_24['id']))
+    client.post(uri, params={'prefix_length': '32'})
+
+    resp = client.get(reverse('metrics'))
+    assert resp.status_code == 200
+    assert resp.headers['Content-Type'].startswith('text/plain')
+
+    body = resp.text
+    assert (
+        'nsot_requests_total{action="next_network",method="POST",'
+        'status="200",view="NetworkViewSet"}'
+    ) in body
+    assert 'nsot_request_duration_seconds_bucket{' in body
+    assert 'nsot_request_db_queries_bucket{' in body
+    assert 'nsot_next_network_duration_seconds_count{method="POST"}' in body
+    assert (
+        'nsot_changes_total{event="Create",resource_name="Network"}'
+    ) in body
+
+
+def test_metrics_import():
+    """
+    Test that the system checks don't import prometheus_client, which must
+    only happen once the HTTP service has set up multiprocess mode.
+    """
+    script = (
+        'import sys, django; django.setup(); '
+        'from django.core import checks; checks.run_checks(); '
+        'sys.exit("prometheus_client" in sys.modules)'
+    )
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='tests.test_settings')
+    env['PYTHONPATH'] = os.pathsep.join(sys.path)
+    assert subprocess.call([sys.executable, '-c', script], env=env) == 0
@@ -13,7 +13,7 @@ import json
 import logging
 from rest_framework import status
 
-from .fixtures import live_server, client, user, site
+from .fixtures import live_server, client, user, site, user_client
 from .util import (
     assert_created, assert_error, assert_success, assert_deleted, load_json,
     Client, load, filter_networks, mkcidr, get_result
@@ -498,6 +498,59 @@ def test_force_deletion(site, client):
     assert_error(client.destroy(net1_obj_uri, force_delete=True), status.HTTP_409_CONFLICT)
 
 
+def test_bulk_deletion(site, client):
+    """Test deleting many Networks at once."""
+    net_uri = site.list_uri('network')
+    ifc_uri = site.list_uri('interface')
+    change_uri = site.list_uri('change')
+
+    nets = get_result(client.post(net_uri, data=json.dumps([
+        {'cidr': '10.0.0.0/8'},
+        {'cidr': '10.1.0.0/16'},
+        {'cidr': '10.1.1.0/24'},
+        {'cidr': '10.1.1.1/32'},
+        {'cidr': '10.1.2.0/24'},
+    ])))
+    slash8, slash16, slash24, ip, other24 = nets
+
+    dev = get_result(client.create(site.list_uri('device'), hostname='dev1'))
+    ifc = get_result(client.create(
+        ifc_uri, device=dev['id'], name='eth0', addresses=['10.1.1.1/32']
+    ))
+
+    # Without filters or objects, nothing is deleted.
+    assert_error(client.delete(net_uri), status.HTTP_400_BAD_REQUEST)
+
+    # The /16 and a /24 have children that aren't being deleted.
+    body = json.dumps([{'id': slash16['id']}, {'id': slash24['id']}])
+    assert_error(client.delete(net_uri, data=body), status.HTTP_409_CONFLICT)
+
+    # Forcefully deleting them moves their children to the /8.
+    assert_deleted(client.delete(
+        net_uri, data=body, params={'force_delete': True}
+    ))
+    for child in (ip, other24):
+        child_uri = site.detail_uri('network', id=child['id'])
+        assert get_result(client.get(child_uri))['parent_id'] == slash8['id']
+
+    changes = get_result(
+        client.retrieve(change_uri, event='Delete', resource_name='Network')
+    )
+    assert sorted(c['resource_id'] for c in changes) == sorted(
+        [slash16['id'], slash24['id']]
+    )
+
+    # Delete the /8 and everything in it, by filter.
+    assert_deleted(client.delete(
+        net_uri, params={'cidr': '10.0.0.0/8', 'include_descendants': True}
+    ))
+    assert get_result(client.get(net_uri)) == []
+
+    # The address is no longer assigned to the Interface.
+    ifc_obj_uri = site.detail_uri('interface', id=ifc['id'])
+    assert get_result(client.get(ifc_obj_uri))['addresses'] == []
+
+
 def test_mptt_detail_routes(site, client):
     """Test detail routes for ancestor/children/descendants/root methods."""
     net_uri = site.list_uri('network')
@@ -619,6 +672,22 @@ def test_mptt_detail_routes(site, client):
     assert_success(client.retrieve(uri, include_self=True), expected)
     assert_success(client.retrieve(natural_uri, include_self=True), expected)
 
+    # tree
+    def node(network, *children):
+        return dict(network, children=list(children))
+
+    uri = reverse('network-tree', args=(site.id, net_12['id']))
+    natural_uri = reverse('network-tree', args=(site.id, mkcidr(net_12)))
+    expected = node(net_12, node(net_14, node(net_25, node(ip1), node(ip2))))
+    assert_success(client.retrieve(uri), expected)
+    assert_success(client.retrieve(natural_uri), expected)
+
+    expected = node(net_12, node(net_14, node(net_25)))
+    assert_success(client.retrieve(uri, include_ips=False), expected)
+    assert_success(client.retrieve(uri, depth=2), expected)
+    assert_success(client.retrieve(uri, depth=0), node(net_12))
+    assert_error(client.retrieve(uri, depth='x'), status.HTTP_400_BAD_REQUEST)
+
 
 def test_get_next_detail_routes(site, client):
     """Test the detail routes for getting next available networks/addresses."""
@@ -838,3 +907,55 @@ def test_closest_parent_detail_route(site, client):
         'network-closest-parent', args=(site.id, '1.0.0.1/32')
     )
     assert_error(client.retrieve(no_closest_uri), status.HTTP_404_NOT_FOUND)
+
+
+def test_closest_parents_list_route(site, client, user, user_client):
+    """
+    Test the list route for looking up the closest parents of many addresses
+    or CIDRs at once.
+
+    GET/POST /api/sites/1/networks/closest_parents/
+    """
+    net_uri = site.list_uri('network')
+    root = get_result(client.create(net_uri, cidr='10.250.0.0/16'))
+    parent = get_result(client.create(net_uri, cidr='10.250.0.0/24'))
+
+    closest_uri = reverse('network-closest-parents', args=(site.id,))
+    cidrs = ['10.250.0.185', '10.250.1.0/24', '10.250.0.0/24', '1.0.0.1/32']
+    expected = [
+        {'cidr': '10.250.0.185', 'parent': parent},
+        {'cidr': '10.250.1.0/24', 'parent': root},
+        {'cidr': '10.250.0.0/24', 'parent': root},
+        {'cidr': '1.0.0.1/32', 'parent': None},
+    ]
+    assert_success(
+        client.retrieve(closest_uri, cidrs=cidrs), expected,
+        ignore_order=False
+    )
+
+    # POST doesn't require permission to create Networks.
+    assert_success(
+        user_client.create(closest_uri, cidrs=cidrs), expected,
+        ignore_order=False
+    )
+    assert_success(
+        user_client.create(closest_uri, cidrs=cidrs, prefix_length=24),
+        [dict(expected[0], parent=parent)] + [
+            dict(item, parent=None) for item in expected[1:]
+        ],
+        ignore_order=False
+    )
+
+    # Invalid input should 400
+    assert_error(
+        client.create(closest_uri, cidrs='10.250.0.1'),
+        status.HTTP_400_BAD_REQUEST
+    )
+    assert_error(
+        client.create(closest_uri, cidrs=['bogus']),
+        status.HTTP_400_BAD_REQUEST
+    )
+    assert_error(
+        client.retrieve(closest_uri, cidrs=cidrs, prefix_length='shoe'),
+        status.HTTP_400_BAD_REQUEST
+    )
@@ -11,7 +11,7 @@ from django.core.urlresolvers import reverse
 import logging
 from rest_framework import status
 
-from .fixtures import client
+from .fixtures import client, site
 from .util import (
     assert_created, assert_deleted, assert_error, assert_success, SiteHelper,
     get_result
@@ -137,3 +137,74 @@ def test_deletion(client):
 
     # Finally delete.
     assert_deleted(client.delete(site_obj_uri))
+
+
+def test_topology(site, client):
+    """Test querying the graph of Devices connected by Circuits."""
+    dev_uri = site.list_uri('device')
+    ifc_uri = site.list_uri('interface')
+    cir_uri = site.list_uri('circuit')
+
+    # A chain of a - b - c, with d on its own.
+    devices = {}
+    for hostname in ('a', 'b', 'c', 'd'):
+        devices[hostname] = get_result(
+            client.create(dev_uri, hostname=hostname)
+        )
+
+    def connect(a, z):
+        ifc_a = get_result(client.create(
+            ifc_uri, device=devices[a]['id'], name='to-' + z
+        ))
+        ifc_z = get_result(client.create(
+            ifc_uri, device=devices[z]['id'], name='to-' + a
+        ))
+        return get_result(client.create(
+            cir_uri, endpoint_a=ifc_a['id'], endpoint_z=ifc_z['id']
+        ))
+
+    ab = connect('a', 'b')
+    bc = connect('b', 'c')
+
+    def device(hostname):
+        return {'id': devices[hostname]['id'], 'hostname': hostname}
+
+    topology_uri = reverse('site-topology', args=(site.id,))
+    assert_success(
+        client.retrieve(topology_uri),
+        {'devices': 4, 'connected_devices': 3, 'circuits': 2,
+         'components': 2}
+    )
+    assert_success(
+        client.retrieve(topology_uri, neighbors='b'),
+        [{'device': device('a'), 'circuits': [ab['id']]},
+         {'device': device('c'), 'circuits': [bc['id']]}]
+    )
+    assert_success(
+        client.retrieve(topology_uri, source='a', target=devices['c']['id']),
+        {'devices': [device('a'), device('b'), device('c')],
+         'circuits': [[ab['id']], [bc['id']]]}
+    )
+    assert_success(
+        client.retrieve(topology_uri, component='c'),
+        [device('a'), device('b'), device('c')]
+    )
+    assert_success(client.retrieve(topology_uri, component='d'), [device('d')])
+
+    # Unconnected and unknown Devices
+    assert_error(
+        client.retrieve(topology_uri, source='a', target='d'),
+        status.HTTP_404_NOT_FOUND
+    )
+    assert_error(
+        client.retrieve(topology_uri, neighbors='bogus'),
+        status.HTTP_404_NOT_FOUND
+    )
+    assert_error(
+        client.retrieve(topology_uri, source='a'),
+        status.HTTP_400_BAD_REQUEST
+    )
+
+    # Deleting a Circuit disconnects its Devices.
+    client.delete(site.detail_uri('circuit', id=bc['id']))
+    assert_success(client.retrieve(topology_uri, neighbors='c'), [])
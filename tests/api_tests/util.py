@@ -132,14 +132,16 @@ class Client(object):
         headers = {
             "X-NSoT-Email": self.user,
         }
+        headers.update(kwargs.pop('headers', {}))
 
         # If api_version is set, let's use that.
         api_version = kwargs.get('api_version', self.api_version)
         if api_version is not None:
             headers["Accept"] = "*/*; version=%s" % api_version
 
-        # If we're updating/creating, set content-type to json
-        if method.lower() in ("put", "post", "patch"):
+        # If we're updating/creating (or sending a payload to delete), set
+        # content-type to json
+        if method.lower() in ("put", "post", "patch") or "data" in kwargs:
             headers["Content-type"] = "application/json"
 
         # Record stuff w/ Betamax for some reason.
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the Device API endpoints.
+"""
+
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import itertools
+import json
+import random
+
+from django.core.urlresolvers import reverse
+import pytest
+
+from .fixtures import api, dataset
+from .util import recorder
+
+
+pytestmark = pytest.mark.django_db
+
+#: Number of objects in each bulk request.
+BULK_SIZE = 100
+
+
+def assert_ok(response):
+    assert response.status_code in (200, 201), response.content
+
+
+def test_list(api, dataset):
+    uri = reverse('device-list', args=(dataset.site.id,))
+    recorder.measure(
+        'devices.list',
+        lambda: assert_ok(api.get(uri, {'limit': 100})),
+        items=100,
+    )
+
+
+def test_retrieve(api, dataset):
+    ids = itertools.cycle(random.sample(dataset.device_ids, 100))
+
+    def retrieve():
+        uri = reverse('device-detail', args=(dataset.site.id, next(ids)))
+        assert_ok(api.get(uri))
+
+    recorder.measure('devices.retrieve', retrieve)
+
+
+@pytest.mark.parametrize('query', [
+    'role=br',
+    'role=br owner=owner1',
+    'role=br +role=dr -tag0=v0',
+    'role_regex=^[bd]r$',
+])
+def test_query(api, dataset, query):
+    uri = reverse('device-query', args=(dataset.site.id,))
+    recorder.measure(
+        'devices.query[%s]' % query,
+        lambda: assert_ok(api.get(uri, {'query': query, 'limit': 100})),
+    )
+
+
+def test_bulk_create(api, dataset):
+    uri = reverse('device-list', args=(dataset.site.id,))
+    counter = itertools.count()
+
+    def bulk_create():
+        payload = [
+            {
+                'hostname': 'bench-new%d' % next(counter),
+                'attributes': {'role': 'br', 'owner': 'owner1'},
+            }
+            for _ in range(BULK_SIZE)
+        ]
+        assert_ok(api.post(
+            uri, data=json.dumps(payload), content_type='application/json'
+        ))
+
+    recorder.measure(
+        'devices.bulk_create', bulk_create, iterations=10, items=BULK_SIZE
+    )
+
+
+def test_bulk_update(api, dataset):
+    uri = reverse('device-list', args=(dataset.site.id,))
+    ids = dataset.device_ids[:BULK_SIZE]
+    counter = itertools.count()
+
+    def bulk_update():
+        n = next(counter)
+        payload = [
+            {
+                'id': device_id,
+                'hostname': 'bench-device-%d-%d' % (device_id, n),
+                'attributes': {'role': 'dr', 'owner': 'owner%d' % (n % 50)},
+            }
+            for device_id in ids
+        ]
+        assert_ok(api.put(
+            uri, data=json.dumps(payload), content_type='application/json'
+        ))
+
+    recorder.measure(
+        'devices.bulk_update', bulk_update, iterations=10, items=BULK_SIZE
+    )
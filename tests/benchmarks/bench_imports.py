@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of cold start time.
+
+Each iteration starts a fresh Python interpreter, so that nothing is already
+imported. The slowest imports of each scenario are included in the results
+under ``imports``, in milliseconds.
+"""
+
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from .util import recorder
+
+
+#: Timed interpreter starts for each scenario.
+ITERATIONS = int(os.getenv('NSOT_BENCH_IMPORT_ITERATIONS', 5))
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__)
+)))
+
+SCENARIOS = {
+    # ``nsot-server --help``
+    'cli_help': (
+        'import sys\n'
+        'sys.argv = ["nsot-server", "--config=tests/test_settings.py", '
+        '"--help"]\n'
+        'from nsot.util import main\n'
+        'try:\n'
+        '    main()\n'
+        'except SystemExit as err:\n'
+        '    assert not err.code, err.code\n'
+    ),
+
+    # A WSGI worker loading the application and building its URL routes.
+    'wsgi_worker': (
+        'import nsot.wsgi\n'
+        'from nsot.util import startup\n'
+        'startup.preload_app()\n'
+    ),
+}
+
+#: Wraps a scenario to print its slowest imports as JSON.
+TIMED = (
+    'import json\n'
+    'from nsot.util.startup import ImportTimer\n'
+    'with ImportTimer() as timer:\n'
+    '%s'
+    'slowest = sorted(timer.timings.items(), key=lambda i: -i[1][0])[:20]\n'
+    'print(json.dumps([(n, round(t[0] * 1000, 2)) for n, t in slowest]))\n'
+)
+
+
+def run(code):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='tests.benchmarks.settings')
+    return subprocess.check_output(
+        [sys.executable, '-c', code], cwd=ROOT, env=env,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def indent(code):
+    return ''.join('    ' + line + '\n' for line in code.splitlines())
+
+
+@pytest.mark.parametrize('scenario', sorted(SCENARIOS))
+def test_cold_start(scenario):
+    code = SCENARIOS[scenario]
+    result = recorder.measure(
+        'imports.%s' % scenario, lambda: run(code),
+        iterations=ITERATIONS, count_queries=False,
+    )
+
+    output = run(TIMED % indent(code)).decode('utf-8')
+    result['imports'] = json.loads(output.strip().splitlines()[-1])
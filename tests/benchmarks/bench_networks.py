@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the Network API endpoints and model operations.
+"""
+
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import ipaddress
+import itertools
+import json
+import random
+
+from django.core.urlresolvers import reverse
+from django.db import transaction
+import pytest
+
+from nsot import models
+
+from .fixtures import BLOCK_START, api, dataset
+from .util import recorder
+
+
+pytestmark = pytest.mark.django_db
+
+#: Number of objects in each bulk request.
+BULK_SIZE = 100
+
+
+def assert_ok(response):
+    assert response.status_code in (200, 201), response.content
+
+
+def test_list(api, dataset):
+    uri = reverse('network-list', args=(dataset.site.id,))
+    recorder.measure(
+        'networks.list',
+        lambda: assert_ok(api.get(uri, {'limit': 100})),
+        items=100,
+    )
+
+
+def test_retrieve(api, dataset):
+    ids = itertools.cycle(random.sample(dataset.network_ids, 100))
+
+    def retrieve():
+        uri = reverse('network-detail', args=(dataset.site.id, next(ids)))
+        assert_ok(api.get(uri))
+
+    recorder.measure('networks.retrieve', retrieve)
+
+
+def test_query(api, dataset):
+    if not dataset.attrs_per_network:
+        pytest.skip('Dataset has no Network attributes')
+
+    uri = reverse('network-query', args=(dataset.site.id,))
+    recorder.measure(
+        'networks.query',
+        lambda: assert_ok(
+            api.get(uri, {'query': 'owner=owner1', 'limit': 100})
+        ),
+    )
+
+
+def test_next_network(api, dataset):
+    uri = reverse(
+        'network-next-network', args=(dataset.site.id, dataset.free_block_id)
+    )
+    recorder.measure(
+        'networks.next_network',
+        lambda: assert_ok(api.get(uri, {'prefix_length': 24, 'num': 4})),
+    )
+
+
+def test_next_network_full(api, dataset):
+    """Find the next network in a block that is already populated."""
+    uri = reverse(
+        'network-next-network', args=(dataset.site.id, dataset.block_ids[0])
+    )
+    recorder.measure(
+        'networks.next_network_full',
+        lambda: assert_ok(api.get(uri, {'prefix_length': 28})),
+    )
+
+
+def test_descendants(api, dataset):
+    ids = itertools.cycle(dataset.block_ids)
+
+    def descendants():
+        uri = reverse(
+            'network-descendants', args=(dataset.site.id, next(ids))
+        )
+        assert_ok(api.get(uri))
+
+    recorder.measure('networks.descendants', descendants)
+
+
+def test_closest_parents(api, dataset, settings):
+    """Look up the closest parents of 1000 addresses with each request."""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+    uri = reverse('network-closest-parents', args=(dataset.site.id,))
+    rng = random.Random(0)
+    span = dataset.num_blocks << 16
+    payload = json.dumps({
+        'cidrs': [
+            '%s' % ipaddress.IPv4Address(BLOCK_START + rng.randrange(span))
+            for _ in range(1000)
+        ]
+    })
+
+    recorder.measure(
+        'networks.closest_parents',
+        lambda: assert_ok(api.post(
+            uri, data=payload, content_type='application/json'
+        )),
+        iterations=10, items=1000,
+    )
+
+
+def test_bulk_create(api, dataset):
+    uri = reverse('network-list', args=(dataset.site.id,))
+    free = int(ipaddress.IPv4Address(BLOCK_START)) + (dataset.num_blocks << 16)
+    counter = itertools.count()
+
+    def bulk_create():
+        payload = [
+            {'cidr': '%s/28' % ipaddress.IPv4Address(
+                free + (next(counter) << 4)
+            )}
+            for _ in range(BULK_SIZE)
+        ]
+        assert_ok(api.post(
+            uri, data=json.dumps(payload), content_type='application/json'
+        ))
+
+    recorder.measure(
+        'networks.bulk_create', bulk_create, iterations=10, items=BULK_SIZE
+    )
+
+
+def test_create_1024(dataset, db):
+    """Create 1024 Networks with an attribute using the models directly."""
+    site = dataset.site
+    free = int(ipaddress.IPv4Address(BLOCK_START)) + (dataset.num_blocks << 16)
+    counter = itertools.count()
+
+    def create():
+        # Each iteration uses a fresh /20 of the free block.
+        base = free + (next(counter) << 12)
+        network = ipaddress.ip_network(
+            '%s/20' % ipaddress.IPv4Address(base)
+        )
+        with transaction.atomic():
+            for ip in network.subnets(new_prefix=30):
+                models.Network.objects.create(
+                    site=site, cidr=ip.exploded, attributes={'owner': 'bench'}
+                )
+
+    recorder.measure(
+        'networks.create_1024', create, iterations=3, items=1024
+    )
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for the topology of Devices connected by Circuits.
+
+The Devices of the dataset are connected in a ring, with as many Circuits
+again between random pairs of them.
+"""
+
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import itertools
+import random
+
+from django.core.urlresolvers import reverse
+import pytest
+
+from nsot import models, util
+from nsot.models.topology import topology
+
+from .fixtures import api, bulk_create, dataset
+from .util import recorder
+
+
+pytestmark = pytest.mark.django_db
+
+
+def assert_ok(response):
+    assert response.status_code == 200, response.content
+
+
+def connect(site, pairs):
+    """Create a Circuit between each pair of Device IDs in ``pairs``."""
+    hostnames = dict(
+        models.Device.objects.filter(site=site).values_list('id', 'hostname')
+    )
+
+    def iter_interfaces():
+        for i, pair in enumerate(pairs):
+            for side, device_id in zip('az', pair):
+                name = 'c%d%s' % (i, side)
+                hostname = hostnames[device_id]
+                yield models.Interface(
+                    site=site, device_id=device_id, device_hostname=hostname,
+                    name=name, name_slug=util.slugify_interface(
+                        device_hostname=hostname, name=name
+                    ),
+                )
+
+    bulk_create(models.Interface, iter_interfaces())
+    interface_ids = dict(
+        models.Interface.objects.filter(site=site).values_list(
+            'name', 'id'
+        )
+    )
+
+    def iter_circuits():
+        for i in range(len(pairs)):
+            name = 'circuit%d' % i
+            yield models.Circuit(
+                site=site, name=name, name_slug=util.slugify(name),
+                endpoint_a_id=interface_ids['c%da' % i],
+                endpoint_z_id=interface_ids['c%dz' % i],
+            )
+
+    bulk_create(models.Circuit, iter_circuits())
+
+
+@pytest.fixture
+def connected(dataset, settings):
+    """Connect the Devices, and use a cache that retains graph versions."""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+    ids = dataset.device_ids
+    rng = random.Random(0)
+    pairs = list(zip(ids, ids[1:] + ids[:1]))
+    pairs.extend(tuple(rng.sample(ids, 2)) for _ in ids)
+    connect(dataset.site, pairs)
+
+    topology.clear()
+    return dataset
+
+
+def test_build(connected):
+    site_id = connected.site.id
+    recorder.measure(
+        'topology.build',
+        lambda: topology._build(site_id, 0),
+        iterations=5,
+        items=len(connected.device_ids),
+    )
+
+
+def test_shortest_path(connected):
+    graph = topology._build(connected.site.id, 0)
+    pairs = itertools.cycle([
+        tuple(random.sample(connected.device_ids, 2)) for _ in range(100)
+    ])
+
+    def shortest_path():
+        source, target = next(pairs)
+        assert graph.shortest_path(source, target) is not None
+
+    recorder.measure(
+        'topology.shortest_path', shortest_path, count_queries=False
+    )
+
+
+def test_neighbors(api, connected):
+    uri = reverse('site-topology', args=(connected.site.id,))
+    ids = itertools.cycle(random.sample(connected.device_ids, 100))
+    recorder.measure(
+        'topology.neighbors',
+        lambda: assert_ok(api.get(uri, {'neighbors': next(ids)})),
+    )
+
+
+def test_component(connected):
+    graph = topology._build(connected.site.id, 0)
+    ids = itertools.cycle(random.sample(connected.device_ids, 100))
+    recorder.measure(
+        'topology.component',
+        lambda: graph.component(next(ids)),
+        count_queries=False,
+    )
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of exporting and importing the dataset.
+
+The dataset is exported once, and then validated (without writing anything)
+by an import with 1 and ``NSOT_BENCH_IMPORT_WORKERS`` worker processes. The
+workers need a database they can share with the benchmark process, so
+validating in workers is skipped on SQLite (use
+``NSOT_BENCH_DATABASE=postgres``).
+"""
+
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import io
+import multiprocessing
+import os
+
+from django.db import connection
+import pytest
+
+from nsot import models
+from nsot.util import transfer
+
+from .fixtures import dataset
+from .util import recorder
+
+
+pytestmark = pytest.mark.django_db
+
+#: Number of worker processes to compare with a single process.
+WORKERS = int(
+    os.getenv('NSOT_BENCH_IMPORT_WORKERS', multiprocessing.cpu_count())
+)
+
+
+@pytest.fixture(scope='module')
+def export_path(tmpdir_factory):
+    return str(tmpdir_factory.mktemp('transfer').join('export.ndjson'))
+
+
+def count_objects():
+    return sum(
+        getattr(models, name).objects.count()
+        for name, _ in transfer.MODELS
+    )
+
+
+def test_export(dataset, export_path):
+    def export():
+        with io.open(export_path, 'w', encoding='utf-8') as fh:
+            transfer.export(fh)
+
+    recorder.measure(
+        'transfer.export', export, iterations=1, warmup=0,
+        items=count_objects(),
+    )
+
+
+@pytest.mark.parametrize('workers', sorted(set([1, WORKERS])))
+def test_validate(workers, dataset, export_path):
+    if workers > 1 and connection.vendor == 'sqlite':
+        pytest.skip('Import workers need a shared database.')
+    if not os.path.exists(export_path):
+        with io.open(export_path, 'w', encoding='utf-8') as fh:
+            transfer.export(fh)
+
+    def validate():
+        with io.open(export_path, encoding='utf-8') as fh:
+            transfer.read_header(fh)
+            chunks = transfer.iter_chunks(fh)
+            for _ in transfer.prepare_chunks(chunks, workers):
+                pass
+
+    recorder.measure(
+        'transfer.validate.workers_%d' % workers, validate, iterations=1,
+        warmup=0, items=count_objects(), count_queries=False,
+    )
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmarks of API throughput for each gunicorn worker class.
+
+A server is started with each of the ``sync``, ``gthread`` and ``gevent``
+worker classes, and the same mix of requests is made against it from
+``NSOT_BENCH_CONCURRENCY`` client threads. The servers need a database they
+can share with the benchmark process, so these are skipped on SQLite (use
+``NSOT_BENCH_DATABASE=postgres``).
+"""
+
+from __future__ import unicode_literals
+from __future__ import absolute_import
+import itertools
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+import os
+import random
+import socket
+import sys
+import time
+
+from django.conf import settings
+from django.db import connection
+import pytest
+from six.moves.urllib.request import Request, urlopen
+
+from nsot.services import http
+
+from .fixtures import dataset
+from .util import recorder
+
+
+pytestmark = pytest.mark.django_db
+
+#: Number of worker processes for each server.
+WORKERS = int(os.getenv('NSOT_BENCH_WORKERS', 2))
+
+#: Number of client threads making requests at once.
+CONCURRENCY = int(os.getenv('NSOT_BENCH_CONCURRENCY', 16))
+
+#: Number of requests in each timed iteration.
+REQUESTS = int(os.getenv('NSOT_BENCH_REQUESTS', 200))
+
+#: Seconds to wait for a server to start.
+STARTUP_TIMEOUT = 30
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def run_server(port, worker_class):
+    """Run an HTTP server in the current (child) process."""
+    sys.argv = sys.argv[:1]  # Keep gunicorn from parsing py.test arguments.
+    server = http.NsotHTTPServer(
+        host='127.0.0.1', port=port, workers=WORKERS,
+        worker_class=worker_class, timeout=60, loglevel='warning',
+        threads=CONCURRENCY, worker_connections=1000,
+    )
+    server.run()
+
+
+def wait_for_server(port):
+    deadline = time.time() + STARTUP_TIMEOUT
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except socket.error:
+            time.sleep(0.1)
+    raise RuntimeError('Server on port %d did not start' % port)
+
+
+@pytest.fixture
+def server(worker_class, dataset):
+    """Start a server with ``worker_class`` workers and return its URL."""
+    if connection.vendor == 'sqlite':
+        pytest.skip('Worker benchmarks need a shared database.')
+
+    port = free_port()
+    process = multiprocessing.Process(
+        target=run_server, args=(port, worker_class)
+    )
+    process.start()
+    try:
+        wait_for_server(port)
+        yield 'http://127.0.0.1:%d' % port
+    finally:
+        process.terminate()
+        process.join()
+
+
+@pytest.mark.parametrize('worker_class', http.WORKER_CLASSES)
+def test_throughput(worker_class, server, dataset):
+    site_id = dataset.site.id
+    device_ids = itertools.cycle(random.sample(dataset.device_ids, 100))
+    network_ids = itertools.cycle(random.sample(dataset.network_ids, 100))
+    paths = [
+        '/api/sites/%d/devices/?limit=25' % site_id,
+        '/api/sites/%d/networks/?limit=25' % site_id,
+        '/api/sites/%d/devices/query/?query=role=br&limit=25' % site_id,
+    ]
+    for _ in range(REQUESTS - len(paths)):
+        if random.random() < 0.5:
+            paths.append(
+                '/api/sites/%d/devices/%d/' % (site_id, next(device_ids))
+            )
+        else:
+            paths.append(
+                '/api/sites/%d/networks/%d/' % (site_id, next(network_ids))
+            )
+
+    headers = {settings.USER_AUTH_HEADER: dataset.user.email}
+
+    def get(path):
+        response = urlopen(Request(server + path, headers=headers))
+        assert response.getcode() == 200
+        response.read()
+
+    pool = ThreadPool(CONCURRENCY)
+    try:
+        recorder.measure(
+            'workers.%s' % worker_class,
+            lambda: pool.map(get, paths),
+            iterations=5,
+            items=len(paths),
+        )
+    finally:
+        pool.close()
@@ -0,0 +1,52 @@
+"""
+Configuration for the benchmark suite.
+
+Benchmarks live in ``bench_*.py`` files so that they aren't collected by a
+normal test run. They are only collected when this directory is explicitly
+passed to py.test, for example::
+
+    $ py.test --ds=tests.benchmarks.settings tests/benchmarks
+
+Results are written as JSON to ``NSOT_BENCH_OUTPUT`` when the session ends.
+"""
+
+from __future__ import absolute_import
+import os
+
+import pytest
+
+from .util import recorder
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _requested(config):
+    """Return whether benchmarks were explicitly asked for."""
+    for arg in config.args:
+        path = os.path.abspath(arg.split('::')[0])
+        if path == BENCH_DIR or path.startswith(BENCH_DIR + os.sep):
+            return True
+    return False
+
+
+def pytest_collect_file(parent, path):
+    if path.ext == '.py' and path.basename.startswith('bench_'):
+        if _requested(parent.config):
+            return pytest.Module(path, parent)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if recorder.results:
+        recorder.write()
+
+
+def pytest_terminal_summary(terminalreporter):
+    for result in recorder.results:
+        latency = result['latency_ms']
+        terminalreporter.write_line(
+            '%-32s p50=%8.2fms p99=%8.2fms queries=%s' % (
+                result['name'], latency['p50'], latency['p99'],
+                result['queries']['max'],
+            )
+        )
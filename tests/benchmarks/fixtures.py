@@ -0,0 +1,245 @@
+"""
+Fixtures that seed the benchmark dataset.
+
+The dataset is sized relative to a site with 100k Devices, 1M Networks and
+10M attribute Values, multiplied by the ``NSOT_BENCH_SCALE`` environment
+variable (default: 0.01). It is seeded once per session using
+``bulk_create()``, so individual benchmarks may modify it freely inside of
+their own (rolled back) transaction.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+import ipaddress
+import logging
+import os
+
+import pytest
+from pytest_django.fixtures import django_db_setup, django_db_blocker
+from rest_framework.test import APIClient
+from six.moves import range
+
+from nsot import models
+
+
+log = logging.getLogger(__name__)
+
+
+#: Multiplier applied to the full-size dataset.
+SCALE = float(os.getenv('NSOT_BENCH_SCALE', 0.01))
+
+#: Full-size dataset.
+FULL_DEVICES = 100000
+FULL_NETWORKS = 1000000
+FULL_VALUES = 10000000
+
+#: Objects passed to each ``bulk_create()`` call.
+CHUNK_SIZE = 5000
+
+#: Attributes set on every Device.
+DEVICE_ATTRIBUTES = [
+    'role', 'owner', 'rack', 'tag0', 'tag1', 'tag2', 'tag3', 'tag4', 'tag5',
+    'tag6',
+]
+
+#: Attributes set on Networks (as many as needed to reach the Value count).
+NETWORK_ATTRIBUTES = [
+    'owner', 'vlan', 'zone', 'tag0', 'tag1', 'tag2', 'tag3', 'tag4', 'tag5',
+]
+
+#: Number of /24 Networks under each /16 block.
+BLOCK_SIZE = 256
+
+#: First address of the Network blocks.
+BLOCK_START = int(ipaddress.IPv4Address(u'10.0.0.0'))
+
+
+class Dataset(object):
+    """Handle on the seeded objects used by benchmarks."""
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def device_attributes(i):
+    """Return the attributes for the ``i``th Device."""
+    attributes = {
+        'role': ['br', 'dr', 'cr', 'sw'][i % 4],
+        'owner': 'owner%d' % (i % 50),
+        'rack': 'rack%d' % (i // 40),
+    }
+    for n, name in enumerate(DEVICE_ATTRIBUTES[3:]):
+        attributes[name] = 'v%d' % (i % (n + 2))
+    return attributes
+
+
+def network_attributes(i, count):
+    """Return ``count`` attributes for the ``i``th Network."""
+    values = {
+        'owner': 'owner%d' % (i % 50),
+        'vlan': '%d' % (i % 4096),
+        'zone': ['dmz', 'core', 'edge'][i % 3],
+    }
+    attributes = {}
+    for n, name in enumerate(NETWORK_ATTRIBUTES[:count]):
+        attributes[name] = values.get(name, 'v%d' % (i % (n + 2)))
+    return attributes
+
+
+def block_cidr(i, prefix_length=16):
+    """Return the CIDR of the ``i``th /16 block."""
+    address = ipaddress.IPv4Address(BLOCK_START + (i << 16))
+    return u'%s/%s' % (address, prefix_length)
+
+
+def bulk_create(model, objects):
+    """Call ``bulk_create()`` in chunks to bound memory use."""
+    chunk = []
+    for obj in objects:
+        chunk.append(obj)
+        if len(chunk) >= CHUNK_SIZE:
+            model.objects.bulk_create(chunk)
+            chunk = []
+    if chunk:
+        model.objects.bulk_create(chunk)
+
+
+def create_values(site, resource_name, attributes, rows):
+    """
+    Create Values for ``rows`` of (resource_id, attributes dict).
+
+    :param attributes:
+        Dict of Attribute objects keyed by name
+    """
+    def iter_values():
+        for resource_id, attrs in rows:
+            for name, value in attrs.items():
+                yield models.Value(
+                    attribute_id=attributes[name].id, value=value,
+                    name=name, resource_name=resource_name,
+                    resource_id=resource_id, site_id=site.id,
+                )
+
+    bulk_create(models.Value, iter_values())
+
+
+def seed_dataset(scale):
+    """Seed the benchmark dataset and return a ``Dataset``."""
+    num_devices = max(int(FULL_DEVICES * scale), 10)
+    num_networks = max(int(FULL_NETWORKS * scale), BLOCK_SIZE + 1)
+    num_values = int(FULL_VALUES * scale)
+
+    log.info(
+        'Seeding %d devices, %d networks, ~%d values',
+        num_devices, num_networks, num_values
+    )
+
+    user = models.User.objects.create(
+        email='bench@localhost', is_superuser=True, is_staff=True
+    )
+    site = models.Site.objects.create(name='Benchmark Site')
+
+    # Attributes
+    device_attrs = {}
+    for name in DEVICE_ATTRIBUTES:
+        device_attrs[name] = models.Attribute.objects.create(
+            site=site, resource_name='Device', name=name
+        )
+    network_attrs = {}
+    for name in NETWORK_ATTRIBUTES:
+        network_attrs[name] = models.Attribute.objects.create(
+            site=site, resource_name='Network', name=name
+        )
+
+    # Devices
+    bulk_create(models.Device, (
+        models.Device(
+            site=site, hostname='bench-device%d' % i,
+            _attributes_cache=device_attributes(i),
+        )
+        for i in range(num_devices)
+    ))
+    device_ids = list(
+        models.Device.objects.filter(site=site).order_by('id').values_list(
+            'id', flat=True
+        )
+    )
+    create_values(site, 'Device', device_attrs, (
+        (device_id, device_attributes(i))
+        for i, device_id in enumerate(device_ids)
+    ))
+
+    # Networks are /24s under /16 blocks. The blocks are saved normally, and
+    # their children are bulk-created with the parent already known.
+    num_blocks = -(-num_networks // (BLOCK_SIZE + 1))
+    blocks = [
+        models.Network.objects.create(site=site, cidr=block_cidr(i))
+        for i in range(num_blocks)
+    ]
+    remaining_values = max(num_values - num_devices * len(DEVICE_ATTRIBUTES), 0)
+    attrs_per_network = min(
+        remaining_values // num_networks, len(NETWORK_ATTRIBUTES)
+    )
+
+    def iter_networks():
+        count = num_blocks
+        for i, block in enumerate(blocks):
+            base = BLOCK_START + (i << 16)
+            for j in range(BLOCK_SIZE):
+                if count >= num_networks:
+                    return
+                count += 1
+                network = base + (j << 8)
+                yield models.Network(
+                    site=site, parent_id=block.id, ip_version='4',
+                    network_address=u'%s' % ipaddress.IPv4Address(network),
+                    broadcast_address=(
+                        u'%s' % ipaddress.IPv4Address(network + 255)
+                    ),
+                    prefix_length=24, is_ip=False,
+                    state=models.Network.ALLOCATED,
+                    _attributes_cache=network_attributes(
+                        count, attrs_per_network
+                    ),
+                )
+
+    bulk_create(models.Network, iter_networks())
+    network_ids = list(
+        models.Network.objects.filter(
+            site=site, prefix_length=24
+        ).order_by('id').values_list('id', flat=True)
+    )
+    create_values(site, 'Network', network_attrs, (
+        (network_id, network_attributes(i + num_blocks + 1, attrs_per_network))
+        for i, network_id in enumerate(network_ids)
+    ))
+
+    # An empty block to allocate from.
+    free_block = models.Network.objects.create(
+        site=site, cidr=block_cidr(num_blocks)
+    )
+
+    return Dataset(
+        user=user,
+        site=site,
+        device_ids=device_ids,
+        network_ids=network_ids,
+        block_ids=[block.id for block in blocks],
+        free_block_id=free_block.id,
+        num_blocks=num_blocks,
+        attrs_per_network=attrs_per_network,
+    )
+
+
+@pytest.fixture(scope='session')
+def dataset(django_db_setup, django_db_blocker):
+    """Seed the benchmark dataset once per session."""
+    with django_db_blocker.unblock():
+        return seed_dataset(SCALE)
+
+
+@pytest.fixture
+def api(db, dataset):
+    """Return an API client authenticated as a superuser."""
+    client = APIClient()
+    client.force_authenticate(user=dataset.user)
+    return client
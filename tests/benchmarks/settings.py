@@ -0,0 +1,30 @@
+"""
+Settings for running the benchmark suite.
+
+The database backend is selected with the ``NSOT_BENCH_DATABASE`` environment
+variable, which may be ``sqlite`` (the default) or ``postgres``. The Postgres
+connection is configured using the ``NSOT_BENCH_DB_*`` environment variables.
+"""
+
+from __future__ import absolute_import
+from tests.test_settings import *  # noqa
+import os
+
+
+NSOT_BENCH_DATABASE = os.getenv('NSOT_BENCH_DATABASE', 'sqlite')
+
+if NSOT_BENCH_DATABASE == 'postgres':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql_psycopg2',
+            'NAME': os.getenv('NSOT_BENCH_DB_NAME', 'nsot'),
+            'USER': os.getenv('NSOT_BENCH_DB_USER', 'nsot'),
+            'PASSWORD': os.getenv('NSOT_BENCH_DB_PASSWORD', ''),
+            'HOST': os.getenv('NSOT_BENCH_DB_HOST', 'localhost'),
+            'PORT': os.getenv('NSOT_BENCH_DB_PORT', '5432'),
+        }
+    }
+elif NSOT_BENCH_DATABASE != 'sqlite':
+    raise ValueError(
+        'Unsupported NSOT_BENCH_DATABASE: %r' % NSOT_BENCH_DATABASE
+    )
@@ -0,0 +1,137 @@
+"""
+Utilities for measuring benchmarks and reporting their results.
+"""
+
+from __future__ import division
+from __future__ import absolute_import
+import datetime
+import json
+import math
+import os
+import platform
+import timeit
+
+import django
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from six.moves import range
+
+
+#: Number of timed iterations for each benchmark.
+ITERATIONS = int(os.getenv('NSOT_BENCH_ITERATIONS', 50))
+
+#: Where to write the JSON results.
+OUTPUT = os.getenv('NSOT_BENCH_OUTPUT', 'benchmark-results.json')
+
+
+def percentile(values, pct):
+    """Return the nearest-rank ``pct`` percentile of ``values``."""
+    ordered = sorted(values)
+    rank = int(math.ceil(pct / 100 * len(ordered))) - 1
+    return ordered[max(rank, 0)]
+
+
+class Recorder(object):
+    """Runs benchmarks and collects their results."""
+    def __init__(self):
+        self.results = []
+
+    def measure(self, name, func, iterations=None, warmup=1, items=1,
+                count_queries=True):
+        """
+        Call ``func`` repeatedly and record its latency and query counts.
+
+        :param name:
+            Name of the benchmark (e.g. 'devices.list')
+
+        :param func:
+            Callable taking no arguments
+
+        :param iterations:
+            Number of timed calls (default: ``ITERATIONS``)
+
+        :param warmup:
+            Number of untimed calls made first
+
+        :param items:
+            Number of objects handled by each call, used to report throughput
+            of bulk operations
+
+        :param count_queries:
+            Whether to count the database queries made by each call
+        """
+        if iterations is None:
+            iterations = ITERATIONS
+
+        for _ in range(warmup):
+            func()
+
+        timer = timeit.default_timer
+        latencies = []
+        queries = []
+        for _ in range(iterations):
+            if not count_queries:
+                start = timer()
+                func()
+                latencies.append(timer() - start)
+                queries.append(0)
+                continue
+
+            with CaptureQueriesContext(connection) as ctx:
+                start = timer()
+                func()
+                latencies.append(timer() - start)
+            queries.append(len(ctx.captured_queries))
+
+        total = sum(latencies)
+        result = {
+            'name': name,
+            'iterations': iterations,
+            'items': items,
+            'latency_ms': {
+                'mean': total / iterations * 1000,
+                'p50': percentile(latencies, 50) * 1000,
+                'p99': percentile(latencies, 99) * 1000,
+                'max': max(latencies) * 1000,
+            },
+            'throughput': {
+                'ops_per_sec': iterations / total if total else None,
+                'items_per_sec': (
+                    iterations * items / total if total else None
+                ),
+            },
+            'queries': {
+                'min': min(queries),
+                'max': max(queries),
+                'mean': sum(queries) / iterations,
+            },
+        }
+        self.results.append(result)
+
+        return result
+
+    def metadata(self):
+        """Return details of the environment the benchmarks ran in."""
+        from .fixtures import SCALE
+
+        return {
+            'timestamp': datetime.datetime.utcnow().isoformat() + 'Z',
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'scale': SCALE,
+            'iterations': ITERATIONS,
+        }
+
+    def write(self, path=None):
+        """Write the results as JSON to ``path``."""
+        if path is None:
+            path = OUTPUT
+
+        report = {'meta': self.metadata(), 'results': self.results}
+        with open(path, 'w') as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+
+
+#: Shared recorder for the benchmark session.
+recorder = Recorder()
@@ -1,7 +1,9 @@
 from __future__ import absolute_import
 from django.contrib.auth.models import Group
 import pytest
-from pytest_django.fixtures import  django_user_model, transactional_db
+from pytest_django.fixtures import  (
+    django_user_model, settings, transactional_db
+)
 import logging
 
 from nsot import models
@@ -73,3 +75,14 @@ def test_group():
     """Create and return a Group object."""
     test_group = Group.objects.create(name='test_group')
     return test_group
+
+
+@pytest.fixture
+def locmem_cache(settings):
+    """Enable a local-memory cache so that cached lookups take effect."""
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+    return settings
@@ -6,7 +6,7 @@ import pytest
 # Allow everything in there to access the DB
 pytestmark = pytest.mark.django_db
 
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models import ProtectedError
 from django.core.exceptions import (ValidationError as DjangoValidationError,
                                     MultipleObjectsReturned)
@@ -14,7 +14,9 @@ import logging
 
 from nsot import exc, models
 
-from .fixtures import admin_user, user, site, transactional_db
+from .fixtures import (
+    admin_user, user, site, transactional_db, locmem_cache
+)
 
 
 def test_creation(site):
@@ -268,3 +270,230 @@ def test_set_query(site):
     devices = models.Device.objects.set_query('role=br', unique=True)
     assert list(devices) == [device1]
 
+
+def test_set_query_index(transactional_db, site, locmem_cache, settings):
+    """Test that set queries using the attribute index match the database."""
+    from nsot.models.attribute_index import (
+        attribute_index, bitmap_to_ids, ids_to_bitmap
+    )
+
+    # Bitmaps round-trip, including IDs far apart.
+    ids = [3, 4, 5, 70, 4096]
+    assert bitmap_to_ids(ids_to_bitmap(ids, 3), 3) == ids
+    assert bitmap_to_ids(ids_to_bitmap(ids)) == ids
+
+    models.Attribute.objects.create(
+        name='owner', site=site, resource_name='Device'
+    )
+    models.Attribute.objects.create(
+        name='role', site=site, resource_name='Device'
+    )
+    models.Attribute.objects.create(
+        name='tags', site=site, resource_name='Device', multi=True
+    )
+
+    for i in range(20):
+        models.Device.objects.create(
+            hostname='foo-bar%s' % i, site=site,
+            attributes={
+                'owner': ['jathan', 'gary'][i % 2],
+                'role': ['br', 'dr', 'cr'][i % 3],
+                'tags': ['t%s' % (i % 4), 'u%s' % (i % 5)],
+            }
+        )
+
+    queries = [
+        'owner=jathan',
+        'role=br +role=dr',
+        'owner=jathan -role=cr',
+        '-role=cr',
+        '+role=br',
+        'owner=gary role=dr tags=t1',
+        '-owner=gary +tags=t3 -role=br',
+        'tags=t2 tags=u2',
+        'tags=u4 +owner=nobody',
+        'owner=nobody',
+    ]
+
+    def run(query):
+        devices = models.Device.objects.set_query(query, site_id=site.id)
+        return list(devices.order_by('id'))
+
+    # Without the index, set queries are answered by _set_query_sql().
+    expected = {query: run(query) for query in queries}
+    assert expected['tags=t2 tags=u2']
+
+    settings.NSOT_ATTRIBUTE_INDEX = True
+    attribute_index.clear()
+    assert attribute_index.enabled
+    for query in queries:
+        assert run(query) == expected[query]
+    assert attribute_index._partitions
+
+    # Updates are reflected in the index, including the removal of values
+    # that were set when the Device was created.
+    device = models.Device.objects.get(hostname='foo-bar0')
+    device.set_attributes({'owner': 'gary', 'role': 'dr', 'tags': []})
+    device.save()
+    assert device not in run('owner=jathan')
+    assert device in run('owner=gary role=dr')
+
+    # And so are deletions.
+    device_id = device.id
+    device.delete()
+    assert device_id not in [d.id for d in run('owner=gary')]
+
+    # Unique queries work the same.
+    with pytest.raises(exc.ValidationError):
+        models.Device.objects.set_query('owner=jathan', unique=True)
+
+    # Inside a transaction, lookups see its writes without building or
+    # keeping a partition.
+    attribute_index.clear()
+    with transaction.atomic():
+        device = models.Device.objects.create(
+            hostname='foo-bar99', site=site, attributes={'owner': 'nobody'}
+        )
+        assert run('owner=nobody') == [device]
+    assert not attribute_index._partitions
+    assert run('owner=nobody') == [device]
+
+
+def test_set_query_regex(transactional_db, site, locmem_cache, settings):
+    """Test that regex set queries are resolved from distinct values."""
+    from nsot.models.attribute_index import value_dictionary
+
+    value_dictionary.clear()
+    models.Attribute.objects.create(
+        name='role', site=site, resource_name='Device'
+    )
+    models.Attribute.objects.create(
+        name='tags', site=site, resource_name='Device', multi=True
+    )
+
+    device1 = models.Device.objects.create(
+        hostname='foo-bar1', site=site,
+        attributes={'role': 'br', 'tags': ['core', 'edge']}
+    )
+    device2 = models.Device.objects.create(
+        hostname='foo-bar2', site=site,
+        attributes={'role': 'dr', 'tags': ['edge']}
+    )
+
+    def run(query):
+        devices = models.Device.objects.set_query(query, site_id=site.id)
+        return list(devices.order_by('id'))
+
+    # Patterns are searched, like the database regex lookups.
+    matched = value_dictionary.match(site.id, 'Device', 'role', 'r$')
+    assert sorted(matched) == ['br', 'dr']
+    assert run('role_regex=[bd]r') == [device1, device2]
+    assert run('role_regex=^b') == [device1]
+    assert run('role_regex=zz') == []
+    assert run('role_regex=r -tags_regex=^co') == [device2]
+
+    # New values are picked up.
+    device3 = models.Device.objects.create(
+        hostname='foo-bar3', site=site, attributes={'role': 'cr'}
+    )
+    assert run('role_regex=[bcd]r') == [device1, device2, device3]
+
+    # The same results are returned using the attribute index.
+    settings.NSOT_ATTRIBUTE_INDEX = True
+    assert run('role_regex=[bcd]r') == [device1, device2, device3]
+    assert run('role_regex=r -tags_regex=^co') == [device2, device3]
+
+    # Invalid patterns are a validation error.
+    with pytest.raises(exc.ValidationError):
+        run('role_regex=[')
+
+
+def test_set_query_regex_uncached(site):
+    """Test that regex set queries skip the dictionary without a cache."""
+    from nsot.models.attribute_index import value_dictionary
+
+    value_dictionary.clear()
+    models.Attribute.objects.create(
+        name='role', site=site, resource_name='Device'
+    )
+    device = models.Device.objects.create(
+        hostname='foo-bar1', site=site, attributes={'role': 'br'}
+    )
+
+    assert value_dictionary.match(site.id, 'Device', 'role', 'r$') is None
+    devices = models.Device.objects.set_query('role_regex=[bd]r')
+    assert list(devices) == [device]
+    assert not value_dictionary._values
+
+    with pytest.raises(exc.ValidationError):
+        models.Device.objects.set_query('role_regex=[')
+
+
+def test_schema_cache(transactional_db, site, locmem_cache,
+                      django_assert_num_queries):
+    """Test that attribute schemas are cached and invalidated on write."""
+    models.Attribute.objects.create(
+        resource_name='Device', site=site, name='owner',
+        constraints={'pattern': r'\w+'}
+    )
+
+    # Warm the cache, after which lookups are served from memory.
+    models.Attribute.all_by_name('Device', site)
+    with django_assert_num_queries(0):
+        attributes = models.Attribute.all_by_name('Device', site)
+    assert list(attributes) == ['owner']
+
+    # Callers get their own copy of the dict.
+    attributes.pop('owner')
+    assert 'owner' in models.Attribute.all_by_name('Device', site.id)
+
+    # Creating an Attribute invalidates the schema.
+    models.Attribute.objects.create(
+        resource_name='Device', site=site, name='role'
+    )
+    attributes = models.Attribute.all_by_name('Device', site)
+    assert sorted(attributes) == ['owner', 'role']
+
+    # So does updating the constraints of an existing one.
+    role = models.Attribute.objects.get(site=site, name='role')
+    role.constraints = {'valid_values': ['br']}
+    role.save()
+    with pytest.raises(exc.ValidationError):
+        models.Device.objects.create(
+            site=site, hostname='foo-bar1', attributes={'role': 'dr'}
+        )
+
+    models.Device.objects.create(
+        site=site, hostname='foo-bar1', attributes={'role': 'br'}
+    )
+
+
+def test_validator(site):
+    """Test that compiled validators are shared and validate lists."""
+    attr = models.Attribute.objects.create(
+        resource_name='Device', site=site, name='role', multi=True,
+        constraints={'pattern': r'^[a-z]+$', 'valid_values': ['br', 'dr']}
+    )
+    other = models.Attribute.objects.get(id=attr.id)
+
+    # Same constraints, same validator.
+    validator = attr.get_validator()
+    assert other.get_validator() is validator
+    assert validator.pattern.pattern == r'^[a-z]+$'
+
+    assert validator.validate_values(['br', 'dr']) == ['br', 'dr']
+    assert attr.validate_value(['br', 'dr']) == [
+        {'attribute_id': attr.id, 'value': 'br'},
+        {'attribute_id': attr.id, 'value': 'dr'},
+    ]
+
+    bad_values = [['br', 3], ['br', ''], ['br', 'BR'], ['br', 'cr']]
+    for bad in bad_values:
+        with pytest.raises(exc.ValidationError):
+            validator.validate_values(bad)
+
+    # Changing the constraints gets a fresh validator.
+    attr.constraints = {'valid_values': ['cr']}
+    attr.save()
+    assert attr.get_validator() is not validator
+    attr.validate_value(['cr'])
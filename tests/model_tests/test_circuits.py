@@ -15,10 +15,12 @@ import logging
 
 from nsot import exc, models
 
-from .fixtures import admin_user, circuit, device, site, user, transactional_db
+from .fixtures import (
+    admin_user, circuit, device, locmem_cache, site, user, transactional_db
+)
 
 
-def test_creation(device):
+def test_creation(device, django_assert_num_queries):
     """Test basic Circuit creation."""
     site = device.site
 
@@ -70,10 +72,25 @@ def test_creation(device):
     assert circuit.name_slug == expected_name.replace('/', '_')
 
     # Assert property values
-    assert circuit.interfaces == [iface_a, iface_z]
+    assert list(circuit.interfaces) == [iface_a, iface_z]
     assert [str(a) for a in circuit.addresses] == ['10.32.0.1/32', '10.32.0.3/32', \
                                                    '10.32.0.2/32', '10.32.0.4/32']
-    assert circuit.devices == [device_a, device_z]
+    assert list(circuit.devices) == [device_a, device_z]
+    assert list(device_a.circuits) == [circuit, circuit_for_child_ifaces]
+
+    # Each of them is a single query.
+    for queryset in (circuit.interfaces, circuit.addresses, circuit.devices,
+                     device_a.circuits):
+        with django_assert_num_queries(1):
+            list(queryset)
+
+    # The A-side always comes first, whatever the order of the IDs.
+    swapped = models.Circuit(endpoint_a=iface_z, endpoint_z=iface_a)
+    assert list(swapped.interfaces) == [iface_z, iface_a]
+    assert [str(a) for a in swapped.addresses] == [
+        '10.32.0.2/32', '10.32.0.4/32', '10.32.0.1/32', '10.32.0.3/32'
+    ]
+    assert list(swapped.devices) == [device_z, device_a]
 
     # Try to create another circuit w/ the same interfaces (expecting Django
     # validation error)
@@ -185,3 +202,49 @@ class TestInterfaceFor(object):
         """
         assert looped_circuit.interface_for(device_z) is None
         assert looped_circuit.interface_for(device) is not None
+
+
+def test_topology(transactional_db, circuit, locmem_cache,
+                  django_assert_num_queries):
+    """Test that the topology is built once and then kept up to date."""
+    from nsot.models.topology import topology
+
+    topology.clear()
+    site_id = circuit.site_id
+    device_a = circuit.endpoint_a.device
+    device_z = circuit.endpoint_z.device
+
+    assert topology.neighbors(site_id, device_a.id) == [
+        (device_z.id, [circuit.id])
+    ]
+
+    # Later queries are answered from memory.
+    with django_assert_num_queries(0):
+        assert topology.shortest_path(site_id, device_a.id, device_z.id) == (
+            [device_a.id, device_z.id], [[circuit.id]]
+        )
+        assert topology.component(site_id, device_z.id) == [
+            device_a.id, device_z.id
+        ]
+
+    # New Circuits are added in place.
+    device_c = models.Device.objects.create(site=device_a.site, hostname='c')
+    iface_c = models.Interface.objects.create(device=device_c, name='eth0')
+    iface_z = models.Interface.objects.create(device=device_z, name='eth1')
+    circuit2 = models.Circuit.objects.create(
+        endpoint_a=iface_z, endpoint_z=iface_c
+    )
+    with django_assert_num_queries(0):
+        path, circuits = topology.shortest_path(
+            site_id, device_a.id, device_c.id
+        )
+    assert path == [device_a.id, device_z.id, device_c.id]
+    assert circuits == [[circuit.id], [circuit2.id]]
+
+    # As are deleted ones.
+    circuit2.delete()
+    assert topology.shortest_path(site_id, device_a.id, device_c.id) is None
+    assert topology.component(site_id, device_c.id) == [device_c.id]
+    assert topology.summary(site_id) == {
+        'connected_devices': 2, 'circuits': 1, 'components': 1,
+    }
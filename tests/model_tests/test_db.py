@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from __future__ import absolute_import
+import threading
+
+from django.db import connections
+import pytest
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from nsot.api.views import SiteViewSet
+from nsot.util import db, instrumentation
+
+from .fixtures import admin_user, locmem_cache
+
+
+@pytest.fixture
+def pool():
+    """Return a pool of one connection, restoring the test's connection."""
+    original = connections['default']
+    yield db.ConnectionPool(size=1, timeout=0.05)
+    connections['default'] = original
+
+
+def test_acquire_release(pool):
+    """Test that connections are lent out one at a time and reused."""
+    conn = pool.acquire()
+    assert connections['default'] is conn
+    assert pool.acquire() is conn  # Already held by this thread
+    assert pool.stats() == {'in_use': 1, 'idle': 0, 'size': 1}
+
+    pool.release()
+    assert pool.stats() == {'in_use': 0, 'idle': 1, 'size': 1}
+    assert pool.acquire() is conn
+    pool.release_all()
+    assert pool.held() == {}
+
+
+def test_pool_instrumentation(db, pool):
+    """Test that queries on connections lent during a request are timed."""
+    metrics = instrumentation.start()
+    try:
+        conn = pool.acquire()
+        with conn.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        pool.release()
+    finally:
+        instrumentation.finish()
+    assert metrics.sql_count == 1
+
+
+def test_acquire_timeout(pool):
+    """Test that waiting for a connection gives up after the timeout."""
+    acquired = threading.Event()
+    done = threading.Event()
+
+    def hold():
+        pool.acquire()
+        acquired.set()
+        done.wait()
+        pool.release()
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    acquired.wait()
+
+    try:
+        with pytest.raises(db.PoolTimeout):
+            pool.acquire()
+    finally:
+        done.set()
+        thread.join()
+
+    # Once it has been returned, it's ours.
+    assert pool.acquire() is not None
+    pool.release()
+
+
+def test_replica_routing(settings):
+    """Test that reads are only routed to a replica when asked."""
+    settings.NSOT_READ_REPLICAS = ['default', 'bogus']
+    router = db.ReplicaRouter()
+
+    assert router.db_for_read(None) is None
+    assert db.use_replica() == 'default'  # Unknown aliases are ignored
+    assert router.db_for_read(None) == 'default'
+    assert router.db_for_write(None) == 'default'
+    db.use_primary()
+    assert router.db_for_read(None) is None
+
+    settings.NSOT_READ_REPLICAS = []
+    assert db.use_replica() is None
+
+
+@pytest.mark.django_db
+def test_sticky_primary(settings, admin_user, locmem_cache):
+    """Test that clients read from the primary after writing."""
+    settings.NSOT_READ_REPLICAS = ['default']
+    factory = APIRequestFactory()
+
+    request = factory.get('/api/sites/')
+    assert not db.is_sticky(request)
+    assert db.is_sticky(factory.get('/', HTTP_X_NSOT_PRIMARY='1'))
+
+    # Only successful writes set the cookie, and they're remembered for the
+    # user authenticated by the API (not the session).
+    view = SiteViewSet.as_view({'get': 'list', 'post': 'create'})
+    for method, data, sticky in [('get', None, False),
+                                 ('post', {'name': ''}, False),
+                                 ('post', {'name': 'Foo'}, True)]:
+        request = getattr(factory, method)('/api/sites/', data, format='json')
+        force_authenticate(request, user=admin_user)
+        response = view(request)
+        assert (db.STICKY_COOKIE in response.cookies) == sticky
+
+    request = factory.get('/api/sites/')
+    request.user = admin_user
+    assert db.is_sticky(request)
+
+    request = factory.get('/api/sites/')
+    request.COOKIES[db.STICKY_COOKIE] = '1'
+    assert db.is_sticky(request)
+
+
+@pytest.mark.django_db
+def test_replica_pool_timeout(settings, monkeypatch, admin_user):
+    """Test that a view answers 503 if no replica connection became free."""
+    settings.NSOT_READ_REPLICAS = ['default']
+
+    def use_replica():
+        raise db.PoolTimeout('No database connection became free within 1s.')
+
+    monkeypatch.setattr(db, 'use_replica', use_replica)
+
+    request = APIRequestFactory().get('/api/sites/')
+    force_authenticate(request, user=admin_user)
+    response = SiteViewSet.as_view({'get': 'list'})(request)
+    assert response.status_code == 503
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from __future__ import absolute_import
+import pytest
+# Allow everything in there to access the DB
+pytestmark = pytest.mark.django_db
+
+from django.http import HttpResponse
+from django.test import RequestFactory
+import logging
+
+from nsot import models
+from nsot.middleware.request_logging import LoggingMiddleware
+from nsot.util import instrumentation, versions
+
+from .fixtures import site
+
+
+def test_request_metrics(site):
+    """Test that queries and signal handlers are recorded."""
+    # Nothing is recorded outside of a request.
+    assert instrumentation.current() is None
+    with instrumentation.timer('serializer'):
+        pass
+
+    metrics = instrumentation.start()
+    models.Device.objects.create(site=site, hostname='foo-bar1')
+    with instrumentation.timer('serializer'):
+        with instrumentation.timer('serializer'):  # Nested timers count once
+            models.Device.objects.get(hostname='foo-bar1').to_dict()
+    instrumentation.record_cache(True)
+    instrumentation.record_cache(False)
+    versions.get_version('attribute_schema')  # Not counted as a cache read
+    assert instrumentation.finish() is metrics
+    assert instrumentation.current() is None
+
+    data = metrics.to_dict()
+    assert data['sql_count'] >= 2
+    assert data['sql_ms'] > 0
+    assert data['signal_ms'] > 0
+    assert 0 < data['serializer_ms'] <= data['duration_ms']
+    assert (data['cache_hits'], data['cache_misses']) == (1, 1)
+    assert metrics.trace is None
+
+    header = metrics.server_timing(data)
+    assert header.startswith('total;dur=')
+    assert 'sql;dur=' in header
+
+
+def test_logging_middleware(site, settings, caplog):
+    """Test that the middleware reports metrics and SQL traces."""
+    settings.NSOT_SQL_TRACE_SAMPLE_RATE = 1.0
+    settings.NSOT_SQL_TRACE_THRESHOLD_MS = 0
+
+    middleware = LoggingMiddleware()
+    request = RequestFactory().get('/api/devices/')
+
+    with caplog.at_level(logging.INFO, logger='nsot_server'):
+        middleware.process_request(request)
+        list(models.Device.objects.all())
+        response = middleware.process_response(request, HttpResponse())
+
+    assert 'Server-Timing' in response
+    records = [r for r in caplog.records if r.name == 'nsot_server']
+    assert records[0].sql_count == 1
+    assert records[0].status_code == 200
+    assert 'Slow request' in records[1].getMessage()
+    assert 'SELECT' in records[1].getMessage()
+
+    # No header if it's turned off.
+    settings.NSOT_SERVER_TIMING = False
+    middleware.process_request(request)
+    response = middleware.process_response(request, HttpResponse())
+    assert 'Server-Timing' not in response
+
+    # Or if instrumentation is disabled entirely.
+    settings.NSOT_INSTRUMENTATION = False
+    settings.NSOT_SERVER_TIMING = True
+    middleware.process_request(request)
+    response = middleware.process_response(request, HttpResponse())
+    assert 'Server-Timing' not in response
+
+    # Metrics left on the thread by a request that was answered early aren't
+    # reported for the next one, or kept.
+    settings.NSOT_INSTRUMENTATION = True
+    instrumentation.start()
+    response = middleware.process_response(
+        RequestFactory().get('/api/devices/'), HttpResponse()
+    )
+    assert 'Server-Timing' not in response
+    assert instrumentation.current() is None
@@ -6,15 +6,15 @@ import pytest
 # Allow everything in there to access the DB
 pytestmark = pytest.mark.django_db
 
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models import ProtectedError
 from django.core.exceptions import ValidationError as DjangoValidationError
 import ipaddress
 import logging
 
-from nsot import exc, models
+from nsot import exc, fields, models
 
-from .fixtures import admin_user, user, site, transactional_db
+from .fixtures import admin_user, user, site, transactional_db, locmem_cache
 
 
 def test_networks_creation_reparenting(site):
@@ -177,6 +177,225 @@ def test_retrieve_networks(site):
         site.networks.get_closest_parent(u'1')
 
 
+def test_get_closest_parents(transactional_db, site, locmem_cache,
+                             django_assert_num_queries):
+    """Test batch closest parent lookups from the prefix index."""
+    from nsot.models.prefix_index import prefix_index
+
+    prefix_index.clear()
+    net_8 = models.Network.objects.create(site=site, cidr=u'10.0.0.0/8')
+    net_24 = models.Network.objects.create(site=site, cidr=u'10.0.0.0/24')
+    net_v6 = models.Network.objects.create(site=site, cidr=u'2001:db8::/32')
+    models.Network.objects.create(site=site, cidr=u'10.0.0.1/32')
+
+    cidrs = [
+        u'10.0.0.1', u'10.0.0.128/25', u'10.0.0.0/24', u'10.1.0.0/16',
+        u'1.0.0.2/32', u'2001:db8::1',
+    ]
+    assert models.Network.objects.get_closest_parents(cidrs, site=site) == [
+        net_24, net_24, net_8, net_8, None, net_v6
+    ]
+
+    # Once the index is built, lookups only fetch the parents.
+    with django_assert_num_queries(1):
+        assert models.Network.objects.get_closest_parents(
+            [u'10.0.0.2/32'], prefix_length=16, site=site.id
+        ) == [net_24]
+    with django_assert_num_queries(0):
+        assert models.Network.objects.get_closest_parents(
+            [u'10.0.0.2/32'], prefix_length=25, site=site.id
+        ) == [None]
+
+    # New Networks are added in place, and deleted ones removed.
+    net_25 = models.Network.objects.create(site=site, cidr=u'10.0.0.0/25')
+    with django_assert_num_queries(1):
+        assert models.Network.objects.get_closest_parents(
+            [u'10.0.0.2/32'], site=site.id
+        ) == [net_25]
+    net_25.delete(force_delete=True)  # Its /32 moves back to net_24.
+    assert models.Network.objects.get_closest_parents(
+        [u'10.0.0.2/32'], site=site.id
+    ) == [net_24]
+
+    # Without a Site, the longest prefix in any Site is chosen.
+    other = models.Site.objects.create(name='Other')
+    net_16 = models.Network.objects.create(site=other, cidr=u'10.0.0.0/16')
+    assert models.Network.objects.get_closest_parents(
+        [u'10.0.1.1', u'10.0.0.1']
+    ) == [net_16, net_24]
+
+    with pytest.raises(exc.ValidationError):
+        models.Network.objects.get_closest_parents(
+            [u'10.0.0.2/32'], prefix_length='shoe', site=site
+        )
+    with pytest.raises(exc.ValidationError):
+        models.Network.objects.get_closest_parents([u'1'], site=site)
+
+    # The prefix length must fit every address.
+    for prefix_length, cidrs in ((-1, [u'10.0.0.2']), (33, [u'10.0.0.2']),
+                                 (33, [u'2001:db8::1', u'10.0.0.2']),
+                                 (129, [u'2001:db8::1'])):
+        with pytest.raises(exc.ValidationError):
+            models.Network.objects.get_closest_parents(
+                cidrs, prefix_length=prefix_length, site=site
+            )
+    assert models.Network.objects.get_closest_parents(
+        [u'2001:db8::1'], prefix_length=64, site=site
+    ) == [None]
+
+
+def test_ipam_snapshot(transactional_db, site, locmem_cache, settings,
+                       django_assert_num_queries, monkeypatch):
+    """Test that Network helpers give the same results from the snapshot."""
+    from nsot.models import network as network_module
+    from nsot.models.ipam_snapshot import ipam_snapshot
+
+    cidrs = [
+        u'10.0.0.0/8', u'10.16.0.0/16', u'10.16.2.0/24', u'10.16.2.0/25',
+        u'10.16.2.8/29', u'10.16.2.1/32', u'10.16.2.4/32', u'10.16.2.9/32',
+        u'10.17.0.0/16', u'2001:db8::/32', u'2001:db8:1::/48',
+        u'2001:db8:1::1/128', u'2001:db8:1:ffff::/64',
+    ]
+    for cidr in cidrs:
+        models.Network.objects.create(site=site, cidr=cidr)
+    networks = list(models.Network.objects.order_by('id'))
+
+    def run(network):
+        return (
+            sorted(n.id for n in network.supernets()),
+            sorted(n.id for n in network.subnets()),
+            sorted(n.id for n in network.subnets(include_ips=False)),
+            network.get_utilization(),
+            network.get_next_network(network.prefix_length + 2, num=4),
+            network.get_next_network(
+                network.prefix_length + 2, num=4, strict=True
+            ),
+            network.get_next_address(num=4),
+        )
+
+    def closest(cidr, prefix_length=0):
+        try:
+            return site.networks.get_closest_parent(
+                cidr, prefix_length=prefix_length, site=site
+            )
+        except models.Network.DoesNotExist:
+            return None
+
+    lookups = [
+        (u'10.16.2.3/32', 0), (u'10.16.2.3/32', 25), (u'10.16.2.3/32', 26),
+        (u'10.16.3.0/24', 0), (u'11.0.0.0/8', 0), (u'2001:db8:1::2/128', 0),
+        (u'2001:db8:2::/48', 0),
+    ]
+    leaves = [n for n in networks if n.prefix_length not in (32, 128)]
+    expected = [run(network) for network in leaves]
+    expected_closest = [closest(*lookup) for lookup in lookups]
+
+    settings.NSOT_IPAM_SNAPSHOT = True
+    ipam_snapshot.clear()
+    assert ipam_snapshot.enabled
+    assert [run(network) for network in leaves] == expected
+    assert [closest(*lookup) for lookup in lookups] == expected_closest
+
+    # Once built, lookups only fetch the matching Networks.
+    net_25 = models.Network.objects.get_by_address(u'10.16.2.0/25')
+    with django_assert_num_queries(0):
+        net_25.get_next_address(num=4)
+        net_25.get_utilization()
+    with django_assert_num_queries(1):
+        assert sorted(n.cidr for n in net_25.supernets()) == [
+            u'10.0.0.0/8', u'10.16.0.0/16', u'10.16.2.0/24'
+        ]
+
+    # Larger subtrees are fetched with the range query.
+    root = models.Network.objects.get_by_address(u'10.0.0.0/8')
+    expected_subnets = sorted(n.id for n in root.subnets())
+    monkeypatch.setattr(network_module, 'MAX_SNAPSHOT_SUBNETS', 1)
+    assert sorted(n.id for n in root.subnets()) == expected_subnets
+    monkeypatch.undo()
+
+    # Updates keep the snapshot.
+    net_25.save()
+    with django_assert_num_queries(0):
+        net_25.get_utilization()
+
+    # Creating and deleting Networks cause the snapshot to be rebuilt.
+    ip = models.Network.objects.create(site=site, cidr=u'10.16.2.2/32')
+    assert net_25.get_next_address(num=1, as_objects=False) == [
+        u'10.16.2.3/32'
+    ]
+    assert net_25.get_utilization()['num_used'] == 4
+    ip.delete()
+    assert net_25.get_utilization()['num_used'] == 3
+
+    # The snapshot isn't used inside a transaction.
+    with transaction.atomic():
+        models.Network.objects.create(site=site, cidr=u'10.16.2.2/32')
+        assert net_25.get_utilization()['num_used'] == 4
+        transaction.set_rollback(True)
+    assert net_25.get_utilization()['num_used'] == 3
+
+
+def test_ipam_snapshot_files(transactional_db, site, locmem_cache, settings,
+                             tmpdir, django_assert_num_queries):
+    """Test that IPAM snapshots are shared through memory-mapped files."""
+    import fcntl
+    from nsot.models.ipam_snapshot import ipam_snapshot
+
+    settings.NSOT_IPAM_SNAPSHOT = True
+    settings.NSOT_IPAM_SNAPSHOT_DIR = str(tmpdir)
+    ipam_snapshot.clear()
+
+    for cidr in (u'10.0.0.0/8', u'10.16.2.0/24', u'10.16.2.1/32',
+                 u'2001:db8::/32', u'2001:db8::1/128'):
+        models.Network.objects.create(site=site, cidr=cidr)
+    net_24 = models.Network.objects.get_by_address(u'10.16.2.0/24')
+    net_v6 = models.Network.objects.get_by_address(u'2001:db8::/32')
+
+    # The first lookup writes the snapshot file.
+    assert net_24.get_utilization()['num_used'] == 1
+    path = tmpdir.join('ipam-snapshot-%s' % site.id)
+    assert path.check()
+    assert ipam_snapshot._snapshots[site.id].mapped
+
+    # The arrays are views of the file rather than copies of it.
+    from array import array
+    blocks = ipam_snapshot._snapshots[site.id].blocks
+    assert not isinstance(blocks[4].addresses, array)
+    assert not isinstance(blocks[6].high, array)
+
+    # Other processes map it rather than querying the database.
+    ipam_snapshot.clear()
+    with django_assert_num_queries(0):
+        assert net_24.get_utilization()['num_used'] == 1
+        assert net_v6.get_utilization()['num_used'] == 1
+    assert ipam_snapshot._snapshots[site.id].mapped
+    assert models.Network.objects.get_closest_parents(
+        [u'10.16.2.2', u'10.1.0.0/16', u'2001:db8::2', u'1.0.0.1'], site=site
+    ) == [net_24, net_24.parent, net_v6, None]
+
+    # Changes cause the file to be replaced.
+    models.Network.objects.create(site=site, cidr=u'10.16.2.2/32')
+    assert net_24.get_utilization()['num_used'] == 2
+    assert ipam_snapshot._snapshots[site.id].mapped
+    ipam_snapshot.clear()
+    assert net_24.get_utilization()['num_used'] == 2
+
+    # While another process is building it, the database is used instead.
+    models.Network.objects.create(site=site, cidr=u'10.16.2.3/32')
+    with open(str(path) + '.lock', 'a') as lock:
+        fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        ipam_snapshot.clear()
+        assert net_24.get_utilization()['num_used'] == 3
+        assert models.Network.objects.get_closest_parents(
+            [u'10.16.2.2'], site=site
+        ) == [net_24]
+        assert site.id not in ipam_snapshot._snapshots
+
+    # Once it's released, the next lookup builds the file.
+    assert net_24.get_utilization()['num_used'] == 3
+    assert ipam_snapshot._snapshots[site.id].mapped
+
+
 def test_mptt_methods(site):
     """Test ancestor/children/descendants/root model methods."""
     net_8 = models.Network.objects.create(site=site, cidr=u'10.0.0.0/8')
@@ -378,3 +597,44 @@ def test_strict_allocation_3(site):
     child = models.Network.objects.create(site = site, cidr = u'2001:db8:abcd:0012::0/97')
     expected = [ipaddress.ip_network(u'2001:db8:abcd:12::8000:0/128')]
     assert parent.get_next_network(128, strict = True) == expected
+
+
+def test_ip_address_values(site):
+    """Test that addresses read from the database behave like strings."""
+    models.Network.objects.create(site=site, cidr=u'10.0.0.0/24')
+    models.Network.objects.create(site=site, cidr=u'2001:db8::/64')
+
+    net4 = models.Network.objects.get(site=site, ip_version='4')
+    net6 = models.Network.objects.get(site=site, ip_version='6')
+    for net, expected in ((net4, u'10.0.0.0'), (net6, u'2001:db8::')):
+        address = net.network_address
+        assert isinstance(address, fields.IPAddress)
+        assert address == expected
+        assert address != u'bogus'
+        assert u'%s' % address == expected
+        assert address == ipaddress.ip_address(expected)
+        assert net.ip_network == ipaddress.ip_network(net.cidr)
+        assert net.to_dict()['network_address'] == expected
+
+    # Strings are compared by value. Hashes agree with those of equal
+    # addresses, and of the canonical spelling.
+    exploded = fields.IPAddress.from_text(u'2001:0db8:0000:0000::')
+    assert net6.network_address == u'2001:0db8::0'
+    assert net6.network_address == exploded
+    assert hash(net6.network_address) == hash(exploded)
+    assert exploded in {net6.network_address}
+    for net, expected in ((net4, u'10.0.0.0'), (net6, u'2001:db8::')):
+        assert hash(net.network_address) == hash(expected)
+        assert {expected: net}[net.network_address] == net
+        assert net.network_address in {expected}
+
+    # Ordering uses the integers, not the strings.
+    ip9 = fields.IPAddress.from_text(u'10.0.0.9')
+    ip10 = fields.IPAddress.from_text(u'10.0.0.10')
+    assert ip9 < ip10
+    assert net4.network_address < ip9 < net4.broadcast_address
+
+    # And they may be used in lookups.
+    assert models.Network.objects.get(
+        network_address=net6.network_address
+    ) == net6
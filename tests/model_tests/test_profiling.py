@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from __future__ import absolute_import
+import pytest
+# Allow everything in there to access the DB
+pytestmark = pytest.mark.django_db
+
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory
+from six import StringIO
+import logging
+
+from nsot.middleware.profiling import ProfilingMiddleware
+from nsot.util import profiling
+
+from .fixtures import admin_user, user
+
+
+def view(request, pk=None):
+    return HttpResponse('ok: %s' % pk)
+
+
+def test_profiling_middleware(admin_user, user, settings, tmpdir):
+    """Test that only requested or sampled requests are profiled."""
+    middleware = ProfilingMiddleware()
+    factory = RequestFactory()
+    directory = str(tmpdir)
+
+    def process(request, user):
+        # The API views start the profile once the user is authenticated.
+        profiling.start_profile(request, user)
+        return middleware.process_response(request, view(request, pk=1))
+
+    # Disabled without a profile directory.
+    request = factory.get('/api/networks/1/descendants/', {'profile': 1})
+    assert 'X-NSoT-Profile' not in process(request, admin_user)
+
+    settings.NSOT_PROFILE_DIR = directory
+
+    # Only superusers may ask for a profile.
+    assert 'X-NSoT-Profile' not in process(request, user)
+    assert 'X-NSoT-Profile' not in process(factory.get('/api/'), admin_user)
+
+    response = process(request, admin_user)
+    assert response.content == b'ok: 1'
+    name = response['X-NSoT-Profile']
+    assert request.profiler is None
+
+    response = process(
+        factory.get('/api/devices/', HTTP_X_NSOT_PROFILE='true'), admin_user
+    )
+    assert 'X-NSoT-Profile' in response
+
+    # Sampled requests are profiled for anyone.
+    settings.NSOT_PROFILE_SAMPLE_RATE = 1.0
+    assert 'X-NSoT-Profile' in process(factory.get('/api/sites/'), user)
+
+    profiles = profiling.list_profiles(directory)
+    assert len(profiles) == 3
+    assert name in [p['name'] for p in profiles]
+    assert profiles[0]['method'] == 'GET'
+
+    # Listing
+    out = StringIO()
+    call_command('profiles', directory=directory, stdout=out)
+    assert name in out.getvalue()
+    assert '3 profile(s)' in out.getvalue()
+
+    # Summarizing by name, or everything matching a path.
+    out = StringIO()
+    call_command('profiles', name, directory=directory, stdout=out)
+    assert 'view' in out.getvalue()
+
+    out = StringIO()
+    call_command(
+        'profiles', all=True, path='descendants', sort='cumulative',
+        directory=directory, stdout=out
+    )
+    assert 'view' in out.getvalue()
@@ -193,6 +193,36 @@ class TestCreation(ProtocolTestCase):
         assert protocol.get_attributes()['asn'] == '1234'
         assert protocol.get_attributes()['area'] == 'threeve'
 
+    def test_natural_keys(self, device, interface, circuit, bgp):
+        """Test that natural keys of related objects are cached."""
+        protocol = models.Protocol.objects.create(
+            device=device,
+            interface=interface,
+            circuit=circuit,
+            type=bgp,
+            attributes={'asn': '1234'},
+        )
+        assert protocol.to_dict()['type'] == 'bgp'
+        assert protocol.to_dict()['device'] == device.hostname
+        assert protocol.interface_name_slug == interface.name_slug
+        assert protocol.circuit_name_slug == circuit.name_slug
+
+        # Renaming a related object updates the cached natural key.
+        device.hostname = 'renamed'
+        device.save()
+        bgp.name = 'bgp4'
+        bgp.save()
+        interface.name = 'eth1'
+        interface.save()
+
+        protocol.refresh_from_db()
+        assert protocol.device_hostname == 'renamed'
+        assert protocol.type_name == 'bgp4'
+        assert protocol.interface_name_slug == 'renamed:eth1'
+        assert models.Protocol.objects.filter(
+            device_hostname='renamed'
+        ).count() == 1
+
 
 class TestUnicode(ProtocolTestCase):
     """
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from __future__ import absolute_import
+import io
+import json
+
+import pytest
+
+from nsot import models
+from nsot.util import transfer
+from .fixtures import circuit, site
+
+
+# Allow everything in there to access the DB
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def inventory(circuit):
+    """Populate ``circuit``'s Site with one of everything."""
+    site = circuit.site
+    models.Attribute.objects.create(
+        site=site, resource_name='Device', name='role'
+    )
+    asn = models.Attribute.objects.create(
+        site=site, resource_name='Protocol', name='asn'
+    )
+
+    device = circuit.endpoint_a.device
+    device.set_attributes({'role': 'br'})
+    device.save()
+    models.Interface.objects.create(
+        device=device, name='eth0.100', parent=circuit.endpoint_a
+    )
+
+    bgp = models.ProtocolType.objects.create(name='bgp', site=site)
+    bgp.required_attributes.add(asn)
+    models.Protocol.objects.create(
+        type=bgp, device=device, circuit=circuit, attributes={'asn': '65000'}
+    )
+    return site
+
+
+def snapshot():
+    """Return the objects of every exported model as dicts."""
+    state = {}
+    for name, _ in transfer.MODELS:
+        # Dumped as by the export, which adds the Site of each Assignment.
+        m2m_fields = transfer._get_m2m_fields(getattr(models, name))
+        objects = []
+        for obj in transfer._get_queryset(name):
+            fields = transfer._dump_object(name, obj, m2m_fields)['fields']
+            # Set when imported.
+            fields.pop('created', None)
+            fields.pop('updated_at', None)
+            objects.append((obj.pk, fields))
+        state[name] = sorted(objects)
+    return state
+
+
+def delete_all():
+    for name in ('Value', 'Protocol', 'ProtocolType', 'Circuit',
+                 'Assignment'):
+        getattr(models, name).objects.all().delete()
+    models.Interface.objects.filter(parent__isnull=False).delete()
+    models.Interface.objects.all().delete()
+    for network in models.Network.objects.order_by('-prefix_length'):
+        network.delete()
+    for name in ('Device', 'Attribute', 'Site'):
+        getattr(models, name).objects.all().delete()
+
+
+def export():
+    fh = io.StringIO()
+    transfer.export(fh, chunk_size=2)
+    fh.seek(0)
+    return fh
+
+
+def test_round_trip(inventory):
+    """Test that an export may be imported into an empty database."""
+    before = snapshot()
+    fh = export()
+    delete_all()
+
+    counts = transfer.Importer(chunk_size=2).run(fh)
+    assert counts['Device'] == 2
+    assert counts['Network'] == models.Network.objects.count()
+    assert snapshot() == before
+
+    # Imported objects may be queried by attribute, and new objects don't
+    # reuse imported IDs.
+    assert models.Device.objects.set_query('role=br').count() == 1
+    device = models.Device.objects.create(site=inventory, hostname='new')
+    assert device.pk > max(pk for pk, _ in before['Device'])
+
+
+def test_resume(inventory, tmpdir):
+    """Test that an interrupted import resumes from its checkpoint."""
+    lines = export().read().splitlines(True)
+    delete_all()
+
+    # Corrupt the Interfaces, so that the import stops there.
+    broken = list(lines)
+    for i, line in enumerate(broken):
+        record = json.loads(line)
+        if record.get('model') == 'Interface':
+            record['fields']['type'] = -1
+            broken[i] = json.dumps(record) + '\n'
+
+    checkpoint = str(tmpdir.join('import.checkpoint'))
+    importer = transfer.Importer(chunk_size=2, checkpoint=checkpoint)
+    with pytest.raises(transfer.TransferError):
+        importer.run(io.StringIO(''.join(broken)))
+    assert models.Device.objects.count() == 2
+    assert not models.Interface.objects.exists()
+
+    importer = transfer.Importer(chunk_size=2, checkpoint=checkpoint)
+    counts = importer.run(io.StringIO(''.join(lines)))
+    assert counts['Site'] == counts['Device'] == 0
+    assert counts['Interface'] == 3
+    assert not tmpdir.join('import.checkpoint').exists()
+
+    # Running it again skips everything.
+    importer = transfer.Importer(chunk_size=2)
+    counts = importer.run(io.StringIO(''.join(lines)))
+    assert sum(counts.values()) == 0
+    assert importer.skipped['Interface'] == 3
+
+
+def test_invalid_export():
+    """Test that files that aren't exports are rejected."""
+    with pytest.raises(transfer.TransferError):
+        transfer.Importer().run(io.StringIO('{"model": "Site"}\n'))
+
+
+def device_chunks(count, hostname='device%d'):
+    """Return chunks of ``count`` Devices over two Sites."""
+    lines = [json.dumps({'format': 'nsot', 'version': 1})]
+    for i in range(count):
+        site_id = 1 + i * 2 // count
+        lines.append(json.dumps({
+            'model': 'Device', 'pk': i + 1, 'site': site_id,
+            'fields': {'hostname': hostname % i, 'site_id': site_id},
+        }))
+    fh = io.StringIO('\n'.join(lines) + '\n')
+    transfer.read_header(fh)
+    return transfer.iter_chunks(fh, chunk_size=3)
+
+
+def test_prepare_chunks_in_workers():
+    """Test that chunks validated by workers are returned in order."""
+    prepared = list(transfer.prepare_chunks(device_chunks(20), workers=2))
+
+    # Chunks don't span Sites.
+    assert [(c.site_id, len(c.records)) for c, _ in prepared] == [
+        (1, 3), (1, 3), (1, 3), (1, 1), (2, 3), (2, 3), (2, 3), (2, 1),
+    ]
+    devices = [obj for _, objects in prepared for obj, _ in objects]
+    assert [d.pk for d in devices] == list(range(1, 21))
+    assert devices[-1].hostname == 'device19'
+
+    with pytest.raises(transfer.TransferError):
+        list(transfer.prepare_chunks(device_chunks(20, '%d!'), workers=2))
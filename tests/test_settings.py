@@ -55,6 +55,14 @@ NSOT_PORT = 8990
 # Default: 4
 NSOT_NUM_WORKERS = 4
 
+# The type of gunicorn workers to use: 'sync', 'gthread' or 'gevent'.
+# Default: gevent
+NSOT_WORKER_CLASS = 'gevent'
+
+# The maximum number of database connections used at once by each worker.
+# Default: 10
+NSOT_DB_POOL_SIZE = 10
+
 # Timeout in seconds before gunicorn workers are killed/restarted.
 # Default: 30
 NSOT_WORKER_TIMEOUT = 30
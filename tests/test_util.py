@@ -166,3 +166,28 @@ def test_get_field_attr():
     assert util.get_field_attr(model, 'bogus', attr_name) == ''
     assert util.get_field_attr(model, 'bogus', 'bogus') == ''
     assert util.get_field_attr('bogus', 'bogus', 'bogus') == ''
+
+
+def test_import_timer():
+    """Test that first imports are timed and repeat imports aren't."""
+    import sys
+    from nsot.util import startup
+
+    sys.modules.pop('colorsys', None)
+    with startup.ImportTimer() as timer:
+        import colorsys  # noqa
+        import os  # noqa
+
+    assert 'colorsys' in timer.timings
+    assert 'os' not in timer.timings
+    assert 'colorsys' in timer.report()
+
+
+@pytest.mark.django_db
+def test_pending_migrations():
+    """Test that a migrated database has no pending migrations."""
+    from nsot.util import startup
+
+    names = startup.get_migration_names()
+    assert ('nsot', '0001_initial') in names
+    assert startup.get_pending_migrations() == set()